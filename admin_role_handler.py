@@ -1,11 +1,21 @@
+import os
+import re
+import html
+from datetime import datetime, timedelta
+
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler
-import psycopg2
+
+import booking_state
+from send_queue import PRIORITY_BULK
+from pooling import propose_trips
 
 ADMIN_MENU = ReplyKeyboardMarkup(
     [
-        ["📋 Подтвердить бронь"],
+        ["📋 Подтвердить бронь", "🚫 Отменить брони"],
+        ["☑️ Выбрать брони"],
         ["📂 Активные брони", "📜 История броней"],
+        ["🚐 Сборка машин"],
         ["↩️ Назад"]
     ],
     resize_keyboard=True
@@ -13,15 +23,41 @@ ADMIN_MENU = ReplyKeyboardMarkup(
 
 AWAIT_ADMIN_ACTION = 99
 AWAIT_BOOKING_ID = 100
+AWAIT_CANCEL_IDS = 101
+
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "10"))
+POOLING_HORIZON = timedelta(days=int(os.getenv("POOLING_HORIZON_DAYS", "2")))
+
+# Массовые действия: код -> (новый статус, подпись); допустимые переходы — в booking_state
+BULK_ACTIONS = {
+    "approve": ("confirmed", "Подтверждено"),
+    "cancel": ("cancelled", "Отменено"),
+}
+MAX_BULK_IDS = 500
+ID_RANGE_RE = re.compile(r"^(\d+)\s*-\s*(\d+)$")
+
+SELECTION_SIZE = 20
+SELECTED = "☑"
+UNSELECTED = "⬜"
+
+# Списки: код в callback_data -> (заголовок, только активные, текст для пустого списка)
+BOOKING_LISTS = {
+    "a": ("📂 Активные брони", True, "📭 Нет активных броней."),
+    "h": ("📜 История броней", False, "📭 История пуста."),
+}
+
+CURSOR_TIME_FORMAT = "%Y%m%d%H%M%S%f"
+
+
+async def is_admin(context, telegram_id):
+    user = await context.application.bot_data["users"].get_by_telegram_id(telegram_id)
+    return bool(user and user.role == "admin")
+
 
 async def confirm_bookings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = update.effective_user.id
-    cursor = context.application.bot_data["cursor"]
-
-    cursor.execute("SELECT role FROM users WHERE telegram_id = %s", (telegram_id,))
-    result = cursor.fetchone()
 
-    if result and result[0] == "admin":
+    if await is_admin(context, telegram_id):
         await update.message.reply_text("🔐 Добро пожаловать в админ-панель.", reply_markup=ADMIN_MENU)
         return AWAIT_ADMIN_ACTION
     else:
@@ -31,78 +67,33 @@ async def confirm_bookings(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def admin_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
-    cursor = context.application.bot_data["cursor"]
 
     if text == "📋 Подтвердить бронь":
-        await update.message.reply_text("🔢 Введите ID брони для подтверждения:")
+        await update.message.reply_text(
+            "🔢 Введите ID брони для подтверждения.\n"
+            "Можно списком и диапазонами: 101-140, 155\n"
+            "Или все ожидающие за день: все 24.05"
+        )
         return AWAIT_BOOKING_ID
 
-    elif text == "📂 Активные брони":
-        cursor.execute("""
-            SELECT b.id, u.full_name, u.phone, u.telegram_id, b.scheduled_time, b.status
-            FROM bookings b
-            JOIN users u ON b.client_id = u.id
-            WHERE b.status IN ('pending', 'confirmed')
-            ORDER BY b.scheduled_time DESC
-        """)
-        rows = cursor.fetchall()
-
-        if not rows:
-            await update.message.reply_text("📭 Нет активных броней.")
-        else:
-            for row in rows:
-                booking_id, full_name, phone, telegram_id, scheduled_time, status = row
-                message = (
-                    f"🆔 Бронь #{booking_id}\n"
-                    f"👤 Клиент: {full_name}\n"
-                    f"📞 Телефон: {phone}\n"
-                    f"📅 Время: {scheduled_time}\n"
-                    f"📌 Статус: {status}"
-                )
-                buttons = []
-                if telegram_id:
-                    buttons.append(
-                        [InlineKeyboardButton("💬 Написать в Telegram", url=f"tg://user?id={telegram_id}")]
-                    )
-                await update.message.reply_text(
-                    message,
-                    reply_markup=InlineKeyboardMarkup(buttons) if buttons else None
-                )
+    elif text == "🚫 Отменить брони":
+        await update.message.reply_text("🔢 Введите ID броней для отмены (например: 101-140, 155) или: все 24.05")
+        return AWAIT_CANCEL_IDS
+
+    elif text == "☑️ Выбрать брони":
+        await send_selection(update, context)
+        return AWAIT_ADMIN_ACTION
 
+    elif text == "📂 Активные брони":
+        await send_bookings_page(update, context, "a")
         return AWAIT_ADMIN_ACTION
 
     elif text == "📜 История броней":
-        cursor.execute("""
-            SELECT b.id, u.full_name, u.phone, u.telegram_id, b.scheduled_time, b.status
-            FROM bookings b
-            JOIN users u ON b.client_id = u.id
-            ORDER BY b.scheduled_time DESC
-            LIMIT 30
-        """)
-        rows = cursor.fetchall()
-
-        if not rows:
-            await update.message.reply_text("📭 История пуста.")
-        else:
-            for row in rows:
-                booking_id, full_name, phone, telegram_id, scheduled_time, status = row
-                message = (
-                    f"🆔 Бронь #{booking_id}\n"
-                    f"👤 Клиент: {full_name}\n"
-                    f"📞 Телефон: {phone}\n"
-                    f"📅 Время: {scheduled_time}\n"
-                    f"📌 Статус: {status}"
-                )
-                buttons = []
-                if telegram_id:
-                    buttons.append(
-                        [InlineKeyboardButton("💬 Написать в Telegram", url=f"tg://user?id={telegram_id}")]
-                    )
-                await update.message.reply_text(
-                    message,
-                    reply_markup=InlineKeyboardMarkup(buttons) if buttons else None
-                )
+        await send_bookings_page(update, context, "h")
+        return AWAIT_ADMIN_ACTION
 
+    elif text == "🚐 Сборка машин":
+        await send_trip_proposals(update, context)
         return AWAIT_ADMIN_ACTION
 
     elif text == "↩️ Назад":
@@ -117,28 +108,280 @@ async def admin_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 
 async def approve_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    try:
-        booking_id = int(update.message.text)
-    except ValueError:
-        await update.message.reply_text("❌ Введите корректный ID.")
-        return AWAIT_BOOKING_ID
+    return await handle_bulk_input(update, context, "approve", AWAIT_BOOKING_ID)
 
-    cursor = context.application.bot_data["cursor"]
-    conn = context.application.bot_data["conn"]
 
-    cursor.execute("SELECT status FROM bookings WHERE id = %s", (booking_id,))
-    result = cursor.fetchone()
+async def cancel_bookings_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    return await handle_bulk_input(update, context, "cancel", AWAIT_CANCEL_IDS)
 
-    if not result:
-        await update.message.reply_text("❌ Бронь не найдена.")
-        return AWAIT_BOOKING_ID
 
-    if result[0] == "confirmed":
-        await update.message.reply_text("✅ Бронь уже подтверждена.")
+# Ввод «101-140, 155» или «все 24.05» — одна массовая операция
+async def handle_bulk_input(update: Update, context: ContextTypes.DEFAULT_TYPE, action, retry_state):
+    text = update.message.text.strip()
+    bookings = context.application.bot_data["bookings"]
+    status, label = BULK_ACTIONS[action]
+
+    if text.lower().startswith("все"):
+        try:
+            day = parse_day(text[3:].strip())
+        except ValueError:
+            await update.message.reply_text("❌ Укажите дату: все 24.05 или все 24.05.2025")
+            return retry_state
+        ids = await booking_state.transition_day(bookings, day, status)
+        summary = f"✅ {label} за {day.strftime('%d.%m.%Y')}: {format_ids(ids)}" if ids else "ℹ️ Подходящих броней нет."
+        await update.message.reply_text(summary)
         return AWAIT_ADMIN_ACTION
 
-    cursor.execute("UPDATE bookings SET status = 'confirmed' WHERE id = %s", (booking_id,))
-    conn.commit()
+    try:
+        booking_ids = parse_booking_ids(text)
+    except ValueError:
+        await update.message.reply_text("❌ Введите ID, список или диапазон. Пример: 101-140, 155")
+        return retry_state
 
-    await update.message.reply_text(f"✅ Бронь #{booking_id} подтверждена.")
+    changes = await booking_state.transition_many(bookings, booking_ids, status)
+    await update.message.reply_text(render_bulk_summary(action, changes))
     return AWAIT_ADMIN_ACTION
+
+
+def parse_booking_ids(text):
+    """«101-140, 155» → [101, ..., 140, 155]. ValueError, если разобрать нельзя."""
+    ids = set()
+    for part in re.split(r"[,;]", text):
+        part = part.strip()
+        if not part:
+            continue
+        match = ID_RANGE_RE.match(part)
+        if match:
+            first, last = int(match.group(1)), int(match.group(2))
+            if first > last:
+                first, last = last, first
+            # Размер диапазона проверяем до разворачивания: «1-999999999» не должен строить множество
+            if last - first + 1 > MAX_BULK_IDS:
+                raise ValueError(f"Больше {MAX_BULK_IDS} броней за раз")
+            ids.update(range(first, last + 1))
+        else:
+            tokens = part.split()
+            # «-5», «+5» int() бы принял — ID только из цифр
+            if not all(token.isdigit() for token in tokens):
+                raise ValueError(part)
+            ids.update(int(token) for token in tokens)
+        if len(ids) > MAX_BULK_IDS:
+            raise ValueError(f"Больше {MAX_BULK_IDS} броней за раз")
+    if not ids:
+        raise ValueError("Пустой список")
+    return sorted(ids)
+
+
+def parse_day(text):
+    for fmt in ("%d.%m.%Y", "%d.%m"):
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if fmt == "%d.%m":
+            parsed = parsed.replace(year=datetime.now().year)
+        return parsed.date()
+    raise ValueError(text)
+
+
+def format_ids(ids):
+    """[101, 102, 103, 155] → «#101–#103, #155»."""
+    parts = []
+    ids = sorted(ids)
+    start = prev = None
+    for booking_id in ids + [None]:
+        if booking_id is not None and prev is not None and booking_id == prev + 1:
+            prev = booking_id
+            continue
+        if start is not None:
+            parts.append(f"#{start}" if start == prev else f"#{start}–#{prev}")
+        start = prev = booking_id
+    return ", ".join(parts)
+
+
+def render_bulk_summary(action, changes):
+    label = BULK_ACTIONS[action][1]
+    changed = [c.id for c in changes if c.changed]
+    missing = [c.id for c in changes if c.previous_status is None]
+    skipped = {}
+    for c in changes:
+        if not c.changed and c.previous_status is not None:
+            skipped.setdefault(c.previous_status, []).append(c.id)
+
+    lines = [f"✅ {label}: {format_ids(changed)}" if changed else f"ℹ️ {label}: ничего"]
+    for status, ids in skipped.items():
+        lines.append(f"⏭ Пропущены (статус {status}): {format_ids(ids)}")
+    if missing:
+        lines.append(f"❓ Не найдены: {format_ids(missing)}")
+    return "\n".join(lines)
+
+
+# Мультивыбор: ожидающие брони кнопками, отмеченные копятся прямо в клавиатуре
+async def send_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    rows = await context.application.bot_data["bookings"].list_pending_upcoming(datetime.now(), SELECTION_SIZE)
+    if not rows:
+        await update.message.reply_text("📭 Нет ожидающих броней.")
+        return
+
+    buttons = []
+    for row in rows:
+        time_str = row.scheduled_time.strftime("%d.%m %H:%M")
+        buttons.append([InlineKeyboardButton(
+            f"{UNSELECTED} #{row.id} · {time_str} · {row.full_name or '—'}",
+            callback_data=f"sel:t:{row.id}"
+        )])
+    buttons.append([
+        InlineKeyboardButton("✅ Подтвердить", callback_data="sel:approve"),
+        InlineKeyboardButton("🚫 Отменить", callback_data="sel:cancel"),
+    ])
+    await context.bot.send_message(
+        update.effective_chat.id,
+        "☑️ Отметьте брони и выберите действие:",
+        reply_markup=InlineKeyboardMarkup(buttons),
+        rate_limit_args=PRIORITY_BULK
+    )
+
+
+async def selection_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+
+    if not await is_admin(context, update.effective_user.id):
+        await query.answer("🚫 У вас нет прав администратора.")
+        return
+
+    keyboard = query.message.reply_markup.inline_keyboard
+    booking_rows = keyboard[:-1]
+
+    if query.data.startswith("sel:t:"):
+        await query.answer()
+        toggled = []
+        for (button,) in booking_rows:
+            text = button.text
+            if button.callback_data == query.data:
+                text = (UNSELECTED if text.startswith(SELECTED) else SELECTED) + text[1:]
+            toggled.append([InlineKeyboardButton(text, callback_data=button.callback_data)])
+        await query.edit_message_reply_markup(InlineKeyboardMarkup(toggled + [list(keyboard[-1])]))
+        return
+
+    action = query.data.split(":")[1]
+    selected = [
+        int(button.callback_data.split(":")[2])
+        for (button,) in booking_rows if button.text.startswith(SELECTED)
+    ]
+    if not selected:
+        await query.answer("Ничего не выбрано")
+        return
+    await query.answer()
+
+    status, _ = BULK_ACTIONS[action]
+    changes = await booking_state.transition_many(context.application.bot_data["bookings"], selected, status)
+    await query.edit_message_text(render_bulk_summary(action, changes))
+
+
+# Курсор страницы в callback_data: adm:<список>:<n|p>:<время>:<id>
+def encode_cursor(row):
+    time_part = row.scheduled_time.strftime(CURSOR_TIME_FORMAT) if row.scheduled_time else "-"
+    return f"{time_part}:{row.id}"
+
+
+def decode_cursor(time_part, booking_id):
+    scheduled_time = None if time_part == "-" else datetime.strptime(time_part, CURSOR_TIME_FORMAT)
+    return scheduled_time, int(booking_id)
+
+
+def render_bookings_page(list_code, rows, has_prev, has_next):
+    title = BOOKING_LISTS[list_code][0]
+    lines = [f"<b>{title}</b>"]
+    for row in rows:
+        client = html.escape(row.full_name or "—")
+        if row.telegram_id:
+            client = f'<a href="tg://user?id={row.telegram_id}">{client}</a>'
+        time_str = row.scheduled_time.strftime("%Y-%m-%d %H:%M") if row.scheduled_time else "—"
+        lines.append(
+            f"🆔 #{row.id} · 📅 {time_str} · 📌 {row.status}\n"
+            f"👤 {client} · 📞 {html.escape(row.phone or '—')}"
+        )
+
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton("◀️", callback_data=f"adm:{list_code}:p:{encode_cursor(rows[0])}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton("▶️", callback_data=f"adm:{list_code}:n:{encode_cursor(rows[-1])}"))
+    return "\n\n".join(lines), InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+# Первая страница списка — новым сообщением
+async def send_bookings_page(update: Update, context: ContextTypes.DEFAULT_TYPE, list_code):
+    _, active_only, empty_text = BOOKING_LISTS[list_code]
+    rows, has_next = await context.application.bot_data["bookings"].page_with_clients(
+        active_only, limit=ADMIN_PAGE_SIZE
+    )
+    if not rows:
+        await update.message.reply_text(empty_text)
+        return
+
+    text, keyboard = render_bookings_page(list_code, rows, False, has_next)
+    await context.bot.send_message(
+        update.effective_chat.id, text, parse_mode="HTML", reply_markup=keyboard, rate_limit_args=PRIORITY_BULK
+    )
+
+
+# Листание ◀️/▶️ — правим то же сообщение
+async def bookings_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+
+    if not await is_admin(context, update.effective_user.id):
+        await query.answer("🚫 У вас нет прав администратора.")
+        return
+    await query.answer()
+
+    _, list_code, direction, time_part, booking_id = query.data.split(":")
+    backward = direction == "p"
+    _, active_only, empty_text = BOOKING_LISTS[list_code]
+    rows, has_more = await context.application.bot_data["bookings"].page_with_clients(
+        active_only, cursor=decode_cursor(time_part, booking_id), backward=backward, limit=ADMIN_PAGE_SIZE
+    )
+    if not rows:
+        await query.edit_message_text(empty_text)
+        return
+
+    if backward:
+        text, keyboard = render_bookings_page(list_code, rows, has_more, True)
+    else:
+        text, keyboard = render_bookings_page(list_code, rows, True, has_more)
+    await context.bot.edit_message_text(
+        text, chat_id=query.message.chat_id, message_id=query.message.message_id,
+        parse_mode="HTML", reply_markup=keyboard, rate_limit_args=PRIORITY_BULK
+    )
+
+
+# Предлагаемая раскладка «мест в машине» по машинам на ближайшие дни
+async def send_trip_proposals(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    now = datetime.now()
+    seat_bookings = await context.application.bot_data["bookings"].list_seat_bookings(now, now + POOLING_HORIZON)
+    trips = propose_trips(seat_bookings)
+    if not trips:
+        await update.message.reply_text("📭 Нет броней «место в машине» на ближайшие дни.")
+        return
+
+    blocks = []
+    for number, trip in enumerate(trips, start=1):
+        ids = ", ".join(f"#{b.id}" for b in trip.bookings)
+        blocks.append(
+            f"🚐 <b>Машина {number}</b>: {trip.from_city} → {trip.to_city}, "
+            f"{trip.start.strftime('%d.%m %H:%M')} · мест {trip.taken}/{trip.seats}\n"
+            f"Брони: {ids}"
+        )
+
+    # Длинный список режем по лимиту длины сообщения Telegram
+    message = ""
+    for block in blocks:
+        if len(message) + len(block) > 3500:
+            await context.bot.send_message(
+                update.effective_chat.id, message, parse_mode="HTML", rate_limit_args=PRIORITY_BULK
+            )
+            message = ""
+        message += block + "\n\n"
+    await context.bot.send_message(
+        update.effective_chat.id, message, parse_mode="HTML", rate_limit_args=PRIORITY_BULK
+    )
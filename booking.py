@@ -9,7 +9,12 @@ from telegram.ext import (
 )
 import logging
 import datetime
-import re
+
+from send_queue import PRIORITY_HIGH
+from catalog import DestinationCatalog
+from dateparse import parse_when, parse_time, DateParseError
+from repository import RIDE_SEAT, RIDE_WHOLE_CAR, booking_seats
+from capacity import CAPACITY_SEATS, render_day_map
 
 
 logger = logging.getLogger(__name__)
@@ -50,12 +55,19 @@ DESTINATIONS = {
     "Северный вокзал": 1500,
 }
 
+# Каталог по умолчанию, пока не загружен каталог из базы
+DEFAULT_CATALOG = DestinationCatalog(DESTINATIONS)
+
+
+def get_catalog(context):
+    return context.bot_data.get("catalog") or DEFAULT_CATALOG
+
 # Шаг 1 — выбор типа поездки
 async def choose_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
     selected = update.message.text.strip()
-    if selected not in ["🚗 Место в машине", "🚘 Вся машина"]:
+    if selected not in [RIDE_SEAT, RIDE_WHOLE_CAR]:
         await update.message.reply_text("🚕 Выберите способ поездки:", reply_markup=ReplyKeyboardMarkup([
-            ["🚗 Место в машине", "🚘 Вся машина"]
+            [RIDE_SEAT, RIDE_WHOLE_CAR]
         ], resize_keyboard=True))
         return CHOOSE_TYPE
 
@@ -79,10 +91,7 @@ async def choose_direction(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await update.message.reply_text(
             "📍 Выберите точку отправления в Казани:",
-            reply_markup=ReplyKeyboardMarkup(
-                [list(DESTINATIONS.keys())[i:i+2] for i in range(0, len(DESTINATIONS), 2)],
-                resize_keyboard=True
-            )
+            reply_markup=get_catalog(context).keyboard
         )
     return ENTER_ADDRESS_FROM
 
@@ -91,22 +100,20 @@ async def enter_address_from(update: Update, context: ContextTypes.DEFAULT_TYPE)
     from_city = context.user_data['from_city']
 
     if from_city == "Казань":
-        selected_point = update.message.text.strip()
-        if selected_point not in DESTINATIONS:
+        catalog = get_catalog(context)
+        selected_point = catalog.lookup(update.message.text.strip())
+        if not selected_point:
             await update.message.reply_text("❌ Выберите корректную точку из списка.")
             return ENTER_ADDRESS_FROM
         context.user_data['from_address'] = selected_point
-        context.user_data['price'] = DESTINATIONS[selected_point]
+        context.user_data['price'] = catalog.price(selected_point)
 
         await update.message.reply_text("🏠 Укажите точный адрес назначения в Нижнекамске:")
     else:
         context.user_data['from_address'] = update.message.text.strip()
         await update.message.reply_text(
             "📍 Выберите точку назначения в Казани:",
-            reply_markup=ReplyKeyboardMarkup(
-                [list(DESTINATIONS.keys())[i:i+2] for i in range(0, len(DESTINATIONS), 2)],
-                resize_keyboard=True
-            )
+            reply_markup=get_catalog(context).keyboard
         )
     return CHOOSE_POINT_TO
 
@@ -115,64 +122,92 @@ async def choose_point_to(update: Update, context: ContextTypes.DEFAULT_TYPE):
     from_city = context.user_data['from_city']
 
     if from_city == "Нижнекамск":
-        selected_point = update.message.text.strip()
-        if selected_point not in DESTINATIONS:
+        catalog = get_catalog(context)
+        selected_point = catalog.lookup(update.message.text.strip())
+        if not selected_point:
             await update.message.reply_text("❌ Выберите корректную точку назначения из списка.")
             return CHOOSE_POINT_TO
         context.user_data['to_address'] = selected_point
-        context.user_data['price'] = DESTINATIONS[selected_point]
+        context.user_data['price'] = catalog.price(selected_point)
     else:
         context.user_data['to_address'] = update.message.text.strip()
 
-    await update.message.reply_text("📅 Введите дату поездки (ДД.ММ.ГГГГ):")
+    await update.message.reply_text("📅 Когда поездка? Дата (ДД.ММ.ГГГГ), «завтра», «пт» — можно сразу с временем: «завтра в 7»")
     return ENTER_DATE
 
-# Шаг 5 — ввод даты
+# Шаг 5 — ввод даты (можно сразу с временем: «завтра в 7», «пт 18:30»)
 async def enter_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    date_text = update.message.text.strip()
     try:
-        ride_date = datetime.datetime.strptime(date_text, "%d.%m.%Y").date()
+        ride_date, ride_time = parse_when(update.message.text)
         if ride_date < datetime.date.today():
-            raise ValueError("Дата в прошлом")
-        context.user_data['date'] = ride_date
-    except Exception:
-        await update.message.reply_text("❌ Введите дату в формате ДД.ММ.ГГГГ (например, 24.05.2025)")
+            raise DateParseError("Дата в прошлом")
+    except DateParseError:
+        await update.message.reply_text(
+            "❌ Не понял дату. Напишите, например: 24.05.2025, 24.05, завтра, пт или «завтра в 7»"
+        )
         return ENTER_DATE
+    context.user_data['date'] = ride_date
+
+    if ride_time is not None:
+        # Время указано в том же сообщении — шаг ENTER_TIME не нужен, если в этом часе есть места
+        return await accept_time(update, context, ride_time)
 
-    await update.message.reply_text("🕒 Когда вы хотите быть на месте? (в формате HH:MM, например, 09:30)")
+    await update.message.reply_text(
+        f"{await day_map_text(context)}\n\n"
+        "🕒 Когда вы хотите быть на месте? (например, 09:30 или «в 7 вечера»)"
+    )
     return ENTER_TIME  # ← правильный переход на следующий шаг
 
 # Шаг 6 — ввод времени
 async def enter_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    time = update.message.text.strip()
-
-    # Проверка формата: одна или две цифры для часов + две цифры для минут
-    if not re.match(r"^\d{1,2}:\d{2}$", time):
-        await update.message.reply_text("❗ Введите время в формате HH:MM (например, 08:45)")
+    try:
+        ride_time = parse_time(update.message.text)
+    except DateParseError:
+        await update.message.reply_text("❌ Не понял время. Напишите, например: 09:30, 9.30, 9 или «в 7 вечера»")
         return ENTER_TIME
 
-    try:
-        # Преобразуем и нормализуем (например, 6:5 -> 06:05)
-        hours, minutes = map(int, time.split(":"))
-        if not (0 <= hours <= 23 and 0 <= minutes <= 59):
-            raise ValueError("Некорректное время")
-        normalized_time = f"{hours:02d}:{minutes:02d}"
-        context.user_data['time'] = normalized_time
-    except Exception:
-        await update.message.reply_text("❗ Введите корректное время (например, 08:45)")
+    return await accept_time(update, context, ride_time)
+
+
+# Свободные места берутся из кэша карты дня (capacity.py), без подсчёта на каждое сообщение
+async def day_map_text(context):
+    user_data = context.user_data
+    free = await context.bot_data["availability"].day_map(user_data['from_city'], user_data['to_city'], user_data['date'])
+    return render_day_map(free, user_data['date'], booking_seats(user_data['ride_type']))
+
+
+async def accept_time(update: Update, context: ContextTypes.DEFAULT_TYPE, ride_time):
+    user_data = context.user_data
+    moment = datetime.datetime.combine(user_data['date'], ride_time)
+    # «сегодня в 7», отправленное вечером
+    if moment <= datetime.datetime.now():
+        await update.message.reply_text(
+            f"❌ {ride_time.strftime('%H:%M')} уже прошло. Выберите другое время.\n\n{await day_map_text(context)}"
+        )
+        return ENTER_TIME
+    free = await context.bot_data["availability"].free_seats(user_data['from_city'], user_data['to_city'], moment)
+    if free < booking_seats(user_data['ride_type']):
+        await update.message.reply_text(
+            f"❌ На {ride_time.hour:02d}:00 мест нет. Выберите другое время.\n\n{await day_map_text(context)}"
+        )
         return ENTER_TIME
 
-    await update.message.reply_text(
+    user_data['time'] = ride_time.strftime("%H:%M")
+    await update.message.reply_text(confirmation_text(user_data))
+    return CONFIRM_BOOKING
+
+
+def confirmation_text(user_data):
+    return (
         f"🔒 Подтвердите бронирование:\n\n"
-        f"Тип: {context.user_data['ride_type']}\n"
-        f"Из: {context.user_data['from_city']} ({context.user_data['from_address']})\n"
-        f"В: {context.user_data['to_city']} ({context.user_data['to_address']})\n"
-        f"Дата: {context.user_data['date']}\n"
-        f"Время: {context.user_data['time']}\n"
-        f"💰 Стоимость: {context.user_data['price']} р\n\n"
+        f"Тип: {user_data['ride_type']}\n"
+        f"Из: {user_data['from_city']} ({user_data['from_address']})\n"
+        f"В: {user_data['to_city']} ({user_data['to_address']})\n"
+        f"Дата: {user_data['date']}\n"
+        f"Время: {user_data['time']}\n"
+        f"💰 Стоимость: {user_data['price']} р\n\n"
         f"Напишите 'Подтверждаю' или 'Отмена'"
     )
-    return CONFIRM_BOOKING
 
 # Шаг 7 — подтверждение
 async def confirm_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -181,23 +216,20 @@ async def confirm_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Бронирование отменено.", reply_markup=main_menu)
         return ConversationHandler.END
 
-    conn = context.bot_data.get("conn")
-    cursor = context.bot_data.get("cursor")
+    users = context.bot_data.get("users")
+    bookings = context.bot_data.get("bookings")
 
-    if not conn or not cursor:
+    if not users or not bookings:
         await update.message.reply_text("⚠️ Ошибка сервера. Повторите позже.", reply_markup=main_menu)
         return ConversationHandler.END
 
     telegram_id = update.effective_user.id
-    cursor.execute("SELECT id FROM users WHERE telegram_id = %s", (telegram_id,))
-    user_row = cursor.fetchone()
+    user = await users.get_by_telegram_id(telegram_id)
 
-    if not user_row:
+    if not user:
         await update.message.reply_text("⚠️ Пользователь не найден. Попробуйте /start заново.")
         return ConversationHandler.END
 
-    user_id = user_row[0]
-
     try:
         # Объединяем дату и время в scheduled_time
         ride_date = context.user_data['date']
@@ -206,43 +238,44 @@ async def confirm_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
         scheduled_datetime = datetime.datetime.combine(ride_date, ride_time)
 
 
-        # Выполняем корректную вставку
-        cursor.execute("""
-            INSERT INTO bookings (
-                client_id,
-                from_city,
-                to_city,
-                pickup_point,
-                destination_point,
-                scheduled_time,
-                price,
-                ride_type,
-                status
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'pending')
-        """, (
-            user_id,
+        # Вставка с проверкой вместимости часа под advisory-локом (транзакция откатывается при ошибке)
+        booking_id, _ = await bookings.create_within_capacity(
+            user.id,
             context.user_data['from_city'],
             context.user_data['to_city'],
             context.user_data['from_address'],
             context.user_data['to_address'],
             scheduled_datetime,
             context.user_data['price'],
-            context.user_data['ride_type']
-        ))
-        conn.commit()
-
-        await update.message.reply_text(
-            "✅ Ваша заявка принята! Ожидайте подтверждения от администратора.",
-            reply_markup=main_menu
+            context.user_data['ride_type'],
+            CAPACITY_SEATS,
         )
-        logger.info("Бронь создана для пользователя %s", telegram_id)
+        # Карта дня изменилась — сбрасываем её здесь, не дожидаясь события из базы
+        context.bot_data["availability"].invalidate(
+            context.user_data['from_city'], context.user_data['to_city'], ride_date
+        )
+        # Место заняли, пока клиент подтверждал, — предлагаем другое время
+        if booking_id is None:
+            await update.message.reply_text(
+                f"❌ Пока вы подтверждали, места на {ride_time.hour:02d}:00 закончились. "
+                f"Выберите другое время.\n\n{await day_map_text(context)}"
+            )
+            return ENTER_TIME
+        bookings.invalidate_client(telegram_id)
 
     except Exception as e:
         logger.exception("Ошибка при записи брони:")
-        conn.rollback()
         await update.message.reply_text("❌ Ошибка при бронировании. Попробуйте позже.", reply_markup=main_menu)
+        return ConversationHandler.END
 
+    # Ответ — вне try: бронь уже записана, сбой отправки не должен выглядеть как ошибка бронирования
+    logger.info("Бронь #%s создана для пользователя %s", booking_id, telegram_id)
+    await context.bot.send_message(
+        update.effective_chat.id,
+        "✅ Ваша заявка принята! Ожидайте подтверждения от администратора.",
+        reply_markup=main_menu,
+        rate_limit_args=PRIORITY_HIGH
+    )
     return ConversationHandler.END
 
 # Шаг 8 — необязательный дополнительный ввод
@@ -0,0 +1,105 @@
+"""Переходы статусов брони — единственное место, где они меняются.
+
+Каждый переход — один условный UPDATE (WHERE status IN (...)), поэтому
+одновременные подтверждение админом и отмена клиентом не затирают
+друг друга: второй просто увидит, что статус уже другой.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+
+# Новый статус -> из каких статусов в него можно перейти
+TRANSITIONS = {
+    "confirmed": ("pending",),
+    "cancelled": ("pending", "confirmed"),
+    "completed": ("confirmed",),
+    "expired": ("pending",),
+}
+
+# Статусы так, как их видит клиент («Мои брони», ответы на отмену)
+STATUS_LABELS = {
+    "pending": "⏳ В ожидании",
+    "confirmed": "✅ Подтверждено",
+    "cancelled": "❌ Отменено",
+    "completed": "🏁 Завершено",
+    "expired": "⌛ Истекло",
+}
+
+# Отмена позже, чем за 12 часов до поездки, — без возврата предоплаты.
+# То же окно зашито в bookings_mark_late_cancel (миграция 0009) для флага
+# cancelled_late в отчётах: при изменении поменяйте и его новой миграцией.
+REFUND_WINDOW = timedelta(hours=12)
+
+
+@dataclass(frozen=True)
+class TransitionResult:
+    booking_id: int
+    found: bool
+    changed: bool
+    previous_status: Optional[str] = None
+    scheduled_time: Optional[datetime] = None
+
+
+def allowed_from(status):
+    return TRANSITIONS[status]
+
+
+def status_label(status):
+    return STATUS_LABELS.get(status, status)
+
+
+def is_refundable(scheduled_time, now=None):
+    """None — время поездки неизвестно, возврат не рассчитать."""
+    if scheduled_time is None:
+        return None
+    now = now or datetime.now()
+    return scheduled_time - now >= REFUND_WINDOW
+
+
+def refund_message(scheduled_time, now=None):
+    refundable = is_refundable(scheduled_time, now)
+    if refundable is None:
+        return "⚠️ Время поездки не указано. Бронь отменена без расчёта возврата."
+    if refundable:
+        return "✅ Предоплата будет возвращена в полном объёме."
+    return "⚠️ До поездки осталось менее 12 часов — предоплата не возвращается."
+
+
+async def transition(bookings, booking_id, status, actor="admin", owner_telegram_id=None):
+    """actor — кто меняет статус: client, admin или system (для уведомлений)."""
+    row = await bookings.transition(booking_id, status, allowed_from(status), actor, owner_telegram_id)
+    if row is None:
+        return TransitionResult(booking_id, found=False, changed=False)
+    previous_status, scheduled_time, changed = row
+    return TransitionResult(booking_id, True, changed, previous_status, scheduled_time)
+
+
+async def cancel_by_client(bookings, booking_id, telegram_id):
+    result = await transition(bookings, booking_id, "cancelled", actor="client", owner_telegram_id=telegram_id)
+    if result.changed:
+        bookings.invalidate_client(telegram_id)
+    return result
+
+
+async def transition_many(bookings, booking_ids, status, actor="admin"):
+    return await bookings.set_status_many(booking_ids, status, allowed_from(status), actor)
+
+
+async def transition_day(bookings, day, status, actor="admin"):
+    return await bookings.set_status_for_date(day, status, allowed_from(status), actor)
+
+
+async def transition_due(bookings, status, before, limit, actor="system"):
+    return await bookings.transition_due(status, allowed_from(status), before, actor, limit)
+
+
+def cancel_result_text(result):
+    """Ответ клиенту на отмену — одинаковый для всех путей отмены."""
+    if not result.found:
+        return "❌ Бронь не найдена или вы не являетесь её владельцем."
+    if result.changed:
+        return f"🚫 Бронь #{result.booking_id} успешно отменена.\n{refund_message(result.scheduled_time)}"
+    if result.previous_status == "cancelled":
+        return "ℹ️ Эта бронь уже отменена."
+    return f"ℹ️ Бронь в статусе «{status_label(result.previous_status)}» отменить нельзя."
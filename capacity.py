@@ -0,0 +1,107 @@
+"""Вместимость рейсов по направлению и часу отправления.
+
+Вместимость часа — места в машинах, которые ходят в этот час: строка
+ride_capacity (миграция 0012) или CAPACITY_SEATS по умолчанию. Бронь
+«вся машина» занимает VEHICLE_SEATS мест, «место в машине» — одно.
+
+Проверка при создании брони — в BookingRepository.create_within_capacity
+(advisory-лок на час направления). Клиенту свободные места показываются
+уже на шаге времени по карте дня из кэша: один запрос на направление и
+день, а не подсчёт на каждое сообщение. Кэш сбрасывается событиями
+booking_events по этому дню и направлению, в том числе из других воркеров.
+
+    /capacity Нижнекамск           # вместимость по часам
+    /capacity Нижнекамск 7 12      # из Нижнекамска в 07:00–07:59 — 12 мест
+"""
+import os
+from datetime import datetime
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from admin_role_handler import is_admin
+from cache import TTLCache
+from driver_role_handler import DIRECTIONS
+
+
+CAPACITY_SEATS = int(os.getenv("CAPACITY_SEATS", "16"))
+
+# Часы работы — только они показываются клиенту на карте дня
+SERVICE_HOURS = range(int(os.getenv("SERVICE_FIRST_HOUR", "5")), int(os.getenv("SERVICE_LAST_HOUR", "23")) + 1)
+HOURS_PER_ROW = 4
+
+
+class Availability:
+    """Карта дня: (откуда, куда, день) -> {час: свободных мест}."""
+
+    def __init__(self, bookings, capacities, default_seats=CAPACITY_SEATS, cache=None):
+        self.bookings = bookings
+        self.capacities = capacities
+        self.default_seats = default_seats
+        self.cache = cache if cache is not None else TTLCache(
+            maxsize=int(os.getenv("AVAILABILITY_CACHE_SIZE", "1000")),
+            ttl=float(os.getenv("AVAILABILITY_CACHE_TTL", "60")),
+        )
+
+    async def day_map(self, from_city, to_city, day):
+        key = (from_city, to_city, day)
+        free = self.cache.get(key)
+        if free is not None:
+            return free
+
+        capacity = await self.capacities.get(from_city, to_city)
+        used = await self.bookings.seats_used_by_hour(from_city, to_city, day)
+        free = {hour: capacity.get(hour, self.default_seats) - used.get(hour, 0) for hour in range(24)}
+        self.cache.set(key, free)
+        return free
+
+    async def free_seats(self, from_city, to_city, moment):
+        return (await self.day_map(from_city, to_city, moment.date()))[moment.hour]
+
+    def invalidate(self, from_city, to_city, day):
+        self.cache.invalidate((from_city, to_city, day))
+
+    def on_event(self, event):
+        """Событие из booking_events (см. notifications.py)."""
+        if event.get("from_city") and event.get("scheduled_time"):
+            day = datetime.fromisoformat(event["scheduled_time"]).date()
+            self.invalidate(event["from_city"], event["to_city"], day)
+
+
+def render_day_map(free, day, seats, now=None):
+    """Свободные места по часам для клиента; прошедшие часы сегодня не показываются."""
+    now = now or datetime.now()
+    hours = [hour for hour in SERVICE_HOURS if day > now.date() or (day == now.date() and hour > now.hour)]
+    if not hours:
+        return "⚠️ На этот день рейсов уже нет."
+
+    cells = [f"{hour:02d}:00 {'✅ ' + str(free[hour]) if free[hour] >= seats else '❌'}" for hour in hours]
+    rows = [" · ".join(cells[i:i + HOURS_PER_ROW]) for i in range(0, len(cells), HOURS_PER_ROW)]
+    return f"🪑 Свободные места {day.strftime('%d.%m')}:\n" + "\n".join(rows)
+
+
+async def capacity_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await is_admin(context, update.effective_user.id):
+        await update.message.reply_text("🚫 У вас нет прав администратора.")
+        return
+
+    args = context.args
+    direction = DIRECTIONS.get(args[0].lower()) if args else None
+    if direction is None or len(args) not in (1, 3) or not all(arg.isdigit() for arg in args[1:]):
+        await update.message.reply_text("❌ Формат: /capacity Нижнекамск или /capacity Нижнекамск 7 12")
+        return
+
+    availability = context.bot_data["availability"]
+    if len(args) == 3:
+        hour, seats = int(args[1]), int(args[2])
+        if hour > 23:
+            await update.message.reply_text("❌ Час — от 0 до 23")
+            return
+        await availability.capacities.set(*direction, hour, seats)
+        # Карты дней направления пересчитаются; в других воркерах — по истечении TTL
+        availability.cache.clear()
+
+    capacity = await availability.capacities.get(*direction)
+    lines = [f"🚐 {direction[0]} → {direction[1]}, мест по часам (по умолчанию {availability.default_seats}):"]
+    lines += [f"  {hour:02d}:00 — {seats}" for hour, seats in sorted(capacity.items())] or ["  везде по умолчанию"]
+    await update.message.reply_text("\n".join(lines))
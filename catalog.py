@@ -0,0 +1,117 @@
+import re
+import difflib
+import logging
+
+from telegram import ReplyKeyboardMarkup
+
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize(text):
+    """Ключ для поиска: регистр, ё/е, пунктуация и лишние пробелы не важны."""
+    text = text.casefold().replace("ё", "е")
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+class DestinationCatalog:
+    """Неизменяемый снимок каталога точек и тарифов.
+
+    Индексы и клавиатура строятся один раз при загрузке; при смене
+    тарифов создаётся новый снимок и подменяется целиком.
+    """
+
+    def __init__(self, prices, version=None, fuzzy_cutoff=0.75):
+        self.prices = dict(prices)
+        self.version = version
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._by_key = {normalize(name): name for name in self.prices}
+        self._lookups = {}
+        self.keyboard = ReplyKeyboardMarkup(
+            [list(self.prices)[i:i + 2] for i in range(0, len(self.prices), 2)],
+            resize_keyboard=True
+        )
+
+    def __contains__(self, name):
+        return name in self.prices
+
+    def price(self, name):
+        return self.prices[name]
+
+    def lookup(self, text):
+        """Название точки по тексту пользователя или None.
+
+        Точное совпадение, затем без учёта регистра и пунктуации,
+        затем однозначное начало названия, затем ближайшее по похожести (опечатки).
+        """
+        if text in self.prices:
+            return text
+
+        key = normalize(text)
+        if key in self._lookups:
+            return self._lookups[key]
+
+        name = self._by_key.get(key)
+        prefixed = []
+        if name is None and len(key) >= 3:
+            # Начало названия, если оно однозначно: «бутлерова» → «Бутлерова 14 и 41»
+            prefixed = [n for k, n in self._by_key.items() if k.startswith(key)]
+            if len(prefixed) == 1:
+                name = prefixed[0]
+        # «жд вокзал» — начало нескольких точек с разной ценой: переспрашиваем, а не угадываем
+        if name is None and key and len(prefixed) < 2:
+            name = self._closest(key)
+
+        # Кэш ответов ограничен, чтобы случайный ввод не раздувал память
+        if len(self._lookups) < 4096:
+            self._lookups[key] = name
+        return name
+
+
+    def _closest(self, key):
+        """Ближайшее по похожести название; при равной похожести двух — None."""
+        matches = difflib.get_close_matches(key, self._by_key, n=2, cutoff=self.fuzzy_cutoff)
+        if not matches:
+            return None
+        if len(matches) == 2:
+            ratios = [difflib.SequenceMatcher(None, key, match).ratio() for match in matches]
+            if ratios[0] == ratios[1]:
+                return None
+        return self._by_key[matches[0]]
+
+
+async def catalog_version(db):
+    return await db.fetchone("SELECT count(*), max(updated_at) FROM destinations")
+
+
+async def load_catalog(db, defaults):
+    """Читает каталог из базы; пустую таблицу заполняет значениями по умолчанию."""
+    version = await catalog_version(db)
+    if version[0] == 0:
+        async with db.transaction() as tx:
+            for order, (name, price) in enumerate(defaults.items()):
+                await tx.execute(
+                    "INSERT INTO destinations (name, price, sort_order) VALUES (%s, %s, %s) "
+                    "ON CONFLICT (name) DO NOTHING",
+                    (name, price, order)
+                )
+        version = await catalog_version(db)
+
+    rows = await db.fetchall(
+        "SELECT name, price FROM destinations WHERE active ORDER BY sort_order, name"
+    )
+    return DestinationCatalog({name: price for name, price in rows}, version=tuple(version))
+
+
+async def refresh_catalog(db, catalog, defaults):
+    """Новый снимок, если тарифы в базе поменялись, иначе текущий."""
+    version = tuple(await catalog_version(db))
+    if catalog is not None and version == catalog.version:
+        return catalog
+    new_catalog = await load_catalog(db, defaults)
+    logger.info("Каталог направлений перезагружен: %s точек", len(new_catalog.prices))
+    return new_catalog
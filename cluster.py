@@ -0,0 +1,282 @@
+"""Несколько воркеров бота на одной базе (BOT_MODE=worker).
+
+Апдейты принимает ingress.py и складывает в incoming_updates с номером
+партиции telegram_id % CLUSTER_PARTITIONS. Партиции раздаются воркерам
+в аренду (worker_leases): у каждой партиции один владелец, поэтому
+апдейты одного пользователя обрабатываются одним процессом и по порядку,
+а его диалог и user_data в памяти этого процесса актуальны.
+
+Воркер продлевает аренду каждые CLUSTER_LEASE_SECONDS / 3 и держит
+примерно поровну партиций с остальными живыми воркерами. Если воркер
+умер, его аренда истекает, и партиции подбирают другие: перед этим они
+перечитывают из Postgres диалоги и user_data пользователей этих партиций.
+Апдейт удаляется из очереди только после обработки и записи состояния,
+так что при падении он будет обработан заново новым владельцем.
+
+Задачи job_queue по общей базе (напоминания, смена статусов, добор
+назначений, вычистка диалогов) выполняет только владелец партиции 0 —
+ведущий воркер, см. leads() и jobs.leads().
+"""
+import os
+import math
+import uuid
+import socket
+import asyncio
+import logging
+
+import psycopg
+import telegram
+from telegram import Update
+from telegram.ext import ConversationHandler
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "incoming_updates"
+CLUSTER_PARTITIONS = int(os.getenv("CLUSTER_PARTITIONS", "64"))
+LEASE_SECONDS = float(os.getenv("CLUSTER_LEASE_SECONDS", "15"))
+CLUSTER_BATCH = int(os.getenv("CLUSTER_BATCH", "200"))
+# _load_state пишет во внутренний ConversationHandler._conversations (TrackingDict):
+# публичного способа перечитать диалоги у PTB нет. Проверено на PTB 21.x; при
+# обновлении мажорной версии сверить с telegram/ext/_handlers/conversationhandler.py
+PTB_MAJOR = 21
+
+
+def partition_of(telegram_id, count=CLUSTER_PARTITIONS):
+    return abs(telegram_id) % count
+
+
+def update_owner_id(payload):
+    """telegram_id, по которому партиционируется апдейт (как ключ диалога)."""
+    for value in payload.values():
+        if isinstance(value, dict):
+            sender = value.get("from") or value.get("user") or value.get("chat")
+            if isinstance(sender, dict) and "id" in sender:
+                return sender["id"]
+    return 0
+
+
+class ClusterWorker:
+    def __init__(self, app, conninfo, worker_id=None, partitions=CLUSTER_PARTITIONS,
+                 lease_seconds=LEASE_SECONDS, batch=CLUSTER_BATCH):
+        if telegram.__version_info__[0] != PTB_MAJOR:
+            raise RuntimeError(
+                f"Кластерный режим проверен на PTB {PTB_MAJOR}.x, установлен {telegram.__version__}"
+            )
+        self.app = app
+        self.db = app.bot_data["db"]
+        self.conninfo = conninfo
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.partitions = partitions
+        self.lease_seconds = lease_seconds
+        self.batch = batch
+        self.owned = set()
+        self.processed = 0
+        self._wakeup = asyncio.Event()
+        # Перебалансировка ждёт, пока не закончится текущая пачка
+        self._consume_lock = asyncio.Lock()
+        self._lease_valid_until = 0.0
+
+    def leads(self):
+        """Ведущий — владелец партиции 0: он один запускает глобальные задачи job_queue."""
+        return 0 in self.owned and asyncio.get_running_loop().time() <= self._lease_valid_until
+
+    def owns(self, telegram_id):
+        return partition_of(telegram_id, self.partitions) in self.owned
+
+    def stats(self):
+        return {"worker": self.worker_id, "partitions": len(self.owned), "processed": self.processed}
+
+    async def run(self):
+        await self.db.execute(
+            "INSERT INTO worker_leases (partition) SELECT generate_series(0, %s - 1) ON CONFLICT DO NOTHING",
+            (self.partitions,)
+        )
+        logger.info("Воркер %s запущен (%s партиций в кластере)", self.worker_id, self.partitions)
+        tasks = [asyncio.create_task(coro) for coro in (self._lease_loop(), self._listen(), self._consume_loop())]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._release(set(self.owned))
+            await self.db.execute("DELETE FROM cluster_workers WHERE worker_id = %s", (self.worker_id,))
+
+    # --- аренда партиций ---
+
+    async def _lease_loop(self):
+        while True:
+            try:
+                await self._rebalance()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Ошибка продления аренды партиций")
+            await asyncio.sleep(self.lease_seconds / 3)
+
+    async def _rebalance(self):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        async with self.db.transaction() as tx:
+            await tx.execute("""
+                INSERT INTO cluster_workers (worker_id, heartbeat_at) VALUES (%s, now())
+                ON CONFLICT (worker_id) DO UPDATE SET heartbeat_at = now()
+            """, (self.worker_id,))
+            live = (await tx.fetchone(
+                "SELECT count(*) FROM cluster_workers WHERE heartbeat_at > now() - make_interval(secs => %s)",
+                (self.lease_seconds,)
+            ))[0]
+            renewed = await tx.fetchall(
+                "UPDATE worker_leases SET expires_at = now() + make_interval(secs => %s) "
+                "WHERE worker_id = %s AND expires_at > now() RETURNING partition",
+                (self.lease_seconds, self.worker_id)
+            )
+        held = {row[0] for row in renewed}
+        self._lease_valid_until = started + self.lease_seconds
+
+        lost = self.owned - held
+        if lost:
+            logger.warning("Аренда партиций %s потеряна", sorted(lost))
+            async with self._consume_lock:
+                self.owned -= lost
+
+        target = math.ceil(self.partitions / max(live, 1))
+        if len(held) > target:
+            await self._release(set(sorted(held)[target:]))
+        elif len(held) < target:
+            acquired = await self._acquire(target - len(held))
+            if acquired:
+                await self._load_state(acquired)
+                async with self._consume_lock:
+                    self.owned |= acquired
+                logger.info("Взяты партиции %s, всего %s", sorted(acquired), len(self.owned))
+                self._wakeup.set()
+
+    async def _acquire(self, limit):
+        rows = await self.db.fetchall("""
+            UPDATE worker_leases SET worker_id = %s, expires_at = now() + make_interval(secs => %s)
+            WHERE partition IN (
+                SELECT partition FROM worker_leases
+                WHERE expires_at <= now()
+                ORDER BY partition
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING partition
+        """, (self.worker_id, self.lease_seconds, limit))
+        return {row[0] for row in rows}
+
+    async def _release(self, partitions):
+        if not partitions:
+            return
+        async with self._consume_lock:
+            self.owned -= partitions
+            # Состояние уходящих пользователей должно быть в базе до того, как их возьмёт другой воркер
+            await self.app.update_persistence()
+        await self.db.execute(
+            "UPDATE worker_leases SET worker_id = NULL, expires_at = '-infinity' "
+            "WHERE worker_id = %s AND partition = ANY(%s)",
+            (self.worker_id, list(partitions))
+        )
+        logger.info("Отданы партиции %s", sorted(partitions))
+
+    async def _load_state(self, partitions):
+        """Перечитывает из базы диалоги и user_data пользователей новых партиций."""
+        persistence = self.app.persistence
+        user_data = await persistence.get_partition_user_data(partitions, self.partitions)
+        for user_id, data in user_data.items():
+            current = self.app.user_data[user_id]
+            current.clear()
+            current.update(data)
+
+        for handlers in self.app.handlers.values():
+            for handler in handlers:
+                if isinstance(handler, ConversationHandler) and handler.persistent:
+                    stored = await persistence.get_partition_conversations(handler.name, partitions, self.partitions)
+                    conversations = handler._conversations  # см. PTB_MAJOR
+                    for key in [k for k in conversations if partition_of(k[-1], self.partitions) in partitions]:
+                        if key not in stored:
+                            # Диалог закончился у прежнего владельца
+                            del conversations.data[key]
+                    conversations.update_no_track(stored)
+
+    # --- очередь апдейтов ---
+
+    async def _listen(self):
+        delay = 1
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.conninfo, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    delay = 1
+                    async for notify in conn.notifies():
+                        if int(notify.payload) in self.owned:
+                            self._wakeup.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("LISTEN %s оборвался, переподключение через %s c", CHANNEL, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    async def _consume_loop(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                async with self._consume_lock:
+                    processed = await self._consume_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Ошибка обработки очереди апдейтов")
+                processed = 0
+            if processed < self.batch:
+                # NOTIFY будит сразу, таймаут — подстраховка на случай пропущенного уведомления
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), 1.0)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _consume_batch(self):
+        # Просроченная аренда могла уже уйти другому воркеру — не обрабатываем
+        if not self.owned or asyncio.get_running_loop().time() > self._lease_valid_until:
+            return 0
+        rows = await self.db.fetchall(
+            "SELECT id, payload FROM incoming_updates WHERE partition = ANY(%s) ORDER BY id LIMIT %s",
+            (list(self.owned), self.batch)
+        )
+        if not rows:
+            return 0
+
+        # Разные чаты — параллельно, один чат — по порядку (ChatOrderedUpdateProcessor)
+        processor = self.app.update_processor
+        updates = [Update.de_json(payload, self.app.bot) for _, payload in rows]
+        await asyncio.gather(*(
+            processor.process_update(update, self.app.process_update(update)) for update in updates
+        ))
+        await self.app.update_persistence()
+        await self.db.execute("DELETE FROM incoming_updates WHERE id = ANY(%s)", ([row[0] for row in rows],))
+        self.processed += len(rows)
+        return len(rows)
+
+
+async def run_worker(app, conninfo):
+    """Жизненный цикл приложения без updater: апдейты приходят из очереди."""
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await app.start()
+    worker = ClusterWorker(app, conninfo, partitions=int(os.getenv("CLUSTER_PARTITIONS", "64")))
+    app.bot_data["cluster"] = worker
+    if app.bot_data.get("notifier"):
+        app.bot_data["notifier"].owns = worker.owns
+    if app.bot_data.get("dispatcher"):
+        app.bot_data["dispatcher"].owns = worker.owns
+    try:
+        await worker.run()
+    finally:
+        await app.stop()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+        await app.shutdown()
@@ -0,0 +1,207 @@
+"""Разбор даты и времени поездки из свободного текста.
+
+Понимает то, что клиенты реально пишут на шаге даты:
+
+    24.05.2025, 24.05.25, 24.05, 24/05, 24 мая
+    сегодня, завтра, послезавтра, через 3 дня
+    пт, пятница, в пятницу
+    завтра в 7, завтра 9.30, пт 18:30, 24.05 в 9 вечера, в 7:30 утра
+
+Все шаблоны скомпилированы при импорте; для канонических «ДД.ММ.ГГГГ» и
+«ЧЧ:ММ» есть быстрый путь без strptime. Разбор одного сообщения занимает
+единицы микросекунд:
+
+    python dateparse.py            # бенчмарк по набору типичных фраз
+"""
+import re
+import datetime
+
+
+class DateParseError(ValueError):
+    pass
+
+
+MONTHS = {
+    "янв": 1, "фев": 2, "мар": 3, "апр": 4, "май": 5, "мая": 5, "июн": 6,
+    "июл": 7, "авг": 8, "сен": 9, "окт": 10, "ноя": 11, "дек": 12,
+}
+WEEKDAYS = {
+    "пн": 0, "пон": 0, "вт": 1, "вто": 1, "ср": 2, "сре": 2, "чт": 3, "чет": 3,
+    "пт": 4, "пят": 4, "сб": 5, "суб": 5, "вс": 6, "вос": 6,
+}
+RELATIVE_DAYS = {"сегодня": 0, "завтра": 1, "послезавтра": 2}
+
+# Слова-связки, которые могут остаться после разбора
+FILLER = frozenset({"в", "во", "на", "к", "ко", "часов", "часа", "час", "ч", "мин", "минут"})
+
+# Канонические форматы — быстрый путь
+_FULL_DATE_RE = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})")
+_HH_MM_RE = re.compile(r"(\d{1,2}):(\d{2})")
+
+_NUMERIC_DATE_RE = re.compile(r"(?<![\d:])(\d{1,2})[./](\d{1,2})(?:[./](\d{4}|\d{2}))?(?![\d:])")
+_WORD_DATE_RE = re.compile(
+    r"(?<!\d)(\d{1,2})\s+(янв|фев|мар|апр|ма[йя]|июн|июл|авг|сен|окт|ноя|дек)[а-я]*\.?(?:\s+(\d{4}))?"
+)
+_RELATIVE_RE = re.compile(r"\b(послезавтра|завтра|сегодня)\b")
+_IN_DAYS_RE = re.compile(r"\bчерез\s+(\d{1,2})\s+(?:день|дня|дней)\b")
+_WEEKDAY_RE = re.compile(
+    r"\b(пн|вт|ср|чт|пт|сб|вс|пон|вто|сре|чет|пят|суб|вос)(?:[а-я]*)\.?(?![а-я])"
+)
+# «в 7», «к 9:30», «18:30», «9.30», «7 утра», «в 9 вечера»
+_TIME_RE = re.compile(
+    r"(?:\b(?:в|во|к|ко)\s+)?(?<![\d.])(\d{1,2})(?:[:.](\d{2}))?"
+    r"(?:\s*(утра|дня|вечера|ночи))?(?![\d.])"
+)
+# В ответ на вопрос о времени: «9», «9 30», «9.30», «0930»
+_BARE_TIME_RE = re.compile(r"(\d{1,2})(?:[:.\s]?(\d{2}))?(?:\s*(утра|дня|вечера|ночи))?")
+_WORDS_RE = re.compile(r"[а-яa-z]+|\d+")
+
+
+def _make_time(hours, minutes, part_of_day):
+    hours, minutes = int(hours), int(minutes or 0)
+    if part_of_day in ("дня", "вечера") and hours < 12:
+        hours += 12
+    elif part_of_day == "ночи" and hours == 12:
+        hours = 0
+    if not (0 <= hours <= 23 and 0 <= minutes <= 59):
+        raise DateParseError("Некорректное время")
+    return datetime.time(hours, minutes)
+
+
+def _make_date(day, month, year, today):
+    if year is None:
+        candidate = datetime.date(today.year, month, day)
+        # «05.01», набранное в декабре, — это январь следующего года
+        return candidate if candidate >= today else candidate.replace(year=today.year + 1)
+    year = int(year)
+    if year < 100:
+        year += 2000
+    return datetime.date(year, month, day)
+
+
+def _normalize(text):
+    return " ".join(text.lower().replace("ё", "е").replace(",", " ").split())
+
+
+def parse_when(text, today=None):
+    """Дата и (если указано) время из одного сообщения → (date, time | None).
+
+    Бросает DateParseError, если даты нет или в тексте есть что-то,
+    кроме даты, времени и связок.
+    """
+    today = today or datetime.date.today()
+    text = text.strip()
+
+    match = _FULL_DATE_RE.fullmatch(text)
+    if match:
+        day, month, year = map(int, match.groups())
+        try:
+            return datetime.date(year, month, day), None
+        except ValueError:
+            raise DateParseError("Некорректная дата") from None
+
+    rest = _normalize(text)
+    ride_date = None
+    try:
+        for pattern in (_NUMERIC_DATE_RE, _WORD_DATE_RE):
+            for match in pattern.finditer(rest):
+                day, month, year = match.groups()
+                month = int(month) if month.isdigit() else MONTHS[month]
+                # «завтра 9.30» — время, а не 9-е число 30-го месяца
+                if month > 12 and year is None:
+                    continue
+                ride_date = _make_date(int(day), month, year, today)
+                break
+            if ride_date is not None:
+                break
+    except ValueError:
+        raise DateParseError("Некорректная дата") from None
+
+    if ride_date is None:
+        match = _RELATIVE_RE.search(rest)
+        if match:
+            ride_date = today + datetime.timedelta(days=RELATIVE_DAYS[match.group(1)])
+    if ride_date is None:
+        match = _IN_DAYS_RE.search(rest)
+        if match:
+            ride_date = today + datetime.timedelta(days=int(match.group(1)))
+    if ride_date is None:
+        match = _WEEKDAY_RE.search(rest)
+        if match:
+            ride_date = today + datetime.timedelta(days=(WEEKDAYS[match.group(1)] - today.weekday()) % 7)
+    if ride_date is None:
+        raise DateParseError("Дата не распознана")
+    rest = rest[:match.start()] + " " + rest[match.end():]
+
+    ride_time = None
+    match = _TIME_RE.search(rest)
+    if match:
+        ride_time = _make_time(*match.groups())
+        rest = rest[:match.start()] + " " + rest[match.end():]
+
+    if any(word not in FILLER for word in _WORDS_RE.findall(rest)):
+        raise DateParseError("Лишний текст")
+    return ride_date, ride_time
+
+
+def parse_time(text):
+    """Время в ответ на вопрос «Когда быть на месте?»: 09:30, 9, 9 30, 7 вечера."""
+    text = text.strip()
+    match = _HH_MM_RE.fullmatch(text)
+    if match:
+        return _make_time(match.group(1), match.group(2), None)
+
+    rest = _normalize(text)
+    for word in ("в ", "во ", "к ", "ко "):
+        if rest.startswith(word):
+            rest = rest[len(word):]
+            break
+    for suffix in (" часов", " часа", " ч"):
+        if rest.endswith(suffix):
+            rest = rest[:-len(suffix)]
+            break
+    match = _BARE_TIME_RE.fullmatch(rest)
+    if not match:
+        raise DateParseError("Время не распознано")
+    return _make_time(*match.groups())
+
+
+BENCH_PHRASES = (
+    "24.05.2025", "24.05", "24 мая", "завтра", "послезавтра", "пт", "в пятницу",
+    "завтра в 7", "завтра 9.30", "пт 18:30", "24.05 в 9 вечера", "через 3 дня в 7:30 утра", "какой-то текст",
+)
+
+
+def _bench(number):
+    import timeit
+
+    today = datetime.date.today()
+    print(f"{'фраза':<28}{'результат':<28}{'мкс/сообщение':>14}")
+    for phrase in BENCH_PHRASES:
+        try:
+            result = parse_when(phrase, today)
+            shown = f"{result[0]:%d.%m.%Y} {result[1].strftime('%H:%M') if result[1] else '—'}"
+        except DateParseError as exc:
+            shown = f"ошибка: {exc}"
+
+        def run():
+            try:
+                parse_when(phrase, today)
+            except DateParseError:
+                pass
+
+        seconds = min(timeit.repeat(run, number=number, repeat=3))
+        print(f"{phrase:<28}{shown:<28}{seconds / number * 1e6:>14.2f}")
+
+    baseline = min(timeit.repeat(
+        lambda: datetime.datetime.strptime("24.05.2025", "%d.%m.%Y").date(), number=number, repeat=3
+    ))
+    print(f"{'strptime(24.05.2025)':<56}{baseline / number * 1e6:>14.2f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора даты/времени")
+    parser.add_argument("-n", "--number", type=int, default=20000, help="повторов на фразу")
+    _bench(parser.parse_args().number)
@@ -0,0 +1,407 @@
+import io
+import os
+import csv
+import time
+import asyncio
+import logging
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+
+from metrics import observe_query
+
+
+logger = logging.getLogger(__name__)
+
+# Имена серверных курсоров уникальны в пределах соединения
+_cursor_ids = itertools.count(1)
+
+# Сколько всего ждать базу при старте (деплой, рестарт Postgres), прежде чем упасть
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "60"))
+
+
+async def _with_retries(connect, what):
+    """Повторяет connect() с экспоненциальной паузой, пока не выйдет DB_CONNECT_TIMEOUT."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + DB_CONNECT_TIMEOUT
+    delay = 0.5
+    attempt = 1
+    while True:
+        try:
+            return await connect()
+        except Exception as exc:
+            if loop.time() + delay > deadline:
+                raise
+            logger.warning("%s: попытка %s не удалась (%s), повтор через %.1f c", what, attempt, exc, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 8)
+            attempt += 1
+
+
+def conninfo_from_env():
+    return make_conninfo(
+        dbname=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+    )
+
+
+def create_database():
+    """Создаёт базу в режиме из DB_MODE: async (по умолчанию) или threaded."""
+    mode = os.getenv("DB_MODE", "async")
+    if mode == "threaded":
+        return ThreadedDatabase.from_env()
+    if mode != "async":
+        raise ValueError(f"Неизвестный DB_MODE: {mode}")
+    return Database.from_env()
+
+
+class Transaction:
+    """Одна транзакция на одном соединении из пула."""
+
+    def __init__(self, conn, cursor):
+        self.conn = conn
+        self.cursor = cursor
+
+    async def _timed(self, sql, params, fetch):
+        started = time.perf_counter()
+        try:
+            await self.cursor.execute(sql, params)
+            if fetch == "one":
+                return await self.cursor.fetchone()
+            if fetch == "all":
+                return await self.cursor.fetchall()
+            return self.cursor.rowcount
+        finally:
+            observe_query(sql, time.perf_counter() - started)
+
+    async def execute(self, sql, params=()):
+        return await self._timed(sql, params, "rowcount")
+
+    async def fetchone(self, sql, params=()):
+        return await self._timed(sql, params, "one")
+
+    async def fetchall(self, sql, params=()):
+        return await self._timed(sql, params, "all")
+
+    async def stream(self, sql, params=(), batch_size=1000):
+        """Серверный (именованный) курсор: строки приходят пачками по batch_size,
+        весь результат в памяти не держится."""
+        async with self.conn.cursor(name=f"stream_{next(_cursor_ids)}") as cursor:
+            started = time.perf_counter()
+            await cursor.execute(sql, params)
+            observe_query(sql, time.perf_counter() - started)
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+
+    async def copy_rows(self, table, columns, rows):
+        """COPY ... FROM STDIN из итератора кортежей; возвращает число строк."""
+        count = 0
+        async with self.cursor.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                await copy.write_row(row)
+                count += 1
+        return count
+
+
+class Database:
+    """Асинхронный пул соединений с Postgres.
+
+    Каждый вызов берёт своё соединение из пула, поэтому параллельные
+    апдейты не делят один курсор и не блокируют event loop.
+    """
+
+    def __init__(self, conninfo, min_size=1, max_size=10, timeout=30.0):
+        self.connect_seconds = None
+        self.pool = AsyncConnectionPool(
+            conninfo,
+            min_size=min_size,
+            max_size=max_size,
+            timeout=timeout,
+            open=False,
+        )
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            conninfo_from_env(),
+            min_size=int(os.getenv("DB_POOL_MIN", "1")),
+            max_size=int(os.getenv("DB_POOL_MAX", "10")),
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        )
+
+    async def open(self):
+        # Повторный вызов ничего не делает: пул открывает тот, кому он нужен первым
+        if self.connect_seconds is not None:
+            return
+        started = time.perf_counter()
+        # Закрытый пул заново не открыть, поэтому открываем один раз, а ждём
+        # соединений с повторами: переподключается пул сам, в фоне
+        await self.pool.open(wait=False)
+        await _with_retries(lambda: self.pool.wait(timeout=min(5.0, DB_CONNECT_TIMEOUT)), "Подключение к БД")
+        self.connect_seconds = time.perf_counter() - started
+        logger.info("Пул БД открыт за %.2f c (min=%s, max=%s)",
+                    self.connect_seconds, self.pool.min_size, self.pool.max_size)
+
+    async def close(self):
+        await self.pool.close()
+
+    def stats(self):
+        pool_stats = self.pool.get_stats()
+        return {
+            "mode": "async",
+            "pool_max": self.pool.max_size,
+            "pool_size": pool_stats.get("pool_size", 0),
+            "pool_available": pool_stats.get("pool_available", 0),
+            "requests_waiting": pool_stats.get("requests_waiting", 0),
+            "requests_wait_ms": pool_stats.get("requests_wait_ms", 0),
+        }
+
+    @asynccontextmanager
+    async def transaction(self):
+        # Пул коммитит при успешном выходе и откатывает при исключении
+        async with self.pool.connection() as conn:
+            async with conn.cursor() as cursor:
+                yield Transaction(conn, cursor)
+
+    async def execute(self, sql, params=()):
+        async with self.transaction() as tx:
+            return await tx.execute(sql, params)
+
+    async def fetchone(self, sql, params=()):
+        async with self.transaction() as tx:
+            return await tx.fetchone(sql, params)
+
+    async def fetchall(self, sql, params=()):
+        async with self.transaction() as tx:
+            return await tx.fetchall(sql, params)
+
+
+class ThreadedTransaction:
+    """Транзакция в threaded-режиме: соединение закреплено на время транзакции,
+    а каждый запрос уходит в пул потоков."""
+
+    def __init__(self, db, conn):
+        self.db = db
+        self.conn = conn
+
+    def _run_sync(self, sql, params, fetch):
+        with self.conn.cursor() as cursor:
+            return _execute(cursor, sql, params, fetch)
+
+    async def execute(self, sql, params=()):
+        return await self.db._submit(self._run_sync, sql, params, "rowcount")
+
+    async def fetchone(self, sql, params=()):
+        return await self.db._submit(self._run_sync, sql, params, "one")
+
+    async def fetchall(self, sql, params=()):
+        return await self.db._submit(self._run_sync, sql, params, "all")
+
+    async def stream(self, sql, params=(), batch_size=1000):
+        cursor = self.conn.cursor(name=f"stream_{next(_cursor_ids)}")
+        try:
+            started = time.perf_counter()
+            await self.db._submit(cursor.execute, sql, params)
+            observe_query(sql, time.perf_counter() - started)
+            while True:
+                rows = await self.db._submit(cursor.fetchmany, batch_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            await self.db._submit(cursor.close)
+
+    async def copy_rows(self, table, columns, rows):
+        reader = _CsvRowsReader(rows)
+
+        def run():
+            with self.conn.cursor() as cursor:
+                cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", reader)
+            return reader.count
+
+        return await self.db._submit(run)
+
+
+class _CsvRowsReader:
+    """Файлоподобная обёртка над итератором строк для copy_expert psycopg2.
+
+    Пустое значение в CSV-формате COPY — это NULL.
+    """
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.count = 0
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+        self._pending = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._pending) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self._writer.writerow(row)
+            self.count += 1
+            self._pending += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        if size < 0:
+            size = len(self._pending)
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+
+def _execute(cursor, sql, params, fetch):
+    started = time.perf_counter()
+    try:
+        cursor.execute(sql, params)
+        if fetch == "one":
+            return cursor.fetchone()
+        if fetch == "all":
+            return cursor.fetchall()
+        return cursor.rowcount
+    finally:
+        observe_query(sql, time.perf_counter() - started)
+
+
+class ThreadedDatabase:
+    """Синхронный psycopg2, вынесенный из event loop в ограниченный пул потоков.
+
+    У каждого рабочего потока своё соединение из ThreadedConnectionPool.
+    Интерфейс совпадает с Database, поэтому репозитории работают без изменений.
+    """
+
+    def __init__(self, dsn, workers=10):
+        self.dsn = dsn
+        self.workers = workers
+        self.pool = None
+        self.connect_seconds = None
+        self._connection_errors = ()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Закреплённых за транзакциями соединений не больше, чем потоков
+        self._tx_slots = asyncio.Semaphore(workers)
+        self._submitted = 0
+        self._started = 0
+        self._busy = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @classmethod
+    def from_env(cls):
+        return cls(conninfo_from_env(), workers=int(os.getenv("DB_POOL_MAX", "10")))
+
+    async def open(self):
+        if self.pool:
+            return
+        # psycopg2 нужен только в этом режиме — не грузим его при обычном старте
+        import psycopg2
+        from psycopg2.pool import ThreadedConnectionPool
+
+        self._connection_errors = (psycopg2.OperationalError, psycopg2.InterfaceError)
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        # Соединения потоков + соединения, закреплённые за транзакциями
+        self.pool = await _with_retries(
+            lambda: loop.run_in_executor(self.executor, lambda: ThreadedConnectionPool(1, self.workers * 2, self.dsn)),
+            "Подключение к БД"
+        )
+        self.connect_seconds = time.perf_counter() - started
+        logger.info("Пул БД открыт в threaded-режиме за %.2f c (потоков: %s)", self.connect_seconds, self.workers)
+
+    async def close(self):
+        self.executor.shutdown(wait=True)
+        if self.pool:
+            self.pool.closeall()
+
+    def stats(self):
+        with self._lock:
+            calls = self._started
+            return {
+                "mode": "threaded",
+                "pool_max": self.workers,
+                "busy": self._busy,
+                "queued": self._submitted - self._started,
+                "calls": calls,
+                "wait_ms_avg": (self._wait_total / calls * 1000) if calls else 0.0,
+                "wait_ms_max": self._wait_max * 1000,
+            }
+
+    async def _submit(self, fn, *args):
+        submitted_at = time.monotonic()
+        with self._lock:
+            self._submitted += 1
+
+        def job():
+            waited = time.monotonic() - submitted_at
+            with self._lock:
+                self._started += 1
+                self._busy += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, job)
+
+    def _thread_conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or conn.closed:
+            conn = self.pool.getconn(key=threading.get_ident())
+            self._local.conn = conn
+        return conn
+
+    def _drop_thread_conn(self):
+        self.pool.putconn(self._local.conn, key=threading.get_ident(), close=True)
+        self._local.conn = None
+
+    def _run_single(self, sql, params, fetch):
+        conn = self._thread_conn()
+        try:
+            with conn.cursor() as cursor:
+                result = _execute(cursor, sql, params, fetch)
+            conn.commit()
+            return result
+        except self._connection_errors:
+            # Соединение оборвалось — выбрасываем его, поток возьмёт новое
+            self._drop_thread_conn()
+            raise
+        except Exception:
+            conn.rollback()
+            raise
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self._tx_slots:
+            conn = await self._submit(self.pool.getconn)
+            try:
+                yield ThreadedTransaction(self, conn)
+                await self._submit(conn.commit)
+            except BaseException:
+                await self._submit(conn.rollback)
+                raise
+            finally:
+                self.pool.putconn(conn)
+
+    async def execute(self, sql, params=()):
+        return await self._submit(self._run_single, sql, params, "rowcount")
+
+    async def fetchone(self, sql, params=()):
+        return await self._submit(self._run_single, sql, params, "one")
+
+    async def fetchall(self, sql, params=()):
+        return await self._submit(self._run_single, sql, params, "all")
@@ -0,0 +1,222 @@
+"""Автоматическое назначение подтверждённых броней водителям.
+
+Открытые слоты водителей держатся в памяти в индексе доступности:
+(откуда, куда, корзина времени) -> слоты, которые эту корзину накрывают.
+Подтверждённая бронь смотрит только в свою корзину, поэтому подбор не
+зависит от числа водителей и броней. Индекс — кэш: назначение делает
+условный запрос в базе (DriverRepository.assign), и если слот уже занят
+параллельно, бронь просто пробует следующего кандидата.
+
+Индекс заполняется при старте и обновляется событиями SLOT из
+booking_events (миграция 0011), поэтому одинаков во всех воркерах.
+Назначение запускается событием подтверждения брони у владельца
+партиции клиента; всё, что не удалось назначить сразу (слотов ещё не
+было), подбирается периодической задачей.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+
+from repository import DriverSlot, RIDE_WHOLE_CAR
+from jobs import leads
+from send_queue import PRIORITY_HIGH
+
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_BUCKET = timedelta(minutes=int(os.getenv("DISPATCH_BUCKET_MINUTES", "60")))
+DISPATCH_INTERVAL = int(os.getenv("DISPATCH_INTERVAL", "60"))
+DISPATCH_BATCH = int(os.getenv("DISPATCH_BATCH", "200"))
+
+_EPOCH = datetime(2000, 1, 1)
+
+
+def bucket_of(moment, bucket=DISPATCH_BUCKET):
+    return (moment - _EPOCH) // bucket
+
+
+def slot_from_event(event):
+    return DriverSlot(
+        event["id"], event["driver_id"], event["from_city"], event["to_city"],
+        datetime.fromisoformat(event["starts_at"]), datetime.fromisoformat(event["ends_at"]),
+        event["seats"], event["seats_left"],
+    )
+
+
+class AvailabilityIndex:
+    """Слоты со свободными местами по (откуда, куда, корзина времени).
+
+    Слот лежит во всех корзинах, которые накрывает его окно; окно —
+    несколько часов, так что это единицы записей на слот. Заполненные
+    слоты из индекса убираются и возвращаются, когда места освобождаются.
+    """
+
+    def __init__(self, bucket=DISPATCH_BUCKET):
+        self.bucket = bucket
+        self._buckets = {}
+        self._slots = {}
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _keys(self, slot):
+        first, last = bucket_of(slot.starts_at, self.bucket), bucket_of(slot.ends_at, self.bucket)
+        return [(slot.from_city, slot.to_city, number) for number in range(first, last + 1)]
+
+    def put(self, slot):
+        self.remove(slot.id)
+        if slot.seats_left <= 0:
+            return
+        self._slots[slot.id] = slot
+        for key in self._keys(slot):
+            self._buckets.setdefault(key, {})[slot.id] = slot
+
+    def remove(self, slot_id):
+        slot = self._slots.pop(slot_id, None)
+        if slot is None:
+            return
+        for key in self._keys(slot):
+            slots = self._buckets.get(key)
+            if slots is not None:
+                slots.pop(slot_id, None)
+                if not slots:
+                    del self._buckets[key]
+
+    def candidates(self, from_city, to_city, moment, seats=None):
+        """Слоты, в окно которых попадает moment, от самых заполненных.
+
+        seats=None — нужна вся машина (слот без единой брони). Сначала
+        идут слоты с меньшим остатком мест: машины заполняются плотнее.
+        """
+        slots = self._buckets.get((from_city, to_city, bucket_of(moment, self.bucket)), {})
+        fitting = [
+            slot for slot in slots.values()
+            if slot.starts_at <= moment <= slot.ends_at
+            and (slot.seats_left == slot.seats if seats is None else slot.seats_left >= seats)
+        ]
+        fitting.sort(key=lambda slot: (slot.seats_left, slot.starts_at, slot.id))
+        return fitting
+
+    def prune(self, before):
+        """Убирает закончившиеся слоты."""
+        for slot_id in [slot.id for slot in self._slots.values() if slot.ends_at < before]:
+            self.remove(slot_id)
+
+
+class Dispatcher:
+    """Назначает подтверждённые брони на слоты водителей и сообщает обоим.
+
+    owns(chat_id) — как у BookingNotifier: в режиме нескольких воркеров
+    бронь по событию назначает только владелец партиции клиента. Добор
+    (dispatch_pending) запускает один ведущий воркер, и он берёт все брони.
+    """
+
+    def __init__(self, drivers, bot, index=None):
+        self.drivers = drivers
+        self.bot = bot
+        self.index = index if index is not None else AvailabilityIndex()
+        self.owns = lambda chat_id: True
+        self.assigned = 0
+        self.missed = 0
+        self._tasks = set()
+
+    async def load(self, now=None):
+        for slot in await self.drivers.list_open(now or datetime.now()):
+            self.index.put(slot)
+        logger.info("Открытых слотов водителей: %s", len(self.index))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def on_event(self, event):
+        """Событие из booking_events (см. notifications.py)."""
+        if event["op"] == "SLOT":
+            if event["deleted"]:
+                self.index.remove(event["id"])
+            else:
+                self.index.put(slot_from_event(event))
+            return
+        if (event["op"] == "UPDATE" and event["status"] == "confirmed" and event.get("scheduled_time")
+                and event.get("actor") != "import" and self.owns(event.get("telegram_id") or 0)):
+            task = asyncio.create_task(self.dispatch(
+                event["id"], event["from_city"], event["to_city"],
+                datetime.fromisoformat(event["scheduled_time"]), event["ride_type"],
+            ))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def dispatch(self, booking_id, from_city, to_city, scheduled_time, ride_type):
+        """Назначает одну бронь; возвращает Assignment или None."""
+        seats = None if ride_type == RIDE_WHOLE_CAR else 1
+        for slot in self.index.candidates(from_city, to_city, scheduled_time, seats):
+            try:
+                assignment = await self.drivers.assign(booking_id, slot.id, seats or slot.seats)
+            except Exception:
+                logger.exception("Ошибка назначения брони #%s", booking_id)
+                return None
+            if assignment is None:
+                continue
+            # Событие SLOT придёт позже — остаток мест обновляем сразу для следующих броней
+            self.index.put(DriverSlot(
+                slot.id, slot.driver_id, slot.from_city, slot.to_city,
+                slot.starts_at, slot.ends_at, slot.seats, assignment.seats_left,
+            ))
+            self.assigned += 1
+            await self.notify(assignment)
+            return assignment
+        self.missed += 1
+        return None
+
+    async def dispatch_pending(self, now=None):
+        """Добор: подтверждённые брони без водителя, например подтверждённые до появления слотов."""
+        rows = await self.drivers.list_unassigned(now or datetime.now(), DISPATCH_BATCH)
+        assigned = 0
+        for booking_id, from_city, to_city, scheduled_time, ride_type, telegram_id in rows:
+            if await self.dispatch(
+                booking_id, from_city, to_city, scheduled_time, ride_type
+            ):
+                assigned += 1
+        return assigned
+
+    async def notify(self, a):
+        time_str = a.scheduled_time.strftime("%d.%m %H:%M") if a.scheduled_time else "время не указано"
+        messages = [
+            (a.driver_telegram_id,
+             f"🚘 Вам назначена бронь #{a.booking_id}: {time_str}\n"
+             f"{a.pickup_point} → {a.destination_point}\n"
+             f"👤 {a.client_name or '—'} · 📞 {a.client_phone or '—'}"),
+            (a.client_telegram_id,
+             f"🚘 К брони #{a.booking_id} назначен водитель: {a.driver_name or '—'} · 📞 {a.driver_phone or '—'}"),
+        ]
+        for chat_id, text in messages:
+            if chat_id is None:
+                continue
+            try:
+                await self.bot.send_message(chat_id, text, rate_limit_args=PRIORITY_HIGH)
+            except TelegramError:
+                logger.warning("Не удалось сообщить о назначении #%s в %s", a.booking_id, chat_id, exc_info=True)
+
+    def stats(self):
+        return {"slots": len(self.index), "assigned": self.assigned, "missed": self.missed}
+
+
+async def run_dispatch(context: ContextTypes.DEFAULT_TYPE):
+    dispatcher = context.bot_data["dispatcher"]
+    now = datetime.now()
+    # Индекс слотов у каждого воркера свой, а добор по базе — только у ведущего
+    dispatcher.index.prune(now)
+    if not leads(context):
+        return
+    assigned = await dispatcher.dispatch_pending(now)
+    if assigned:
+        logger.info("Добор назначений: %s броней", assigned)
+
+
+def schedule_dispatch(job_queue):
+    job_queue.run_repeating(run_dispatch, interval=DISPATCH_INTERVAL, first=30, name="dispatch")
@@ -0,0 +1,227 @@
+"""Роль водителя: заявка, одобрение админом и слоты доступности.
+
+Клиент жмёт «👨‍✈️ Стать водителем» — роль становится driver_pending,
+админ-чат получает заявку. Админ одобряет её командой /driver <telegram_id>.
+Водитель публикует окна, в которые готов ехать:
+
+    /slot Нижнекамск завтра 07:00-11:00      # из Нижнекамска, 4 места
+    /slot Казань 24.05 17-21 3               # из Казани, 3 места
+    /slots                                   # свои слоты с кнопками удаления
+
+Подтверждённые брони назначаются на слоты автоматически (dispatch.py).
+"""
+import os
+import re
+from datetime import datetime, time
+
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ContextTypes
+
+from admin_role_handler import is_admin
+from dateparse import parse_when, DateParseError
+from pooling import VEHICLE_SEATS
+from send_queue import PRIORITY_NORMAL
+
+
+ROLE_DRIVER = "driver"
+ROLE_DRIVER_PENDING = "driver_pending"
+
+MAX_SLOT_SEATS = 8
+
+# Первое слово /slot — город отправления
+DIRECTIONS = {
+    "нижнекамск": ("Нижнекамск", "Казань"),
+    "нк": ("Нижнекамск", "Казань"),
+    "казань": ("Казань", "Нижнекамск"),
+    "кзн": ("Казань", "Нижнекамск"),
+}
+TIME_RANGE_RE = re.compile(r"^(\d{1,2})(?::(\d{2}))?-(\d{1,2})(?::(\d{2}))?$")
+
+DRIVER_HELP = (
+    "🚘 Вы водитель. Когда готовы ехать — добавьте слот:\n"
+    "/slot Нижнекамск завтра 07:00-11:00 — из Нижнекамска, 4 места\n"
+    "/slot Казань 24.05 17-21 3 — из Казани, 3 места\n"
+    "/slots — ваши слоты\n\n"
+    "Подтверждённые брони на это время назначаются вам автоматически."
+)
+
+
+async def get_driver(context, telegram_id):
+    user = await context.application.bot_data["users"].get_by_telegram_id(telegram_id)
+    return user if user and user.role == ROLE_DRIVER else None
+
+
+# «👨‍✈️ Стать водителем» из главного меню
+async def become_driver(update: Update, context: ContextTypes.DEFAULT_TYPE, reply_markup=None):
+    users = context.application.bot_data["users"]
+    telegram_id = update.effective_user.id
+    user = await users.get_by_telegram_id(telegram_id)
+
+    if not user:
+        await update.message.reply_text("⚠️ Пользователь не найден. Попробуйте /start", reply_markup=reply_markup)
+        return
+    if user.role == ROLE_DRIVER:
+        await update.message.reply_text(DRIVER_HELP, reply_markup=reply_markup)
+        return
+    if user.role == ROLE_DRIVER_PENDING:
+        await update.message.reply_text("⏳ Заявка уже отправлена, ждите ответа админа.", reply_markup=reply_markup)
+        return
+    if user.role is not None:
+        await update.message.reply_text(f"ℹ️ Ваша роль: {user.role}. Обратитесь к админу.", reply_markup=reply_markup)
+        return
+
+    await users.set_role(telegram_id, ROLE_DRIVER_PENDING)
+    admin_chat_id = os.getenv("ADMIN_CHAT_ID")
+    if admin_chat_id:
+        await context.bot.send_message(
+            admin_chat_id,
+            f"👨‍✈️ Заявка в водители: {user.full_name or '—'} · 📞 {user.phone or '—'}\n"
+            f"Одобрить: /driver {telegram_id}",
+            rate_limit_args=PRIORITY_NORMAL
+        )
+    await update.message.reply_text(
+        "✅ Заявка отправлена. Админ свяжется с вами по номеру из профиля.", reply_markup=reply_markup
+    )
+
+
+# /driver <telegram_id> — одобрить, /driver off <telegram_id> — снять роль
+async def driver_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await is_admin(context, update.effective_user.id):
+        await update.message.reply_text("🚫 У вас нет прав администратора.")
+        return
+
+    args = list(context.args)
+    revoke = bool(args) and args[0].lower() == "off"
+    if revoke:
+        args = args[1:]
+    if len(args) != 1 or not args[0].isdigit():
+        await update.message.reply_text("❌ Формат: /driver <telegram_id> или /driver off <telegram_id>")
+        return
+
+    telegram_id = int(args[0])
+    users = context.application.bot_data["users"]
+    user = await users.get_by_telegram_id(telegram_id)
+    if not user:
+        await update.message.reply_text("❓ Пользователь не найден.")
+        return
+    # /driver меняет только роли водителя: админа и прочие роли так не снять
+    if user.role not in (None, ROLE_DRIVER_PENDING, ROLE_DRIVER):
+        await update.message.reply_text(f"❌ У пользователя роль {user.role}, через /driver её не изменить.")
+        return
+
+    if revoke:
+        await users.set_role(telegram_id, None)
+        await update.message.reply_text(f"✅ {user.full_name or telegram_id} больше не водитель.")
+        return
+
+    await users.set_role(telegram_id, ROLE_DRIVER)
+    await update.message.reply_text(f"✅ {user.full_name or telegram_id} теперь водитель.")
+    await context.bot.send_message(telegram_id, DRIVER_HELP, rate_limit_args=PRIORITY_NORMAL)
+
+
+def parse_slot(args, today=None):
+    """[город, дата..., ЧЧ:ММ-ЧЧ:ММ, места?] → (from_city, to_city, starts_at, ends_at, seats).
+
+    ValueError с текстом для пользователя, если разобрать нельзя.
+    """
+    args = list(args)
+    seats = VEHICLE_SEATS
+    if len(args) > 3 and args[-1].isdigit():
+        seats = int(args.pop())
+    if len(args) < 3:
+        raise ValueError("Формат: /slot Нижнекамск завтра 07:00-11:00 [мест]")
+
+    direction = DIRECTIONS.get(args[0].lower())
+    if direction is None:
+        raise ValueError("Город отправления — Нижнекамск или Казань")
+
+    match = TIME_RANGE_RE.match(args[-1])
+    if not match:
+        raise ValueError("Время — диапазоном: 07:00-11:00 или 7-11")
+    start_hours, start_minutes, end_hours, end_minutes = (int(part or 0) for part in match.groups())
+    try:
+        start, end = time(start_hours, start_minutes), time(end_hours, end_minutes)
+    except ValueError:
+        raise ValueError("Некорректное время") from None
+    if end <= start:
+        raise ValueError("Конец окна должен быть позже начала")
+
+    try:
+        day, day_time = parse_when(" ".join(args[1:-1]), today)
+    except DateParseError:
+        raise ValueError("Не понял дату: 24.05, завтра, пт") from None
+    if day_time is not None:
+        raise ValueError("Время укажите диапазоном в конце: 07:00-11:00")
+
+    if not 1 <= seats <= MAX_SLOT_SEATS:
+        raise ValueError(f"Мест — от 1 до {MAX_SLOT_SEATS}")
+    return (*direction, datetime.combine(day, start), datetime.combine(day, end), seats)
+
+
+def format_slot(slot):
+    return (
+        f"#{slot.id} · {slot.from_city} → {slot.to_city} · "
+        f"{slot.starts_at.strftime('%d.%m %H:%M')}–{slot.ends_at.strftime('%H:%M')} · "
+        f"свободно {slot.seats_left}/{slot.seats}"
+    )
+
+
+async def slot_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    driver = await get_driver(context, update.effective_user.id)
+    if not driver:
+        await update.message.reply_text("🚫 Команда только для водителей. Заявка — «👨‍✈️ Стать водителем».")
+        return
+
+    try:
+        from_city, to_city, starts_at, ends_at, seats = parse_slot(context.args)
+    except ValueError as exc:
+        await update.message.reply_text(f"❌ {exc}")
+        return
+    if ends_at <= datetime.now():
+        await update.message.reply_text("❌ Это окно уже прошло.")
+        return
+
+    slot = await context.application.bot_data["drivers"].add_slot(
+        driver.id, from_city, to_city, starts_at, ends_at, seats
+    )
+    await update.message.reply_text(f"✅ Слот добавлен:\n{format_slot(slot)}")
+
+
+def render_slots(slots):
+    if not slots:
+        return "📭 У вас нет предстоящих слотов.", None
+    lines = ["🗓 Ваши слоты:"] + [format_slot(slot) for slot in slots]
+    # Удалить можно только слот, на который ещё никого не назначили
+    buttons = [
+        InlineKeyboardButton(f"🗑 #{slot.id}", callback_data=f"slot:del:{slot.id}")
+        for slot in slots if slot.seats_left == slot.seats
+    ]
+    keyboard = InlineKeyboardMarkup([buttons[i:i + 3] for i in range(0, len(buttons), 3)]) if buttons else None
+    return "\n".join(lines), keyboard
+
+
+async def slots_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    driver = await get_driver(context, update.effective_user.id)
+    if not driver:
+        await update.message.reply_text("🚫 Команда только для водителей.")
+        return
+
+    slots = await context.application.bot_data["drivers"].list_for_driver(driver.id, datetime.now())
+    text, keyboard = render_slots(slots)
+    await update.message.reply_text(text, reply_markup=keyboard)
+
+
+async def slot_delete_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    driver = await get_driver(context, update.effective_user.id)
+    if not driver:
+        await query.answer("🚫 Только для водителей.")
+        return
+
+    drivers = context.application.bot_data["drivers"]
+    slot_id = int(query.data.split(":")[2])
+    deleted = await drivers.delete_slot(slot_id, driver.id)
+    await query.answer("🗑 Слот удалён" if deleted else "На слот уже назначены брони")
+
+    text, keyboard = render_slots(await drivers.list_for_driver(driver.id, datetime.now()))
+    await query.edit_message_text(text, reply_markup=keyboard)
@@ -0,0 +1,299 @@
+"""Выгрузка и загрузка броней пачками.
+
+Выгрузка читает bookings JOIN users серверным курсором пачками по
+EXPORT_BATCH строк и сразу пишет их в CSV или Parquet на диск, поэтому
+память не зависит от размера месяца. Загрузка идёт через COPY во
+временную таблицу, из которой одним INSERT ... SELECT создаются
+клиенты (по telegram_id или телефону) и брони.
+
+    python exports.py export 2025-05                  # bookings_2025-05.csv
+    python exports.py export 05.2025 --format parquet -o may.parquet
+    python exports.py import rides.csv                # колонки как в выгрузке
+
+Для Parquet нужен pyarrow (pip install pyarrow).
+"""
+import os
+import csv
+import sys
+import asyncio
+import logging
+import argparse
+import tempfile
+from datetime import date, datetime
+
+from dotenv import load_dotenv
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from admin_role_handler import is_admin
+from send_queue import PRIORITY_BULK
+
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "5000"))
+# Лимит Bot API на отправку файла ботом
+TELEGRAM_DOCUMENT_LIMIT = 50 * 1024 * 1024
+
+EXPORT_COLUMNS = (
+    "id", "created_at", "scheduled_time", "status", "ride_type", "from_city", "to_city",
+    "pickup_point", "destination_point", "price", "client_telegram_id", "client_name", "client_phone",
+)
+EXPORT_SQL = """
+    SELECT b.id, b.created_at, b.scheduled_time, b.status, b.ride_type, b.from_city, b.to_city,
+           b.pickup_point, b.destination_point, b.price, u.telegram_id, u.full_name, u.phone
+    FROM bookings b
+    JOIN users u ON u.id = b.client_id
+    WHERE b.scheduled_time >= %s AND b.scheduled_time < %s
+    ORDER BY b.scheduled_time, b.id
+"""
+
+# Колонки, которые берёт импорт; остальные колонки файла (id и т.п.) пропускаются
+IMPORT_COLUMNS = (
+    "scheduled_time", "status", "ride_type", "from_city", "to_city", "pickup_point",
+    "destination_point", "price", "client_telegram_id", "client_name", "client_phone", "created_at",
+)
+IMPORT_STATUSES = ("pending", "confirmed", "completed", "cancelled", "expired")
+
+
+class ExportError(RuntimeError):
+    pass
+
+
+def parse_month(text):
+    """«2025-05» или «05.2025» → (первый день месяца, первый день следующего)."""
+    for fmt in ("%Y-%m", "%m.%Y"):
+        try:
+            start = datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+        end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        return start, end
+    raise ValueError(text)
+
+
+def previous_month(today=None):
+    today = today or date.today()
+    end = today.replace(day=1)
+    start = date(end.year - (end.month == 1), (end.month - 2) % 12 + 1, 1)
+    return start, end
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportError("Для Parquet нужен pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+class _CsvSink:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(
+            [value.isoformat(sep=" ") if isinstance(value, datetime) else value for value in row]
+            for row in rows
+        )
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetSink:
+    def __init__(self, path):
+        pa = self.pa = _require_pyarrow()
+        self.schema = pa.schema([
+            ("id", pa.int64()), ("created_at", pa.timestamp("us", tz="UTC")), ("scheduled_time", pa.timestamp("us")),
+            ("status", pa.string()), ("ride_type", pa.string()), ("from_city", pa.string()),
+            ("to_city", pa.string()), ("pickup_point", pa.string()), ("destination_point", pa.string()),
+            ("price", pa.int64()), ("client_telegram_id", pa.int64()), ("client_name", pa.string()),
+            ("client_phone", pa.string()),
+        ])
+        # Каждая пачка — отдельная row group, файл дописывается потоково
+        self.writer = pa.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self.writer.write_table(self.pa.table(
+            [self.pa.array(column, type=f.type) for column, f in zip(columns, self.schema)], schema=self.schema
+        ))
+
+    def close(self):
+        self.writer.close()
+
+
+SINKS = {"csv": _CsvSink, "parquet": _ParquetSink}
+
+
+async def export_bookings(db, since, until, fmt, path, batch_size=EXPORT_BATCH):
+    """Пишет брони с поездкой в [since, until) в файл; возвращает число строк."""
+    sink = SINKS[fmt](path)
+    count = 0
+    try:
+        async with db.transaction() as tx:
+            async for rows in tx.stream(EXPORT_SQL, (since, until), batch_size):
+                sink.write(rows)
+                count += len(rows)
+    finally:
+        sink.close()
+    logger.info("Выгружено %s броней за %s – %s в %s", count, since, until, path)
+    return count
+
+
+def _read_rows(path):
+    """Строки файла в порядке IMPORT_COLUMNS, по одной, без чтения файла целиком."""
+    if path.endswith(".parquet"):
+        pa = _require_pyarrow()
+        parquet = pa.parquet.ParquetFile(path)
+        names = [name for name in IMPORT_COLUMNS if name in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=EXPORT_BATCH, columns=names):
+            for record in batch.to_pylist():
+                yield tuple(record.get(name) for name in IMPORT_COLUMNS)
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        missing = {"scheduled_time", "from_city", "to_city"} - set(reader.fieldnames or ())
+        if missing:
+            raise ExportError(f"В файле нет колонок: {', '.join(sorted(missing))}")
+        for record in reader:
+            yield tuple((record.get(name) or None) for name in IMPORT_COLUMNS)
+
+
+async def import_bookings(db, path):
+    """Загружает брони из CSV/Parquet; возвращает (броней, новых клиентов)."""
+    async with db.transaction() as tx:
+        await tx.execute("""
+            CREATE TEMP TABLE import_bookings (
+                scheduled_time     TIMESTAMP,
+                status             TEXT,
+                ride_type          TEXT,
+                from_city          TEXT,
+                to_city            TEXT,
+                pickup_point       TEXT,
+                destination_point  TEXT,
+                price              INTEGER,
+                client_telegram_id BIGINT,
+                client_name        TEXT,
+                client_phone       TEXT,
+                created_at         TIMESTAMPTZ
+            ) ON COMMIT DROP
+        """)
+        loaded = await tx.copy_rows("import_bookings", IMPORT_COLUMNS, _read_rows(path))
+
+        bad = await tx.fetchone("""
+            SELECT count(*) FROM import_bookings
+            WHERE COALESCE(status, 'pending') <> ALL(%s)
+               OR (client_telegram_id IS NULL AND client_phone IS NULL)
+        """, (list(IMPORT_STATUSES),))
+        if bad[0]:
+            raise ExportError(f"{bad[0]} строк без клиента (telegram_id/телефон) или с неизвестным статусом")
+
+        users_created = await tx.execute("""
+            INSERT INTO users (telegram_id, full_name, phone)
+            SELECT DISTINCT ON (COALESCE(client_telegram_id::text, client_phone))
+                   client_telegram_id, client_name, client_phone
+            FROM import_bookings i
+            WHERE NOT EXISTS (
+                SELECT 1 FROM users u
+                WHERE u.telegram_id = i.client_telegram_id
+                   OR (i.client_telegram_id IS NULL AND u.phone = i.client_phone)
+            )
+            ON CONFLICT (telegram_id) DO NOTHING
+        """)
+        imported = await tx.execute("""
+            INSERT INTO bookings (
+                client_id, from_city, to_city, pickup_point, destination_point,
+                scheduled_time, price, ride_type, status, status_changed_by, created_at
+            )
+            SELECT u.id, i.from_city, i.to_city, i.pickup_point, i.destination_point,
+                   i.scheduled_time, i.price, i.ride_type, COALESCE(i.status, 'pending'), 'import',
+                   COALESCE(i.created_at, now())
+            FROM import_bookings i
+            JOIN LATERAL (
+                SELECT id FROM users u
+                WHERE u.telegram_id = i.client_telegram_id
+                   OR (i.client_telegram_id IS NULL AND u.phone = i.client_phone)
+                ORDER BY id
+                LIMIT 1
+            ) u ON true
+        """)
+    logger.info("Импорт %s: строк %s, броней %s, новых клиентов %s", path, loaded, imported, users_created)
+    return imported, users_created
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/export [ММ.ГГГГ] [csv|parquet] — по умолчанию прошлый месяц в CSV."""
+    if not await is_admin(context, update.effective_user.id):
+        await update.message.reply_text("🚫 У вас нет прав администратора.")
+        return
+
+    args = [arg.lower() for arg in context.args]
+    fmt = next((arg for arg in args if arg in SINKS), "csv")
+    month_args = [arg for arg in args if arg not in SINKS]
+    try:
+        since, until = parse_month(month_args[0]) if month_args else previous_month()
+    except ValueError:
+        await update.message.reply_text("❌ Формат: /export 05.2025 [csv|parquet]")
+        return
+
+    filename = f"bookings_{since:%Y-%m}.{fmt}"
+    await update.message.reply_text(f"⏳ Готовлю {filename}...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, filename)
+        try:
+            count = await export_bookings(context.bot_data["db"], since, until, fmt, path)
+        except ExportError as exc:
+            await update.message.reply_text(f"❌ {exc}")
+            return
+        if os.path.getsize(path) > TELEGRAM_DOCUMENT_LIMIT:
+            await update.message.reply_text(
+                "❌ Файл больше 50 МБ — Telegram его не примет. Выгрузите через CLI: python exports.py export"
+            )
+            return
+        with open(path, "rb") as f:
+            await context.bot.send_document(
+                update.effective_chat.id, f, filename=filename,
+                caption=f"📦 {count} броней за {since:%m.%Y}", rate_limit_args=PRIORITY_BULK
+            )
+
+
+async def _main(args):
+    from db import create_database
+
+    db = create_database()
+    await db.open()
+    try:
+        if args.command == "export":
+            since, until = parse_month(args.month) if args.month else previous_month()
+            path = args.output or f"bookings_{since:%Y-%m}.{args.format}"
+            count = await export_bookings(db, since, until, args.format, path)
+            print(f"Выгружено {count} броней в {path}")
+        else:
+            imported, users_created = await import_bookings(db, args.path)
+            print(f"Загружено броней: {imported}, новых клиентов: {users_created}")
+    except ExportError as exc:
+        print(f"Ошибка: {exc}", file=sys.stderr)
+        return 1
+    finally:
+        await db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Выгрузка и загрузка броней")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="выгрузить месяц")
+    export_parser.add_argument("month", nargs="?", help="2025-05 или 05.2025, по умолчанию прошлый месяц")
+    export_parser.add_argument("--format", choices=sorted(SINKS), default="csv")
+    export_parser.add_argument("-o", "--output")
+    import_parser = commands.add_parser("import", help="загрузить брони из CSV/Parquet через COPY")
+    import_parser.add_argument("path")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
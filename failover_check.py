@@ -0,0 +1,141 @@
+"""Локальная проверка отказоустойчивости нескольких воркеров.
+
+Поднимает фейковый Bot API, ingress.py и несколько процессов
+main.py в режиме BOT_MODE=worker на одной машине и локальном Postgres.
+Синтетические пользователи проходят бронирование; в середине сценария
+один воркер убивается (SIGKILL). Его партиции должны перейти к остальным,
+а пользователи — закончить диалог с того же шага.
+
+    python failover_check.py --workers 3 --users 50
+"""
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import subprocess
+from datetime import date, timedelta
+
+from dotenv import load_dotenv
+
+from db import create_database
+from fake_telegram import FakeBotAPI, FakeTelegramClient, message_update
+
+
+def _spawn(args, env):
+    return subprocess.Popen([sys.executable, *args], env=env)
+
+
+async def _step(api, client, user_id, update, expected):
+    await client.post_update(update)
+    await api.wait_for_messages(user_id, expected, timeout=60)
+
+
+async def _user(api, client, user_id, ride_day, kill_event, kill_after):
+    steps = [
+        message_update(user_id, "/start"),
+        message_update(user_id, contact_phone=f"+7900{user_id % 10_000_000:07d}"),
+        message_update(user_id, "🚕 Забронировать поездку"),
+        message_update(user_id, "🚗 Место в машине"),
+        message_update(user_id, "Нижнекамск"),
+        message_update(user_id, "ул. Менделеева 1"),
+        message_update(user_id, "РКБ"),
+        message_update(user_id, ride_day.strftime("%d.%m.%Y")),
+        message_update(user_id, "09:30"),
+        message_update(user_id, "Подтверждаю"),
+    ]
+    for number, update in enumerate(steps, 1):
+        if number == kill_after:
+            await kill_event.wait()
+        await _step(api, client, user_id, update, number)
+    return any("заявка принята" in (text or "") for _, text, _ in api.messages[user_id])
+
+
+async def _main(args):
+    load_dotenv()
+    env = dict(
+        os.environ,
+        BOT_TOKEN=os.getenv("BOT_TOKEN", "123456:failover"),
+        BOT_API_URL=f"http://127.0.0.1:{args.api_port}",
+        WEBHOOK_URL=f"http://127.0.0.1:{args.ingress_port}",
+        WEBHOOK_PORT=str(args.ingress_port),
+        WEBHOOK_LISTEN="127.0.0.1",
+        WEBHOOK_SECRET="failover",
+        BOT_MODE="worker",
+        # Воркеры на одной машине не должны делить порт проб
+        HEALTH_PORT="0",
+        CLUSTER_WORKERS=str(args.workers),
+        CLUSTER_LEASE_SECONDS=str(args.lease),
+        FLOOD_RATE="1000",
+        FLOOD_BURST="1000",
+        CAPACITY_SEATS="1000000",
+    )
+
+    api = FakeBotAPI(args.api_port)
+    await api.start()
+    ingress = _spawn(["ingress.py"], env)
+    # Каждому воркеру — свой порт метрик, как при нескольких воркерах на одной машине в бою
+    workers = [
+        _spawn(["main.py"], dict(env, METRICS_PORT=str(args.metrics_port + i))) for i in range(args.workers)
+    ]
+    try:
+        await asyncio.wait_for(api.webhook_ready.wait(), 30)
+        # Даём воркерам поделить партиции
+        await asyncio.sleep(args.lease)
+
+        client = FakeTelegramClient(api.webhook_url, api.webhook_secret)
+        base_id = int(time.time()) * 1000
+        ride_day = date.today() + timedelta(days=3)
+        kill_event = asyncio.Event()
+        users = [
+            asyncio.create_task(_user(api, client, base_id + i, ride_day, kill_event, args.kill_after))
+            for i in range(args.users)
+        ]
+
+        await asyncio.sleep(2)
+        victim = workers[0]
+        victim.send_signal(signal.SIGKILL)
+        killed_at = time.monotonic()
+        print(f"Воркер pid={victim.pid} убит, ждём переезда партиций (аренда {args.lease} c)")
+        kill_event.set()
+
+        results = await asyncio.gather(*users, return_exceptions=True)
+        elapsed = time.monotonic() - killed_at
+        done = sum(1 for r in results if r is True)
+        print(f"Завершили бронирование: {done}/{args.users} за {elapsed:.1f} c после отказа")
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"  ошибка: {result!r}")
+
+        db = create_database()
+        await db.open()
+        duplicates = await db.fetchone("""
+            SELECT count(*) FROM (
+                SELECT b.client_id FROM bookings b JOIN users u ON u.id = b.client_id
+                WHERE u.telegram_id BETWEEN %s AND %s GROUP BY b.client_id HAVING count(*) > 1
+            ) d
+        """, (base_id, base_id + args.users))
+        print(f"Пользователей с повторной бронью (повторная обработка апдейта): {duplicates[0]}")
+        await db.close()
+        await client.close()
+        return 0 if done == args.users else 1
+    finally:
+        for process in [ingress, *workers]:
+            if process.poll() is None:
+                process.terminate()
+        for process in [ingress, *workers]:
+            process.wait()
+        api.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка переезда партиций при падении воркера")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--lease", type=float, default=3.0, help="CLUSTER_LEASE_SECONDS для воркеров")
+    parser.add_argument("--kill-after", type=int, default=6, help="на каком шаге сценария пользователи ждут отказа")
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--ingress-port", type=int, default=8443)
+    parser.add_argument("--metrics-port", type=int, default=9108, help="порт метрик первого воркера, дальше +1")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
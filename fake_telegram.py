@@ -0,0 +1,205 @@
+"""Локальный фейк Telegram для проверки вебхук-режима без сети.
+
+FakeBotAPI отвечает на запросы бота (getMe, setWebhook, sendMessage, ...)
+и запоминает отправленные сообщения. Когда бот регистрирует вебхук,
+фейк узнаёт его адрес и секрет и начинает слать туда апдейты.
+
+    # терминал 1
+    python fake_telegram.py --users 20 --text "📅 Мои брони"
+    # терминал 2
+    BOT_MODE=webhook BOT_API_URL=http://127.0.0.1:8081 \\
+        WEBHOOK_URL=http://127.0.0.1:8443 WEBHOOK_SECRET=secret python main.py
+"""
+import json
+import time
+import asyncio
+import argparse
+import itertools
+from collections import defaultdict
+
+import httpx
+from tornado.web import Application, RequestHandler
+
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "TaxiBot", "username": "taxi_test_bot"}
+
+# Методы, которые возвращают отправленное сообщение
+MESSAGE_METHODS = {"sendMessage", "editMessageText", "sendDocument", "editMessageReplyMarkup"}
+
+
+class _BotAPIHandler(RequestHandler):
+    def initialize(self, api):
+        self.api = api
+
+    def check_xsrf_cookie(self):
+        pass
+
+    async def post(self, token, method):
+        params = {}
+        for name in self.request.body_arguments:
+            value = self.get_body_argument(name)
+            try:
+                params[name] = json.loads(value)
+            except ValueError:
+                params[name] = value
+        for name in self.request.files:
+            params[name] = self.request.files[name][0]["filename"]
+
+        ok, result = self.api.handle(method, params)
+        self.set_header("Content-Type", "application/json")
+        if ok:
+            self.write(json.dumps({"ok": True, "result": result}))
+        else:
+            self.set_status(result["error_code"])
+            self.write(json.dumps({"ok": False, **result}))
+
+    get = post
+
+
+class FakeBotAPI:
+    def __init__(self, port=8081):
+        self.port = port
+        self.server = None
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.webhook_ready = asyncio.Event()
+        self.calls = defaultdict(int)
+        # chat_id -> список (method, text, время получения)
+        self.messages = defaultdict(list)
+        self._message_ids = itertools.count(1)
+        self._new_message = asyncio.Condition()
+
+    async def start(self):
+        app = Application([(r"/bot([^/]+)/(\w+)", _BotAPIHandler, {"api": self})])
+        self.server = app.listen(self.port, address="127.0.0.1")
+
+    def stop(self):
+        if self.server:
+            self.server.stop()
+
+    def handle(self, method, params):
+        self.calls[method] += 1
+
+        if method == "getMe":
+            return True, BOT_USER
+        if method == "setWebhook":
+            self.webhook_url = params.get("url")
+            self.webhook_secret = params.get("secret_token")
+            self.webhook_ready.set()
+            return True, True
+        if method in MESSAGE_METHODS:
+            chat_id = int(params.get("chat_id", 0))
+            text = params.get("text") or params.get("caption") or params.get("document")
+            self.messages[chat_id].append((method, text, time.monotonic()))
+            asyncio.get_running_loop().create_task(self._notify())
+            return True, {
+                "message_id": int(params.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": text if isinstance(text, str) else "",
+            }
+        # answerCallbackQuery, deleteWebhook и прочее — просто подтверждаем
+        return True, True
+
+    async def _notify(self):
+        async with self._new_message:
+            self._new_message.notify_all()
+
+    async def wait_for_messages(self, chat_id, count, timeout=10.0):
+        """Ждёт, пока в чате наберётся count сообщений от бота."""
+        async with self._new_message:
+            await asyncio.wait_for(
+                self._new_message.wait_for(lambda: len(self.messages[chat_id]) >= count), timeout
+            )
+        return self.messages[chat_id]
+
+
+_update_ids = itertools.count(1)
+
+
+def _user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+
+def message_update(user_id, text=None, contact_phone=None):
+    message = {
+        "message_id": next(_update_ids),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id),
+    }
+    if contact_phone:
+        message["contact"] = {"phone_number": contact_phone, "first_name": f"User{user_id}", "user_id": user_id}
+    else:
+        message["text"] = text
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": next(_update_ids), "message": message}
+
+
+def callback_update(user_id, data, message_id=1):
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": BOT_USER,
+                "text": "",
+            },
+        },
+    }
+
+
+class FakeTelegramClient:
+    """Шлёт апдейты в вебхук бота так же, как это делает Telegram."""
+
+    def __init__(self, webhook_url, secret=None):
+        self.webhook_url = webhook_url
+        self.headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+        self.http = httpx.AsyncClient(timeout=30)
+
+    async def post_update(self, update):
+        response = await self.http.post(self.webhook_url, json=update, headers=self.headers)
+        response.raise_for_status()
+
+    async def close(self):
+        await self.http.aclose()
+
+
+async def _main(args):
+    api = FakeBotAPI(args.port)
+    await api.start()
+    print(f"Фейковый Bot API на http://127.0.0.1:{args.port}, ждём setWebhook от бота...")
+    await api.webhook_ready.wait()
+    print(f"Вебхук: {api.webhook_url}")
+
+    client = FakeTelegramClient(api.webhook_url, api.webhook_secret)
+    user_ids = range(10_000, 10_000 + args.users)
+    started = time.monotonic()
+    await asyncio.gather(*(client.post_update(message_update(uid, args.text)) for uid in user_ids))
+    results = await asyncio.gather(
+        *(api.wait_for_messages(uid, 1, args.timeout) for uid in user_ids), return_exceptions=True
+    )
+    elapsed = time.monotonic() - started
+    answered = sum(1 for r in results if not isinstance(r, Exception))
+    print(f"Ответили {answered}/{args.users} пользователям за {elapsed:.2f} c")
+    print(f"Вызовы Bot API: {dict(api.calls)}")
+
+    await client.close()
+    api.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Фейковый Telegram для вебхук-режима")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--text", default="/start")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    asyncio.run(_main(parser.parse_args()))
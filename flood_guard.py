@@ -0,0 +1,114 @@
+import os
+import time
+import logging
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, TypeHandler
+
+from cache import TTLCache
+from send_queue import TokenBucket
+from metrics import observe_flood_dropped
+
+
+logger = logging.getLogger(__name__)
+
+
+class FloodGuard:
+    """Защита от флуда входящими апдейтами, до всех хендлеров (группа -1).
+
+    У каждого пользователя своя корзина токенов: сверх лимита апдейты
+    отбрасываются, а пользователь один раз получает предупреждение.
+    Повторное нажатие той же кнопки меню или той же инлайн-кнопки
+    в пределах coalesce_window склеивается с первым. Состояние
+    пользователей хранится в LRU-кэше, поэтому память ограничена.
+    """
+
+    def __init__(self, rate=1.0, burst=5, coalesce_window=2.0, coalesce_texts=(), maxsize=50000,
+                 clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.coalesce_window = coalesce_window
+        self.coalesce_texts = frozenset(coalesce_texts)
+        self.clock = clock
+        # Простоявшая дольше burst / rate корзина снова полная — её можно забыть
+        self._users = TTLCache(maxsize=maxsize, ttl=max(burst / rate, coalesce_window), clock=clock)
+        self.allowed = 0
+        self.limited = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_env(cls, coalesce_texts=()):
+        return cls(
+            rate=float(os.getenv("FLOOD_RATE", "1")),
+            burst=int(os.getenv("FLOOD_BURST", "5")),
+            coalesce_window=float(os.getenv("FLOOD_COALESCE_SECONDS", "2")),
+            coalesce_texts=coalesce_texts,
+        )
+
+    def handler(self):
+        return TypeHandler(Update, self.check)
+
+    def stats(self):
+        return {
+            "users": len(self._users),
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "coalesced": self.coalesced,
+        }
+
+    @staticmethod
+    def _tap(update):
+        """Что нажал пользователь: текст кнопки или данные инлайн-кнопки."""
+        if update.callback_query:
+            return "cb:" + (update.callback_query.data or "")
+        if update.message and update.message.text:
+            return update.message.text
+        return None
+
+    def verdict(self, user_id, tap):
+        """None — пропустить, иначе причина отказа: coalesced, limited или warn."""
+        now = self.clock()
+        state = self._users.get(user_id)
+        if state is None:
+            # [корзина, последнее нажатие, когда, предупреждён до]
+            state = [TokenBucket(self.rate, self.burst, now), None, 0.0, 0.0]
+        self._users.set(user_id, state)
+        bucket = state[0]
+
+        if tap is not None and tap == state[1] and now - state[2] < self.coalesce_window:
+            self.coalesced += 1
+            return "coalesced"
+
+        if bucket.wait_time(now) > 0:
+            self.limited += 1
+            if state[3] > now:
+                return "limited"
+            state[3] = now + self.burst / self.rate
+            return "warn"
+
+        bucket.take(now)
+        if tap is not None:
+            state[1], state[2] = tap, now
+        self.allowed += 1
+        return None
+
+    async def check(self, update: Update, context):
+        user = update.effective_user
+        if user is None:
+            return
+        tap = self._tap(update)
+        if tap is not None and not tap.startswith("cb:") and tap not in self.coalesce_texts:
+            # Свободный ввод (адрес, дата) не склеиваем, только ограничиваем
+            tap = None
+
+        reason = self.verdict(user.id, tap)
+        if reason is None:
+            return
+
+        observe_flood_dropped("limited" if reason == "warn" else reason)
+        if update.callback_query:
+            # Иначе у пользователя будет крутиться «часики» на кнопке
+            await update.callback_query.answer("⏳ Слишком часто, подождите немного")
+        elif reason == "warn" and update.effective_chat:
+            await context.bot.send_message(update.effective_chat.id, "⏳ Слишком много запросов, подождите несколько секунд.")
+        raise ApplicationHandlerStop
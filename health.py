@@ -0,0 +1,126 @@
+"""Пробы живости/готовности и разбивка времени старта.
+
+HTTP-сервер в отдельном потоке поднимается до инициализации приложения,
+поэтому отвечает и пока бот ждёт базу:
+
+    /healthz  — процесс жив (200 всегда)
+    /readyz   — 200, когда старт завершён и последняя проверка БД успешна, иначе 503
+    /startup  — длительность фаз старта в секундах
+
+Порт — HEALTH_PORT (0 — выключено). Если порт занят, бот стартует без проб
+(с предупреждением в логе): у воркеров на одной машине порты должны различаться.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+
+logger = logging.getLogger(__name__)
+
+HEALTH_DB_INTERVAL = float(os.getenv("HEALTH_DB_INTERVAL", "10"))
+
+
+class StartupTracker:
+    """Фазы старта: import, build (в т.ч. import_metrics), initialize (в т.ч. db_connect), post_init, first_update.
+
+    import_metrics и import_cluster — импорт необязательных подсистем, который
+    main.py откладывает до места, где они включаются.
+    """
+
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases = {}
+        self.ready = False
+        self.db_ok = False
+        self.db_error = None
+        self._last = self.started
+        self._first_update_seen = False
+
+    def mark(self, phase):
+        """Фаза закончилась сейчас; её длительность — с конца предыдущей."""
+        now = time.perf_counter()
+        self.phases[phase] = round(now - self._last, 3)
+        self._last = now
+
+    def record(self, phase, seconds):
+        """Длительность вложенной фазы, измеренной отдельно (db_connect внутри initialize)."""
+        self.phases[phase] = round(seconds, 3)
+
+    def set_ready(self):
+        self.mark("post_init")
+        self.ready = True
+        self.phases["total"] = round(time.perf_counter() - self.started, 3)
+        logger.info("Старт за %.2f c: %s", self.phases["total"], self.phases)
+
+    def handler(self):
+        # Группа -2: раньше антифлуда, ничего не делает кроме первой отметки
+        return TypeHandler(Update, self._on_update)
+
+    async def _on_update(self, update, context):
+        if not self._first_update_seen:
+            self._first_update_seen = True
+            self.phases["first_update"] = round(time.perf_counter() - self.started, 3)
+            logger.info("Первый апдейт через %.2f c после старта", self.phases["first_update"])
+
+    def snapshot(self):
+        return {"ready": self.ready, "db_ok": self.db_ok, "db_error": self.db_error, "phases": self.phases}
+
+
+async def check_db(context):
+    """Периодическая проверка БД для /readyz."""
+    startup = context.bot_data["startup"]
+    try:
+        await context.bot_data["db"].fetchone("SELECT 1")
+    except Exception as exc:
+        if startup.db_ok:
+            logger.warning("Проверка БД не прошла: %s", exc)
+        startup.db_ok, startup.db_error = False, str(exc)
+    else:
+        startup.db_ok, startup.db_error = True, None
+
+
+def _make_handler(startup):
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/healthz":
+                status, body = 200, {"alive": True}
+            elif self.path == "/readyz":
+                snapshot = startup.snapshot()
+                status = 200 if snapshot["ready"] and snapshot["db_ok"] else 503
+                body = snapshot
+            elif self.path == "/startup":
+                status, body = 200, startup.phases
+            else:
+                status, body = 404, {}
+            payload = json.dumps(body, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return _Handler
+
+
+def start_health_server(startup):
+    port = int(os.getenv("HEALTH_PORT", "8080"))
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((os.getenv("HEALTH_LISTEN", "0.0.0.0"), port), _make_handler(startup))
+    except OSError as exc:
+        # Порт занят (например, несколько воркеров на одной машине) — бот работает и без проб
+        logger.warning("Пробы здоровья не запущены на :%s: %s", port, exc)
+        return None
+    threading.Thread(target=server.serve_forever, name="health", daemon=True).start()
+    logger.info("Пробы здоровья на :%s (/healthz, /readyz, /startup)", port)
+    return server
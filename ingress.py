@@ -0,0 +1,90 @@
+"""Приём вебхука Telegram для нескольких воркеров (см. cluster.py).
+
+Проверяет секрет, кладёт апдейт в incoming_updates с номером партиции
+и будит владельца партиции через NOTIFY — одним запросом. Сам апдейты
+не обрабатывает, поэтому один ingress держит весь входящий поток.
+
+    python ingress.py      # WEBHOOK_* как у main.py, плюс BOT_TOKEN для setWebhook
+"""
+import os
+import json
+import asyncio
+import logging
+
+from dotenv import load_dotenv
+from telegram import Bot
+from tornado.web import Application, RequestHandler
+
+from db import create_database
+from migrate import check_schema
+from cluster import CHANNEL, partition_of, update_owner_id
+
+
+logger = logging.getLogger(__name__)
+
+
+class _WebhookHandler(RequestHandler):
+    def initialize(self, db, secret, partitions):
+        self.db = db
+        self.secret = secret
+        self.partitions = partitions
+
+    def check_xsrf_cookie(self):
+        pass
+
+    async def post(self):
+        if self.secret and self.request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.secret:
+            self.set_status(403)
+            return
+        try:
+            payload = json.loads(self.request.body)
+            update_id = int(payload["update_id"])
+        except (ValueError, KeyError, TypeError):
+            self.set_status(400)
+            return
+
+        partition = partition_of(update_owner_id(payload), self.partitions)
+        await self.db.execute(f"""
+            WITH inserted AS (
+                INSERT INTO incoming_updates (update_id, partition, payload)
+                VALUES (%s, %s, %s::jsonb)
+                ON CONFLICT (update_id) DO NOTHING
+                RETURNING partition
+            )
+            SELECT pg_notify('{CHANNEL}', partition::text) FROM inserted
+        """, (update_id, partition, self.request.body.decode()))
+        self.set_status(200)
+
+
+async def serve():
+    db = create_database()
+    await db.open()
+    await check_schema(db)
+
+    url_path = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+    secret = os.getenv("WEBHOOK_SECRET")
+    # Число партиций должно совпадать с воркерами
+    partitions = int(os.getenv("CLUSTER_PARTITIONS", "64"))
+    app = Application([(f"/{url_path}", _WebhookHandler, {"db": db, "secret": secret, "partitions": partitions})])
+    port = int(os.getenv("WEBHOOK_PORT", "8443"))
+    server = app.listen(port, address=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"))
+    logger.info("Ingress слушает :%s/%s", port, url_path)
+
+    public_url = os.getenv("WEBHOOK_URL")
+    if public_url:
+        base_url = os.getenv("BOT_API_URL")
+        bot = Bot(os.getenv("BOT_TOKEN"), base_url=f"{base_url.rstrip('/')}/bot" if base_url else "https://api.telegram.org/bot")
+        async with bot:
+            await bot.set_webhook(f"{public_url.rstrip('/')}/{url_path}", secret_token=secret)
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        server.stop()
+        await db.close()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    asyncio.run(serve())
@@ -0,0 +1,86 @@
+"""Плановые задачи по броням на job queue приложения.
+
+Один тик — несколько запросов по окну времени (по индексам из
+миграции 0007), а не таймер на каждую бронь: в памяти не больше
+JOB_BATCH броней за раз, сколько бы их ни было в будущем.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+
+import booking_state
+from send_queue import PRIORITY_HIGH
+
+
+logger = logging.getLogger(__name__)
+
+JOBS_INTERVAL = int(os.getenv("JOBS_INTERVAL", "60"))
+JOB_BATCH = int(os.getenv("JOB_BATCH", "500"))
+REMINDER_BEFORE = timedelta(hours=float(os.getenv("REMINDER_HOURS", "2")))
+# Подтверждённая поездка считается завершённой через столько после отправления
+COMPLETE_AFTER = timedelta(hours=float(os.getenv("COMPLETE_AFTER_HOURS", "3")))
+
+
+def leads(context):
+    """В кластере глобальные задачи по базе выполняет один воркер — владелец партиции 0."""
+    cluster = context.bot_data.get("cluster")
+    return cluster is None or cluster.leads()
+
+
+async def send_reminders(context, now):
+    bookings = context.bot_data["bookings"]
+    sent = 0
+    while True:
+        rows = await bookings.claim_reminders(now, now + REMINDER_BEFORE, JOB_BATCH)
+        await asyncio.gather(*(send_reminder(context.bot, row) for row in rows))
+        sent += len(rows)
+        if len(rows) < JOB_BATCH:
+            return sent
+
+
+async def send_reminder(bot, row):
+    booking_id, telegram_id, scheduled_time, pickup, destination = row
+    if telegram_id is None:
+        # Клиент из импорта, без Telegram
+        return
+    try:
+        await bot.send_message(
+            telegram_id,
+            f"⏰ Напоминание: поездка #{booking_id} {scheduled_time.strftime('%d.%m в %H:%M')}\n"
+            f"{pickup} → {destination}",
+            rate_limit_args=PRIORITY_HIGH
+        )
+    except TelegramError:
+        logger.warning("Не удалось отправить напоминание по брони #%s", booking_id, exc_info=True)
+
+
+async def transition_all_due(bookings, status, before):
+    total = 0
+    while True:
+        ids = await booking_state.transition_due(bookings, status, before, JOB_BATCH)
+        total += len(ids)
+        if len(ids) < JOB_BATCH:
+            return total
+
+
+async def run_booking_jobs(context: ContextTypes.DEFAULT_TYPE):
+    if not leads(context):
+        return
+    now = datetime.now()
+    bookings = context.bot_data["bookings"]
+
+    reminded = await send_reminders(context, now)
+    # Неподтверждённые брони, время которых прошло, больше не висят в админских списках
+    expired = await transition_all_due(bookings, "expired", now)
+    completed = await transition_all_due(bookings, "completed", now - COMPLETE_AFTER)
+
+    if reminded or expired or completed:
+        logger.info("Задачи по броням: напоминаний %s, истекло %s, завершено %s", reminded, expired, completed)
+
+
+def schedule_booking_jobs(job_queue):
+    job_queue.run_repeating(run_booking_jobs, interval=JOBS_INTERVAL, first=10, name="booking_jobs")
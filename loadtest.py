@@ -0,0 +1,283 @@
+"""Нагрузочный прогон бота против фейкового Bot API и локального Postgres.
+
+Собирает Application из main.build_application(), направляет исходящие
+запросы в FakeBotAPI (fake_telegram.py), а апдейты синтетических
+пользователей отдаёт в тот же процессор апдейтов, что и при polling.
+Клиенты регистрируются, проходят диалог бронирования, смотрят
+«Мои брони» и отменяют бронь; админы листают активные брони и
+подтверждают ожидающие.
+
+    python loadtest.py --users 2000 --admins 5
+    DB_MODE=threaded DB_POOL_MAX=20 python loadtest.py --users 2000
+
+В конце печатает пропускную способность, p50/p99 по шагам сценария
+и по хендлерам, насыщение пула БД и самые медленные запросы. Лимиты
+Telegram в очереди отправки и антифлуд по умолчанию сняты
+(--telegram-limits включает их), чтобы мерить бота, а не ограничители.
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from collections import defaultdict
+from datetime import date, timedelta
+
+from telegram import Update
+
+from fake_telegram import FakeBotAPI, message_update, callback_update
+import metrics
+
+
+class LoadTest:
+    def __init__(self, app, api, think=0.0):
+        self.app = app
+        self.api = api
+        self.think = think
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.db_samples = []
+        # Исключения хендлеров PTB не пробрасывает из process_update, а отдаёт
+        # обработчикам ошибок — там и запоминаем, какой апдейт упал
+        self.failed = set()
+        app.add_error_handler(self.on_error)
+
+    async def on_error(self, update, context):
+        if isinstance(update, Update):
+            self.failed.add(update.update_id)
+
+    async def send(self, step, update):
+        """Отдаёт апдейт процессору и ждёт, пока хендлер полностью отработает."""
+        update = Update.de_json(update, self.app.bot)
+        started = time.perf_counter()
+        try:
+            await self.app.update_processor.process_update(update, self.app.process_update(update))
+        except Exception:
+            self.errors[step] += 1
+            return
+        if update.update_id in self.failed:
+            self.failed.discard(update.update_id)
+            self.errors[step] += 1
+            return
+        self.latencies[step].append(time.perf_counter() - started)
+        if self.think:
+            await asyncio.sleep(random.uniform(0, self.think * 2))
+
+    async def client(self, user_id, ride_day):
+        await self.send("start", message_update(user_id, "/start"))
+        await self.send("phone", message_update(user_id, contact_phone=f"+7{user_id % 10_000_000_000:010d}"))
+
+        from_city = random.choice(("Казань", "Нижнекамск"))
+        point = random.choice(list(self.app.bot_data["catalog"].prices))
+        steps = [
+            ("book", "🚕 Забронировать поездку"),
+            ("ride_type", random.choice(("🚗 Место в машине", "🚘 Вся машина"))),
+            ("direction", from_city),
+            ("address_from", point if from_city == "Казань" else "ул. Менделеева 1"),
+            ("point_to", "ул. Менделеева 1" if from_city == "Казань" else point),
+            ("date", ride_day.strftime("%d.%m.%Y")),
+            ("time", f"{random.randint(5, 22):02d}:{random.choice((0, 15, 30, 45)):02d}"),
+            ("confirm", "Подтверждаю"),
+            ("my_bookings", "📅 Мои брони"),
+        ]
+        for step, text in steps:
+            await self.send(step, message_update(user_id, text))
+
+        # Отмена примерно каждой третьей брони — через инлайн-кнопку, как в «Мои брони»
+        if random.random() < 0.33:
+            bookings = await self.app.bot_data["bookings"].list_for_client(user_id)
+            if bookings:
+                await self.send("cancel", callback_update(user_id, f"cancel:{bookings[0].id}"))
+
+    async def admin(self, user_id, rounds):
+        await self.send("start", message_update(user_id, "/start"))
+        await self.send("phone", message_update(user_id, contact_phone=f"+7{user_id % 10_000_000_000:010d}"))
+        await self.app.bot_data["users"].set_role(user_id, "admin")
+
+        db = self.app.bot_data["db"]
+        for _ in range(rounds):
+            await self.send("admin", message_update(user_id, "/admin"))
+            await self.send("admin_active", message_update(user_id, "📂 Активные брони"))
+            rows = await db.fetchall(
+                "SELECT id FROM bookings WHERE status = 'pending' ORDER BY id DESC LIMIT 20"
+            )
+            if rows:
+                await self.send("admin_approve", message_update(user_id, "📋 Подтвердить бронь"))
+                ids = ", ".join(str(row[0]) for row in rows)
+                await self.send("admin_approve_ids", message_update(user_id, ids))
+            await self.send("admin_back", message_update(user_id, "↩️ Назад"))
+            await asyncio.sleep(random.uniform(0.5, 1.5))
+
+    async def sample_db(self, interval=0.1):
+        db = self.app.bot_data["db"]
+        while True:
+            self.db_samples.append(db.stats())
+            await asyncio.sleep(interval)
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _histogram_quantile(buckets, count, q):
+    """Квантиль по бакетам гистограммы, как histogram_quantile в Prometheus."""
+    rank = q * count
+    prev_le, prev_count = 0.0, 0.0
+    for le, cumulative in buckets:
+        if cumulative >= rank:
+            if le == float("inf"):
+                return prev_le
+            span = cumulative - prev_count
+            return prev_le + (le - prev_le) * ((rank - prev_count) / span if span else 0)
+        prev_le, prev_count = le, cumulative
+    return prev_le
+
+
+def histogram_summary(histogram, label):
+    """{значение метки: (count, p50, p99, sum)} по всем сериям гистограммы."""
+    series = defaultdict(lambda: {"buckets": [], "count": 0, "sum": 0.0})
+    for metric in histogram.collect():
+        for sample in metric.samples:
+            entry = series[sample.labels.get(label)]
+            if sample.name.endswith("_bucket"):
+                entry["buckets"].append((float(sample.labels["le"]), sample.value))
+            elif sample.name.endswith("_count"):
+                entry["count"] = sample.value
+            elif sample.name.endswith("_sum"):
+                entry["sum"] = sample.value
+    return {
+        key: (
+            int(entry["count"]),
+            _histogram_quantile(sorted(entry["buckets"]), entry["count"], 0.5),
+            _histogram_quantile(sorted(entry["buckets"]), entry["count"], 0.99),
+            entry["sum"],
+        )
+        for key, entry in series.items() if entry["count"]
+    }
+
+
+def report(test, elapsed):
+    total = sum(len(values) for values in test.latencies.values())
+    print(f"\nАпдейтов: {total} за {elapsed:.1f} c — {total / elapsed:.1f} апд/с, ошибок: {sum(test.errors.values())}")
+
+    print("\nШаги сценария (от апдейта до конца обработки, мс):")
+    print(f"{'шаг':<20}{'n':>8}{'p50':>10}{'p99':>10}{'max':>10}{'ошибки':>8}")
+    for step in dict.fromkeys([*test.latencies, *test.errors]):
+        values = test.latencies[step]
+        if not values:
+            print(f"{step:<20}{0:>8}{'—':>10}{'—':>10}{'—':>10}{test.errors[step]:>8}")
+            continue
+        print(f"{step:<20}{len(values):>8}{_percentile(values, 0.5) * 1000:>10.1f}"
+              f"{_percentile(values, 0.99) * 1000:>10.1f}{max(values) * 1000:>10.1f}{test.errors[step]:>8}")
+
+    print("\nХендлеры (по гистограмме taxi_handler_seconds, мс):")
+    print(f"{'хендлер':<28}{'n':>8}{'p50':>10}{'p99':>10}")
+    for handler, (count, p50, p99, _) in sorted(histogram_summary(metrics.HANDLER_LATENCY, "handler").items()):
+        print(f"{handler:<28}{count:>8}{p50 * 1000:>10.1f}{p99 * 1000:>10.1f}")
+
+    print("\nЗапросы к БД (по суммарному времени, мс):")
+    print(f"{'запрос':<28}{'n':>8}{'p50':>10}{'p99':>10}{'всего':>12}")
+    queries = sorted(histogram_summary(metrics.DB_QUERY_LATENCY, "query").items(), key=lambda item: -item[1][3])
+    for query, (count, p50, p99, total_seconds) in queries[:10]:
+        print(f"{query:<28}{count:>8}{p50 * 1000:>10.1f}{p99 * 1000:>10.1f}{total_seconds * 1000:>12.0f}")
+
+    samples = test.db_samples
+    if samples:
+        print(f"\nПул БД ({samples[-1]['mode']}, max={samples[-1]['pool_max']}):")
+        if samples[-1]["mode"] == "async":
+            waiting = [s["requests_waiting"] for s in samples]
+            busy = [s["pool_size"] - s["pool_available"] for s in samples]
+            saturated = sum(1 for s in samples if s["pool_available"] == 0 and s["pool_size"] >= s["pool_max"])
+            print(f"  занято соединений: среднее {statistics.mean(busy):.1f}, максимум {max(busy)}")
+            print(f"  ожидают соединения: среднее {statistics.mean(waiting):.1f}, максимум {max(waiting)}")
+            print(f"  пул исчерпан {saturated / len(samples):.0%} времени, "
+                  f"суммарное ожидание {samples[-1]['requests_wait_ms']} мс")
+        else:
+            busy = [s["busy"] for s in samples]
+            queued = [s["queued"] for s in samples]
+            saturated = sum(1 for s in samples if s["busy"] >= s["pool_max"])
+            print(f"  занято потоков: среднее {statistics.mean(busy):.1f}, максимум {max(busy)}")
+            print(f"  в очереди: среднее {statistics.mean(queued):.1f}, максимум {max(queued)}")
+            print(f"  пул исчерпан {saturated / len(samples):.0%} времени, "
+                  f"ожидание потока: среднее {samples[-1]['wait_ms_avg']:.1f} мс, максимум {samples[-1]['wait_ms_max']:.1f} мс")
+
+    print(f"\nВызовы Bot API: {dict(test.api.calls)}")
+
+
+async def _main(args):
+    api = FakeBotAPI(args.port)
+    await api.start()
+
+    os.environ["BOT_API_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ.setdefault("BOT_TOKEN", "123456:loadtest")
+    os.environ.setdefault("METRICS_PORT", "0")
+    # Все синтетические клиенты едут в один час — вместимость не должна их отсекать
+    os.environ.setdefault("CAPACITY_SEATS", "1000000")
+    if not args.telegram_limits:
+        for name in ("SEND_GLOBAL_RATE", "SEND_CHAT_RATE", "SEND_CHAT_BURST", "FLOOD_RATE", "FLOOD_BURST"):
+            os.environ.setdefault(name, "1000000")
+
+    # Эндпоинт не нужен, но гистограммы хендлеров и запросов — для отчёта
+    metrics.enable()
+    import main
+    app = main.build_application()
+    await app.initialize()
+    await app.post_init(app)
+    await app.start()
+
+    test = LoadTest(app, api, think=args.think)
+    sampler = asyncio.create_task(test.sample_db())
+    base_id = args.id_base or int(time.time()) * 1000
+    ride_day = date.today() + timedelta(days=args.days_ahead)
+
+    async def delayed(coroutine, delay):
+        await asyncio.sleep(delay)
+        await coroutine
+
+    started = time.perf_counter()
+    tasks = [
+        delayed(test.client(base_id + i, ride_day), random.uniform(0, args.ramp))
+        for i in range(args.users)
+    ]
+    tasks += [
+        delayed(test.admin(base_id + args.users + i, args.admin_rounds), random.uniform(0, args.ramp))
+        for i in range(args.admins)
+    ]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Сценарий упал: {result!r}")
+
+    sampler.cancel()
+    report(test, elapsed)
+
+    if args.cleanup:
+        ids = [base_id + i for i in range(args.users + args.admins)]
+        db = app.bot_data["db"]
+        await db.execute(
+            "DELETE FROM bookings WHERE client_id IN (SELECT id FROM users WHERE telegram_id = ANY(%s))", (ids,)
+        )
+        await db.execute("DELETE FROM users WHERE telegram_id = ANY(%s)", (ids,))
+
+    await app.stop()
+    await app.post_shutdown(app)
+    await app.shutdown()
+    api.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота с синтетическими пользователями")
+    parser.add_argument("--users", type=int, default=500, help="клиентов, проходящих полный сценарий")
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--admin-rounds", type=int, default=10, help="сколько раз каждый админ листает и подтверждает")
+    parser.add_argument("--ramp", type=float, default=5.0, help="за сколько секунд стартуют все пользователи")
+    parser.add_argument("--think", type=float, default=0.0, help="средняя пауза пользователя между шагами, c")
+    parser.add_argument("--days-ahead", type=int, default=3, help="на какой день от сегодня бронировать")
+    parser.add_argument("--id-base", type=int, default=0, help="первый telegram_id (по умолчанию от текущего времени)")
+    parser.add_argument("--port", type=int, default=8081, help="порт фейкового Bot API")
+    parser.add_argument("--telegram-limits", action="store_true", help="оставить лимиты Telegram и антифлуд")
+    parser.add_argument("--cleanup", action="store_true", help="удалить созданных пользователей и брони")
+    asyncio.run(_main(parser.parse_args()))
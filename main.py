@@ -1,7 +1,11 @@
 
+import time
+# Отсчёт фазы import для разбивки времени старта (см. health.py)
+_IMPORT_STARTED = time.perf_counter()
+
 import os
+import asyncio
 import logging
-import psycopg2
 from dotenv import load_dotenv
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton,InlineKeyboardButton, InlineKeyboardMarkup
 from datetime import datetime, timedelta
@@ -15,11 +19,33 @@ from admin_role_handler import (
     confirm_bookings,
     approve_booking,
     admin_menu_handler,
+    bookings_page_callback,
+    cancel_bookings_input,
+    selection_callback,
     AWAIT_ADMIN_ACTION,
-    AWAIT_BOOKING_ID
+    AWAIT_BOOKING_ID,
+    AWAIT_CANCEL_IDS,
+    ADMIN_MENU,
 )
 
 import booking  # логика бронирования только тут
+import booking_state
+from update_processor import ChatOrderedUpdateProcessor
+from send_queue import SendQueue, PRIORITY_HIGH
+from persistence import FlushingConversationHandler, PostgresPersistence
+from catalog import load_catalog, refresh_catalog
+from notifications import BookingNotifier
+from jobs import leads, schedule_booking_jobs
+from reports import report_command
+from driver_role_handler import become_driver, driver_command, slot_command, slots_command, slot_delete_callback
+from dispatch import Dispatcher, schedule_dispatch
+from capacity import Availability, capacity_command
+from health import StartupTracker, check_db, start_health_server, HEALTH_DB_INTERVAL
+from db import create_database, conninfo_from_env
+from migrate import check_schema
+from repository import UserRepository, BookingRepository, DriverRepository, CapacityRepository
+from flood_guard import FloodGuard
+import metrics
 
 
 # Настройка логирования
@@ -32,15 +58,8 @@ logger = logging.getLogger(__name__)
 # Загрузка переменных окружения из .env
 load_dotenv()
 
-# Подключение к базе данных
-conn = psycopg2.connect(
-    dbname=os.getenv("DB_NAME"),
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASSWORD"),
-    host=os.getenv("DB_HOST"),
-    port=os.getenv("DB_PORT")
-)
-cursor = conn.cursor()
+STARTUP = StartupTracker(_IMPORT_STARTED)
+STARTUP.mark("import")
 
 # Состояния бронирования берём из booking.py
 WAIT_PHONE = 0
@@ -51,20 +70,42 @@ CHOOSE_TYPE, CHOOSE_DIRECTION, ENTER_ADDRESS_FROM, CHOOSE_POINT_TO, ENTER_DATE,
 main_menu = booking.main_menu
 
 
-STATUS_MAP = {
-    "pending": "⏳ В ожидании",
-    "confirmed": "✅ Подтверждено",
-    "cancelled": "❌ Отменено",
-    "completed": "🏁 Завершено",
-}
+# Сколько броней показывать в «Мои брони» и сколько кнопок отмены в ряду
+MY_BOOKINGS_LIMIT = 20
+CANCEL_BUTTONS_PER_ROW = 3
+
+
+# «Мои брони» одним сообщением: список и общая клавиатура с кнопками отмены
+def render_my_bookings(bookings):
+    if not bookings:
+        return "📭 У вас нет активных броней.", None
+
+    lines = ["📅 Ваши брони:"]
+    buttons = []
+    for b in bookings[:MY_BOOKINGS_LIMIT]:
+        time_str = b.scheduled_time.strftime("%d.%m %H:%M") if b.scheduled_time else "время не указано"
+        lines.append(
+            f"\n#{b.id} · {time_str} · {booking_state.status_label(b.status)}\n"
+            f"{b.pickup_point} → {b.destination_point}"
+        )
+        if b.status in booking_state.allowed_from("cancelled"):
+            buttons.append(InlineKeyboardButton(f"❌ #{b.id}", callback_data=f"cancel:{b.id}"))
+    if len(bookings) > MY_BOOKINGS_LIMIT:
+        lines.append(f"\n…и ещё {len(bookings) - MY_BOOKINGS_LIMIT}")
+    if buttons:
+        lines.append("\n❗ Если до поездки < 12 часов — предоплата не возвращается.")
+
+    keyboard = InlineKeyboardMarkup([
+        buttons[i:i + CANCEL_BUTTONS_PER_ROW] for i in range(0, len(buttons), CANCEL_BUTTONS_PER_ROW)
+    ]) if buttons else None
+    return "\n".join(lines), keyboard
 
 
 # /start — приветствие и регистрация
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = update.effective_user.id
-    cursor.execute("SELECT * FROM users WHERE telegram_id = %s", (telegram_id,))
-    user = cursor.fetchone()
+    user = await context.bot_data["users"].get_by_telegram_id(telegram_id)
 
     if not user:
         await update.message.reply_text(
@@ -86,11 +127,7 @@ async def get_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
     full_name = f"{update.effective_user.first_name or ''} {update.effective_user.last_name or ''}".strip()
     phone = contact.phone_number
 
-    cursor.execute(
-        "INSERT INTO users (telegram_id, full_name, phone) VALUES (%s, %s, %s) ON CONFLICT (telegram_id) DO NOTHING",
-        (telegram_id, full_name, phone)
-    )
-    conn.commit()
+    await context.bot_data["users"].create(telegram_id, full_name, phone)
 
     await update.message.reply_text("✅ Номер подтверждён. Выберите действие:", reply_markup=main_menu)
     return ConversationHandler.END
@@ -100,47 +137,17 @@ async def handle_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text.strip()
     telegram_id = update.effective_user.id
     logger.info("Меню: '%s' от пользователя %s", text, telegram_id)
+    users = context.bot_data["users"]
+    bookings_repo = context.bot_data["bookings"]
 
     if text == "📅 Мои брони":
-        cursor.execute("SELECT id FROM users WHERE telegram_id = %s", (telegram_id,))
-        user_id_row = cursor.fetchone()
-
-        if not user_id_row:
+        bookings = await bookings_repo.list_for_client(telegram_id)
+        if not bookings and not await users.get_by_telegram_id(telegram_id):
             await update.message.reply_text("⚠️ Пользователь не найден. Попробуйте /start", reply_markup=main_menu)
             return
 
-        user_id = user_id_row[0]
-        cursor.execute("""
-            SELECT pickup_point, destination_point, status, id, scheduled_time
-            FROM bookings
-            WHERE client_id = %s AND status != 'cancelled'
-            ORDER BY scheduled_time NULLS LAST
-        """, (user_id,))
-        bookings = cursor.fetchall()
-
-        if bookings:
-            for i, (pickup, destination, status, booking_id, scheduled_time) in enumerate(bookings):
-                time_str = scheduled_time.strftime("%Y-%m-%d %H:%M") if scheduled_time else "время не указано"
-                status_text = STATUS_MAP.get(status, status)
-
-                msg = (
-                    f"📅 *Бронь #{i+1}:*\n"
-                    f"{pickup} → {destination}\n"
-                    f"⏰ Время: {time_str} | Статус: {status_text}\n\n"
-                    "❗ Если до поездки < 12 часов — предоплата не возвращается."
-                )
-
-
-                if status in ("pending", "confirmed"):
-                    keyboard = InlineKeyboardMarkup([
-                        [InlineKeyboardButton(f"❌ Отменить бронь #{i+1}", callback_data=f"cancel:{booking_id}")]
-                    ])
-                else:
-                    keyboard = None
-
-                await update.message.reply_text(msg, parse_mode="Markdown", reply_markup=keyboard or main_menu)
-        else:
-            await update.message.reply_text("📭 У вас нет активных броней.", reply_markup=main_menu)
+        text, keyboard = render_my_bookings(bookings)
+        await update.message.reply_text(text, reply_markup=keyboard or main_menu)
 
     elif text.startswith("Отменить"):
         try:
@@ -149,49 +156,26 @@ async def handle_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Укажите ID брони корректно. Пример: Отменить 123", reply_markup=main_menu)
             return
 
-        cursor.execute("""
-            SELECT scheduled_time, status
-            FROM bookings
-            WHERE id = %s AND client_id = (SELECT id FROM users WHERE telegram_id = %s)
-        """, (booking_id, telegram_id))
-        result = cursor.fetchone()
-
-        if not result:
-            await update.message.reply_text("❌ Бронь не найдена или вы не являетесь её владельцем.", reply_markup=main_menu)
-            return
-
-        scheduled_time, status = result
-        if status == "cancelled":
-            await update.message.reply_text("ℹ️ Эта бронь уже отменена.", reply_markup=main_menu)
-            return
-
-        now = datetime.now()
-        if scheduled_time and (scheduled_time - now < timedelta(hours=12)):
-            refund_msg = "⚠️ До поездки осталось менее 12 часов — предоплата не возвращается."
-        else:
-            refund_msg = "✅ Предоплата будет возвращена в полном объёме."
-
-        cursor.execute("UPDATE bookings SET status = 'cancelled' WHERE id = %s", (booking_id,))
-        conn.commit()
-
-        await update.message.reply_text(
-            f"🚫 Бронь #{booking_id} успешно отменена.\n{refund_msg}",
-            reply_markup=main_menu
+        result = await booking_state.cancel_by_client(bookings_repo, booking_id, telegram_id)
+        await context.bot.send_message(
+            update.effective_chat.id,
+            booking_state.cancel_result_text(result),
+            reply_markup=main_menu,
+            rate_limit_args=PRIORITY_HIGH
         )
 
     elif text == "👤 Мой профиль":
-        cursor.execute("SELECT full_name, phone FROM users WHERE telegram_id = %s", (telegram_id,))
-        user = cursor.fetchone()
+        user = await users.get_by_telegram_id(telegram_id)
         if user:
             await update.message.reply_text(
-                f"👤 Ваш профиль:\n\nИмя: {user[0]}\nТелефон: {user[1]}",
+                f"👤 Ваш профиль:\n\nИмя: {user.full_name}\nТелефон: {user.phone}",
                 reply_markup=main_menu
             )
         else:
             await update.message.reply_text("⚠️ Профиль не найден. Попробуйте /start", reply_markup=main_menu)
 
     elif text == "👨‍✈️ Стать водителем":
-        await update.message.reply_text("🚘 Чтобы стать водителем, свяжитесь с админом: @admin", reply_markup=main_menu)
+        await become_driver(update, context, reply_markup=main_menu)
 
     elif text == "ℹ️ Помощь / Контакты":
         await update.message.reply_text("📞 Поддержка: +7-999-123-4567", reply_markup=main_menu)
@@ -202,12 +186,6 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("⛔ Действие отменено.", reply_markup=main_menu)
     return ConversationHandler.END
 
-# Обёртка для confirm_booking из booking.py
-async def confirm_booking_wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    conn = context.application.bot_data["conn"]
-    cursor = context.application.bot_data["cursor"]
-    return await booking.confirm_booking(update, context, conn, cursor)
-
 async def cancel_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = update.effective_user.id
     message = update.message.text
@@ -219,44 +197,12 @@ async def cancel_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     booking_id = int(match.group(1))
 
-    # Получаем бронь
-    cursor.execute("""
-        SELECT client_id, ride_time, status FROM bookings WHERE id = %s
-    """, (booking_id,))
-    result = cursor.fetchone()
-
-    if not result:
-        await update.message.reply_text("❌ Бронь не найдена.")
-        return
-
-    client_id, ride_time, status = result
-
-    # Проверяем владельца
-    cursor.execute("SELECT id FROM users WHERE telegram_id = %s", (telegram_id,))
-    user_id = cursor.fetchone()[0]
-
-    if client_id != user_id:
-        await update.message.reply_text("🚫 Это не ваша бронь.")
-        return
-
-    # Проверка времени
-    if ride_time is not None:
-        now = datetime.now()
-        hours_diff = (ride_time - now).total_seconds() / 3600
-
-        if hours_diff < 12:
-            warning = "❗️ Вы отменяете поездку менее чем за 12 часов. Предоплата не возвращается."
-        else:
-            warning = "✅ Бронь успешно отменена."
-
-    else:
-        warning = "⚠️ Время поездки не указано. Бронь отменена без расчёта возврата."
-
-    # Обновляем статус
-    cursor.execute("UPDATE bookings SET status = 'cancelled' WHERE id = %s", (booking_id,))
-    conn.commit()
-
-    await update.message.reply_text(warning, reply_markup=main_menu)
+    # Проверка владельца, статуса и отмена — одним условным запросом
+    result = await booking_state.cancel_by_client(context.bot_data["bookings"], booking_id, telegram_id)
+    await context.bot.send_message(
+        update.effective_chat.id, booking_state.cancel_result_text(result),
+        reply_markup=main_menu, rate_limit_args=PRIORITY_HIGH
+    )
 
 
 async def handle_cancel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -269,40 +215,145 @@ async def handle_cancel_callback(update: Update, context: ContextTypes.DEFAULT_T
     if data.startswith("cancel:"):
         booking_id = int(data.split(":")[1])
 
-        cursor.execute("""
-            SELECT scheduled_time, status
-            FROM bookings
-            WHERE id = %s AND client_id = (SELECT id FROM users WHERE telegram_id = %s)
-        """, (booking_id, telegram_id))
-        result = cursor.fetchone()
-
-        if not result:
-            await query.edit_message_text("❌ Бронь не найдена или вы не являетесь её владельцем.", reply_markup=main_menu)
-            return
-
-        scheduled_time, status = result
-        if status == "cancelled":
-            await query.edit_message_text("ℹ️ Эта бронь уже отменена.", reply_markup=main_menu)
-            return
-
-        now = datetime.now()
-        if scheduled_time and (scheduled_time - now < timedelta(hours=12)):
-            refund_msg = "⚠️ До поездки осталось менее 12 часов — предоплата не возвращается."
-        else:
-            refund_msg = "✅ Предоплата будет возвращена в полном объёме."
+        bookings_repo = context.bot_data["bookings"]
+        result = await booking_state.cancel_by_client(bookings_repo, booking_id, telegram_id)
+        # Тот же список «Мои брони», обновлённый на месте, с итогом отмены сверху
+        text, keyboard = render_my_bookings(await bookings_repo.list_for_client(telegram_id))
+        await context.bot.edit_message_text(
+            f"{booking_state.cancel_result_text(result)}\n\n{text}",
+            chat_id=query.message.chat_id,
+            message_id=query.message.message_id,
+            reply_markup=keyboard,
+            rate_limit_args=PRIORITY_HIGH
+        )
 
-        cursor.execute("UPDATE bookings SET status = 'cancelled' WHERE id = %s", (booking_id,))
-        conn.commit()
 
-        await query.edit_message_text(f"🚫 Бронь #{booking_id} успешно отменена.\n{refund_msg}", reply_markup=main_menu)
-# Главная функция запуска бота
-def main():
-    logger.info("Запуск Telegram Taxi Bot...")
+# Брошенные диалоги бронирования живут не дольше CONVERSATION_TTL
+CONVERSATION_TTL = int(os.getenv("CONVERSATION_TTL", str(6 * 3600)))
+
+
+# Открытие пула и репозиториев при старте приложения
+async def post_init(app):
+    startup = app.bot_data["startup"]
+    # initialize: getMe, загрузка persistence и подключение к БД (с повторами, см. db.py)
+    startup.mark("initialize")
+    db = app.bot_data["db"]
+    await db.open()
+    startup.record("db_connect", db.connect_seconds)
+    await check_schema(db)
+    app.bot_data["users"] = users = UserRepository(db)
+    app.bot_data["bookings"] = bookings = BookingRepository(db)
+    app.bot_data["catalog"] = await load_catalog(db, booking.DESTINATIONS)
+    app.bot_data["drivers"] = drivers = DriverRepository(db)
+    app.bot_data["availability"] = availability = Availability(bookings, CapacityRepository(db))
+    metrics.start_metrics_server()
+
+    # Назначение подтверждённых броней водителям по индексу слотов в памяти
+    dispatcher = Dispatcher(drivers, app.bot)
+    await dispatcher.load()
+    app.bot_data["dispatcher"] = dispatcher
+
+    # Пуш-уведомления клиентам и в админ-чат вместо опроса «Мои брони»
+    notifier = BookingNotifier(
+        app.bot,
+        conninfo_from_env(),
+        admin_chat_id=os.getenv("ADMIN_CHAT_ID"),
+        coalesce_seconds=float(os.getenv("NOTIFY_COALESCE_SECONDS", "2")),
+        invalidate=lambda telegram_id: (users.invalidate(telegram_id), bookings.invalidate_client(telegram_id)),
+        on_event=lambda event: (dispatcher.on_event(event), availability.on_event(event)),
+        addresses=bookings.addresses,
+    )
+    notifier.start()
+    app.bot_data["notifier"] = notifier
+
+    if app.job_queue:
+        # Задачи по общей базе в кластере выполняет только ведущий воркер (jobs.leads);
+        # каталог, статистика и проверка базы — своё у каждого процесса
+        # DB_STATS_INTERVAL — имя из документации; STATS_INTERVAL читается для совместимости
+        stats_interval = os.getenv("DB_STATS_INTERVAL") or os.getenv("STATS_INTERVAL", "60")
+        app.job_queue.run_repeating(log_stats, interval=int(stats_interval))
+        app.job_queue.run_repeating(evict_stale_conversations, interval=3600, first=60)
+        app.job_queue.run_repeating(reload_catalog, interval=int(os.getenv("CATALOG_REFRESH_INTERVAL", "30")))
+        schedule_booking_jobs(app.job_queue)
+        schedule_dispatch(app.job_queue)
+        app.job_queue.run_repeating(check_db, interval=HEALTH_DB_INTERVAL)
+
+    # База только что ответила на запросы каталога — можно принимать трафик
+    startup.db_ok = True
+    startup.set_ready()
+
+
+# Подхват новых тарифов без рестарта: дешёвая проверка версии каталога
+async def reload_catalog(context: ContextTypes.DEFAULT_TYPE):
+    context.bot_data["catalog"] = await refresh_catalog(
+        context.bot_data["db"], context.bot_data["catalog"], booking.DESTINATIONS
+    )
 
-    app = ApplicationBuilder().token(os.getenv("BOT_TOKEN")).build()
 
-    app.bot_data["conn"] = conn
-    app.bot_data["cursor"] = cursor
+# Чистка брошенных диалогов в базе и в памяти; в кластере — только у ведущего воркера
+async def evict_stale_conversations(context: ContextTypes.DEFAULT_TYPE):
+    if not leads(context):
+        return
+    user_ids = await context.application.persistence.evict_stale()
+    for user_id in user_ids:
+        context.application.drop_user_data(user_id)
+    if user_ids:
+        logger.info("Удалены данные брошенных диалогов: %s", len(user_ids))
+
+
+# Периодический вывод метрик: пул БД (размер, занятость, ожидание) и очередь отправки
+async def log_stats(context: ContextTypes.DEFAULT_TYPE):
+    logger.info("Пул БД: %s", context.bot_data["db"].stats())
+    logger.info("Очередь отправки: %s", context.bot.rate_limiter.stats())
+    logger.info("Антифлуд: %s", context.bot_data["flood_guard"].stats())
+    logger.info("Диспетчер: %s", context.bot_data["dispatcher"].stats())
+    if "cluster" in context.bot_data:
+        logger.info("Кластер: %s", context.bot_data["cluster"].stats())
+
+
+async def post_shutdown(app):
+    notifier = app.bot_data.get("notifier")
+    if notifier:
+        await notifier.stop()
+    dispatcher = app.bot_data.get("dispatcher")
+    if dispatcher:
+        await dispatcher.stop()
+    db = app.bot_data.get("db")
+    if db:
+        await db.close()
+
+
+# /export: модуль выгрузки (и pyarrow для Parquet) грузится при первом вызове
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    import exports
+    await exports.export_command(update, context)
+
+
+# Сборка приложения со всеми хендлерами
+def build_application():
+    # Без токена нет смысла подключаться к базе и собирать хендлеры
+    if not os.getenv("BOT_TOKEN"):
+        raise RuntimeError("BOT_TOKEN не задан")
+    db = create_database()
+    persistence = PostgresPersistence(
+        db, ttl=CONVERSATION_TTL, update_interval=float(os.getenv("PERSISTENCE_INTERVAL", "5"))
+    )
+    builder = (
+        ApplicationBuilder()
+        .token(os.getenv("BOT_TOKEN"))
+        .persistence(persistence)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        # Разные чаты обрабатываются параллельно, один чат — по порядку
+        .concurrent_updates(ChatOrderedUpdateProcessor(int(os.getenv("CONCURRENT_UPDATES", "64"))))
+        # Все исходящие запросы идут через очередь с лимитами Telegram
+        .rate_limiter(SendQueue.from_env())
+    )
+    # Адрес Bot API можно подменить на локальный фейк (см. fake_telegram.py)
+    if os.getenv("BOT_API_URL"):
+        builder = builder.base_url(os.getenv("BOT_API_URL").rstrip("/") + "/bot")
+    app = builder.build()
+    app.bot_data["db"] = db
 
     # Conversation handler для получения телефона
     start_conv_handler = ConversationHandler(
@@ -311,10 +362,11 @@ def main():
             WAIT_PHONE: [MessageHandler(filters.CONTACT, get_phone)],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
+        name="start",
     )
 
-    # Conversation handler бронирования
-    conv_handler = ConversationHandler(
+    # Conversation handler бронирования; состояние пишется на каждом шаге
+    conv_handler = FlushingConversationHandler(
         entry_points=[MessageHandler(filters.Regex('🚕 Забронировать поездку'), booking.choose_type)],
         states={
             CHOOSE_TYPE: [MessageHandler(filters.TEXT & ~filters.COMMAND, booking.choose_type)],
@@ -326,7 +378,11 @@ def main():
             CONFIRM_BOOKING: [MessageHandler(filters.TEXT & ~filters.COMMAND, booking.confirm_booking)],
             EXTRA: [MessageHandler(filters.TEXT & ~filters.COMMAND, booking.extra_handler)],
         },
-        fallbacks=[CommandHandler("cancel", cancel)]
+        fallbacks=[CommandHandler("cancel", cancel)],
+        # Состояние переживает рестарт, брошенные диалоги завершаются по таймауту
+        name="booking",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TTL,
     )
 
     # Admin handler
@@ -335,19 +391,95 @@ def main():
         states={
             AWAIT_ADMIN_ACTION: [MessageHandler(filters.TEXT & ~filters.COMMAND, admin_menu_handler)],
             AWAIT_BOOKING_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, approve_booking)],
+            AWAIT_CANCEL_IDS: [MessageHandler(filters.TEXT & ~filters.COMMAND, cancel_bookings_input)],
         },
-        fallbacks=[CommandHandler("cancel", cancel)]
+        fallbacks=[CommandHandler("cancel", cancel)],
+        name="admin",
     )
 
+    # Антифлуд до всех хендлеров: лимит на пользователя и склейка повторных нажатий меню
+    flood_guard = FloodGuard.from_env(coalesce_texts=[
+        button.text for keyboard in (main_menu, ADMIN_MENU) for row in keyboard.keyboard for button in row
+    ])
+    app.bot_data["flood_guard"] = flood_guard
+    app.add_handler(flood_guard.handler(), group=-1)
+
     # Добавление хендлеров
     app.add_handler(start_conv_handler)
     app.add_handler(admin_conv_handler)
     app.add_handler(conv_handler)
     app.add_handler(admin_conv_handler)
+    app.add_handler(CommandHandler("report", report_command))
+    app.add_handler(CommandHandler("export", export_command))
+    app.add_handler(CommandHandler("capacity", capacity_command))
+    app.add_handler(CommandHandler("driver", driver_command))
+    app.add_handler(CommandHandler("slot", slot_command))
+    app.add_handler(CommandHandler("slots", slots_command))
     app.add_handler(CallbackQueryHandler(handle_cancel_callback, pattern=r'^cancel:\d+$'))
+    app.add_handler(CallbackQueryHandler(bookings_page_callback, pattern=r'^adm:[ah]:[np]:'))
+    app.add_handler(CallbackQueryHandler(slot_delete_callback, pattern=r'^slot:del:\d+$'))
+    app.add_handler(CallbackQueryHandler(selection_callback, pattern=r'^sel:(t:\d+|approve|cancel)$'))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_main_menu))
 
-    app.run_polling()
+    # Время каждого хендлера и воронка бронирования (ENTER_DATE -> CONFIRM_BOOKING -> END);
+    # prometheus_client грузится, только если метрики включены (METRICS_PORT не 0)
+    if metrics.wanted():
+        STARTUP.record("import_metrics", metrics.enable())
+        metrics.instrument_application(app, state_names={
+            "start": {WAIT_PHONE: "WAIT_PHONE"},
+            "booking": {
+                state: name for name, state in (
+                    ("CHOOSE_TYPE", CHOOSE_TYPE), ("CHOOSE_DIRECTION", CHOOSE_DIRECTION),
+                    ("ENTER_ADDRESS_FROM", ENTER_ADDRESS_FROM), ("CHOOSE_POINT_TO", CHOOSE_POINT_TO),
+                    ("ENTER_DATE", ENTER_DATE), ("ENTER_TIME", ENTER_TIME),
+                    ("CONFIRM_BOOKING", CONFIRM_BOOKING), ("EXTRA", EXTRA),
+                )
+            },
+            "admin": {
+                AWAIT_ADMIN_ACTION: "AWAIT_ADMIN_ACTION", AWAIT_BOOKING_ID: "AWAIT_BOOKING_ID",
+                AWAIT_CANCEL_IDS: "AWAIT_CANCEL_IDS",
+            },
+        })
+        metrics.register_stats_gauges(app)
+
+    app.bot_data["startup"] = STARTUP
+    app.add_handler(STARTUP.handler(), group=-2)
+    STARTUP.mark("build")
+    return app
+
+
+# Приём апдейтов через вебхук: локальный HTTP-сервер на WEBHOOK_PORT
+def run_webhook(app):
+    url_path = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+    public_url = os.getenv("WEBHOOK_URL")
+    app.run_webhook(
+        listen=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+        port=int(os.getenv("WEBHOOK_PORT", "8443")),
+        url_path=url_path,
+        secret_token=os.getenv("WEBHOOK_SECRET"),
+        webhook_url=f"{public_url.rstrip('/')}/{url_path}" if public_url else None,
+    )
+
+
+# Главная функция запуска бота
+def main():
+    logger.info("Запуск Telegram Taxi Bot...")
+
+    app = build_application()
+    # Пробы отвечают уже во время ожидания базы и загрузки persistence
+    start_health_server(STARTUP)
+
+    mode = os.getenv("BOT_MODE", "polling")
+    if mode == "webhook":
+        run_webhook(app)
+    elif mode == "worker":
+        # Один из нескольких воркеров: апдейты из очереди ingress.py (см. cluster.py)
+        started = time.perf_counter()
+        from cluster import run_worker
+        STARTUP.record("import_cluster", time.perf_counter() - started)
+        asyncio.run(run_worker(app, conninfo_from_env()))
+    else:
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
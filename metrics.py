@@ -0,0 +1,191 @@
+"""Метрики Prometheus: хендлеры, запросы к БД, Bot API и воронка диалогов.
+
+Эндпоинт /metrics поднимается на METRICS_PORT (0 — выключено). Если порт
+занят, бот работает без эндпоинта: нескольким воркерам на одной машине
+нужны разные METRICS_PORT.
+Запросы дольше SLOW_QUERY_MS пишутся в лог целиком.
+
+prometheus_client импортируется только в enable(): пока метрики не
+включены, хуки observe_* из db.py, send_queue.py и flood_guard.py
+ничего не пишут, и процесс с METRICS_PORT=0 его не грузит.
+"""
+import os
+import re
+import time
+import logging
+import functools
+
+from telegram.ext import ApplicationHandlerStop, ConversationHandler
+
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+# Создаются в enable()
+HANDLER_LATENCY = HANDLER_ERRORS = DB_QUERY_LATENCY = DB_SLOW_QUERIES = None
+TELEGRAM_LATENCY = CONVERSATION_STATES = FLOOD_DROPPED = None
+
+
+def wanted():
+    """Нужны ли метрики этому процессу: METRICS_PORT не 0 или их уже включили (loadtest)."""
+    return enabled() or int(os.getenv("METRICS_PORT", "9108")) != 0
+
+
+def enabled():
+    return HANDLER_LATENCY is not None
+
+
+def enable():
+    """Импортирует prometheus_client и создаёт метрики; возвращает время импорта в секундах."""
+    global HANDLER_LATENCY, HANDLER_ERRORS, DB_QUERY_LATENCY, DB_SLOW_QUERIES
+    global TELEGRAM_LATENCY, CONVERSATION_STATES, FLOOD_DROPPED
+    if enabled():
+        return 0.0
+    started = time.perf_counter()
+    from prometheus_client import Counter, Histogram
+
+    HANDLER_LATENCY = Histogram(
+        "taxi_handler_seconds", "Время работы хендлера", ["handler"],
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    )
+    HANDLER_ERRORS = Counter("taxi_handler_errors_total", "Исключения в хендлерах", ["handler"])
+    DB_QUERY_LATENCY = Histogram(
+        "taxi_db_query_seconds", "Время выполнения запроса к БД", ["query"],
+        buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+    )
+    DB_SLOW_QUERIES = Counter("taxi_db_slow_queries_total", "Запросы дольше SLOW_QUERY_MS", ["query"])
+    TELEGRAM_LATENCY = Histogram(
+        "taxi_telegram_api_seconds", "Время запроса к Bot API", ["method"],
+        buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    )
+    CONVERSATION_STATES = Counter(
+        "taxi_conversation_state_total", "Переходы диалогов в состояние (воронка)", ["conversation", "state"]
+    )
+    FLOOD_DROPPED = Counter("taxi_flood_dropped_total", "Отброшенные входящие апдейты", ["reason"])
+    return time.perf_counter() - started
+
+_QUERY_RE = re.compile(r"^\s*(?:WITH\b.*?\)\s*)?(SELECT|INSERT|UPDATE|DELETE|WITH)\b.*?\b(?:FROM|INTO|UPDATE)\s+(\w+)",
+                       re.IGNORECASE | re.DOTALL)
+_query_labels = {}
+
+
+def query_label(sql):
+    """Короткая метка запроса: «select bookings», «update users» и т.п."""
+    label = _query_labels.get(sql)
+    if label is None:
+        match = _QUERY_RE.match(sql)
+        if match:
+            label = f"{match.group(1).lower()} {match.group(2).lower()}"
+        else:
+            label = " ".join(sql.split()[:2]).lower() or "unknown"
+        _query_labels[sql] = label
+    return label
+
+
+def observe_query(sql, seconds):
+    slow = seconds * 1000 >= SLOW_QUERY_MS
+    if slow:
+        logger.warning("Медленный запрос (%.0f мс): %s", seconds * 1000, " ".join(sql.split()))
+    if DB_QUERY_LATENCY is None:
+        return
+    label = query_label(sql)
+    DB_QUERY_LATENCY.labels(label).observe(seconds)
+    if slow:
+        DB_SLOW_QUERIES.labels(label).inc()
+
+
+def observe_telegram(method, seconds):
+    if TELEGRAM_LATENCY is not None:
+        TELEGRAM_LATENCY.labels(method).observe(seconds)
+
+
+def observe_flood_dropped(reason):
+    if FLOOD_DROPPED is not None:
+        FLOOD_DROPPED.labels(reason).inc()
+
+
+def _wrap_callback(callback, conversation=None, state_names=None):
+    name = getattr(callback, "__name__", repr(callback))
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            result = await callback(update, context)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            HANDLER_ERRORS.labels(name).inc()
+            raise
+        finally:
+            HANDLER_LATENCY.labels(name).observe(time.perf_counter() - started)
+        if conversation is not None and isinstance(result, int):
+            names = (state_names or {}).get(conversation, {})
+            state = names.get(result, "END" if result == ConversationHandler.END else str(result))
+            CONVERSATION_STATES.labels(conversation, state).inc()
+        return result
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _instrument_handler(handler, conversation=None, state_names=None):
+    if isinstance(handler, ConversationHandler):
+        name = handler.name or "conversation"
+        nested = list(handler.entry_points) + list(handler.fallbacks)
+        for handlers in handler.states.values():
+            nested += list(handlers)
+        for inner in nested:
+            _instrument_handler(inner, name, state_names)
+        return
+    if not getattr(handler.callback, "instrumented", False):
+        handler.callback = _wrap_callback(handler.callback, conversation, state_names)
+
+
+def instrument_application(app, state_names=None):
+    """Оборачивает все зарегистрированные хендлеры замером времени.
+
+    state_names — {имя диалога: {номер состояния: имя}} для воронки:
+    сколько раз диалог доходил до каждого шага.
+    """
+    enable()
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            _instrument_handler(handler, state_names=state_names)
+
+
+def register_stats_gauges(app):
+    """Пул БД и очередь отправки как gauges (значения берутся при скрейпе)."""
+    from prometheus_client import Gauge
+
+    enable()
+    db = app.bot_data["db"]
+    pool = Gauge("taxi_db_pool", "Состояние пула БД", ["metric"])
+    for key in ("pool_max", "pool_size", "pool_available", "requests_waiting", "busy", "queued"):
+        pool.labels(key).set_function(lambda key=key: db.stats().get(key, 0))
+
+    send_queue = app.bot.rate_limiter
+    queued = Gauge("taxi_send_queue_depth", "Сообщений в очереди отправки", ["priority"])
+    for priority in send_queue.stats()["queued"]:
+        queued.labels(str(priority)).set_function(lambda p=priority: send_queue.stats()["queued"][p])
+    Gauge("taxi_send_retries", "Повторов после RetryAfter").set_function(lambda: send_queue.retries)
+    Gauge("taxi_sent_messages", "Отправлено запросов с chat_id").set_function(lambda: send_queue.sent)
+
+
+def start_metrics_server():
+    port = int(os.getenv("METRICS_PORT", "9108"))
+    if not port:
+        return False
+    addr = os.getenv("METRICS_LISTEN", "127.0.0.1")
+    from prometheus_client import start_http_server
+
+    enable()
+    try:
+        start_http_server(port, addr=addr)
+    except OSError as exc:
+        # Второй воркер на той же машине с тем же METRICS_PORT — работаем без эндпоинта
+        logger.warning("Метрики не запущены на %s:%s: %s", addr, port, exc)
+        return False
+    logger.info("Метрики Prometheus: http://%s:%s/metrics", addr, port)
+    return True
@@ -0,0 +1,110 @@
+"""Версионированные миграции схемы.
+
+Файлы лежат в migrations/ и называются NNNN_описание.sql. Каждый файл
+применяется в своей транзакции и записывается в schema_migrations.
+
+    python migrate.py           # применить недостающие
+    python migrate.py status    # показать состояние
+"""
+import os
+import re
+import sys
+import asyncio
+import logging
+
+from dotenv import load_dotenv
+
+from db import create_database
+
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+def load_migrations(path=MIGRATIONS_DIR):
+    """Список (version, name, sql), отсортированный по версии."""
+    migrations = []
+    for filename in sorted(os.listdir(path)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(path, filename), encoding="utf-8") as f:
+            migrations.append((int(match.group(1)), match.group(2), f.read()))
+    return migrations
+
+
+SCHEMA_MIGRATIONS_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version    INTEGER PRIMARY KEY,
+        name       TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+
+async def applied_versions(db):
+    """Применённые версии. Только чтение — check_schema зовётся ботом при старте.
+
+    Нет таблицы schema_migrations — значит, не применено ничего.
+    """
+    row = await db.fetchone("SELECT to_regclass('schema_migrations')")
+    if row[0] is None:
+        return set()
+    rows = await db.fetchall("SELECT version FROM schema_migrations")
+    return {row[0] for row in rows}
+
+
+async def pending_migrations(db):
+    applied = await applied_versions(db)
+    return [m for m in load_migrations() if m[0] not in applied]
+
+
+async def migrate(db):
+    await db.execute(SCHEMA_MIGRATIONS_SQL)
+    applied = []
+    for version, name, sql in await pending_migrations(db):
+        async with db.transaction() as tx:
+            # Без параметров, чтобы файл мог содержать несколько команд
+            await tx.execute(sql, None)
+            await tx.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name)
+            )
+        logger.info("Миграция %04d_%s применена", version, name)
+        applied.append(version)
+    return applied
+
+
+async def check_schema(db):
+    """Отказывается работать с базой, к которой применены не все миграции."""
+    pending = await pending_migrations(db)
+    if pending:
+        names = ", ".join(f"{version:04d}_{name}" for version, name, _ in pending)
+        raise MigrationError(f"База не смигрирована, не применены: {names}. Запустите python migrate.py")
+
+
+async def _main(command):
+    db = create_database()
+    await db.open()
+    try:
+        if command == "status":
+            applied = await applied_versions(db)
+            for version, name, _ in load_migrations():
+                mark = "✅" if version in applied else "⏳"
+                print(f"{mark} {version:04d}_{name}")
+        else:
+            applied = await migrate(db)
+            print(f"Применено миграций: {len(applied)}")
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    load_dotenv()
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else "migrate"))
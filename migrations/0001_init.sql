@@ -0,0 +1,39 @@
+-- Базовая схема: пользователи и брони.
+-- IF NOT EXISTS — чтобы миграция легла и на базу, созданную вручную.
+
+CREATE TABLE IF NOT EXISTS users (
+    id          SERIAL PRIMARY KEY,
+    telegram_id BIGINT NOT NULL UNIQUE,
+    full_name   TEXT,
+    phone       TEXT,
+    role        TEXT,
+    created_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS bookings (
+    id                SERIAL PRIMARY KEY,
+    client_id         INTEGER NOT NULL REFERENCES users (id),
+    from_city         TEXT NOT NULL,
+    to_city           TEXT NOT NULL,
+    pickup_point      TEXT,
+    destination_point TEXT,
+    scheduled_time    TIMESTAMP,
+    price             INTEGER,
+    ride_type         TEXT,
+    status            TEXT NOT NULL DEFAULT 'pending',
+    created_at        TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- «📅 Мои брони»: client_id + status != 'cancelled', ORDER BY scheduled_time NULLS LAST
+CREATE INDEX IF NOT EXISTS bookings_client_open_idx
+    ON bookings (client_id, scheduled_time NULLS LAST)
+    WHERE status <> 'cancelled';
+
+-- «📂 Активные брони»: status IN ('pending', 'confirmed'), ORDER BY scheduled_time DESC
+CREATE INDEX IF NOT EXISTS bookings_active_time_idx
+    ON bookings (scheduled_time DESC)
+    WHERE status IN ('pending', 'confirmed');
+
+-- «📜 История броней»: ORDER BY scheduled_time DESC LIMIT n
+CREATE INDEX IF NOT EXISTS bookings_time_idx
+    ON bookings (scheduled_time DESC);
@@ -0,0 +1,12 @@
+-- Keyset-пагинация админских списков: сортировка по (время, id),
+-- брони без времени идут в конце как '-infinity'.
+
+DROP INDEX IF EXISTS bookings_active_time_idx;
+DROP INDEX IF EXISTS bookings_time_idx;
+
+CREATE INDEX IF NOT EXISTS bookings_active_sort_idx
+    ON bookings ((COALESCE(scheduled_time, '-infinity'::timestamp)) DESC, id DESC)
+    WHERE status IN ('pending', 'confirmed');
+
+CREATE INDEX IF NOT EXISTS bookings_sort_idx
+    ON bookings ((COALESCE(scheduled_time, '-infinity'::timestamp)) DESC, id DESC);
@@ -0,0 +1,19 @@
+-- Состояние диалогов и user_data для PostgresPersistence (persistence.py).
+
+CREATE TABLE IF NOT EXISTS conversation_state (
+    name       TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    state      INTEGER NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (name, key)
+);
+
+CREATE INDEX IF NOT EXISTS conversation_state_updated_idx ON conversation_state (updated_at);
+
+CREATE TABLE IF NOT EXISTS user_data (
+    user_id    BIGINT PRIMARY KEY,
+    data       JSONB NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS user_data_updated_idx ON user_data (updated_at);
@@ -0,0 +1,24 @@
+-- Каталог точек в Казани и тарифов (catalog.py).
+-- Пустая таблица заполняется из booking.DESTINATIONS при первом запуске.
+
+CREATE TABLE IF NOT EXISTS destinations (
+    id         SERIAL PRIMARY KEY,
+    name       TEXT NOT NULL UNIQUE,
+    price      INTEGER NOT NULL,
+    sort_order INTEGER NOT NULL DEFAULT 0,
+    active     BOOLEAN NOT NULL DEFAULT TRUE,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- updated_at двигается при любом изменении тарифа — по нему бот видит, что пора перечитать каталог
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at = now();
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS destinations_touch ON destinations;
+CREATE TRIGGER destinations_touch
+    BEFORE UPDATE ON destinations
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
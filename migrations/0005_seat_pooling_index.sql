@@ -0,0 +1,5 @@
+-- Выборка броней «место в машине» по направлению и окну времени (pooling.py).
+
+CREATE INDEX IF NOT EXISTS bookings_seat_pool_idx
+    ON bookings (scheduled_time, from_city)
+    WHERE ride_type = '🚗 Место в машине' AND status IN ('pending', 'confirmed');
@@ -0,0 +1,35 @@
+-- Уведомления об изменениях броней через LISTEN/NOTIFY (notifications.py).
+-- Функция notify_booking_change переопределена в 0011 и 0013.
+-- status_changed_by: кто поменял статус (client / admin / system), чтобы не
+-- уведомлять клиента о его же действиях.
+
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS status_changed_by TEXT;
+
+CREATE OR REPLACE FUNCTION notify_booking_change() RETURNS trigger AS $$
+DECLARE
+    client_telegram_id BIGINT;
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.status IS NOT DISTINCT FROM OLD.status THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT telegram_id INTO client_telegram_id FROM users WHERE id = NEW.client_id;
+
+    PERFORM pg_notify('booking_events', json_build_object(
+        'op', TG_OP,
+        'id', NEW.id,
+        'status', NEW.status,
+        'actor', NEW.status_changed_by,
+        'telegram_id', client_telegram_id,
+        'scheduled_time', NEW.scheduled_time,
+        'from', NEW.pickup_point,
+        'to', NEW.destination_point
+    )::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bookings_notify ON bookings;
+CREATE TRIGGER bookings_notify
+    AFTER INSERT OR UPDATE OF status ON bookings
+    FOR EACH ROW EXECUTE FUNCTION notify_booking_change();
@@ -0,0 +1,13 @@
+-- Плановые задачи по броням (jobs.py): напоминания, истечение, завершение.
+
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS reminder_sent_at TIMESTAMPTZ;
+
+-- Просроченные pending и прошедшие confirmed: status + scheduled_time < now
+CREATE INDEX IF NOT EXISTS bookings_due_idx
+    ON bookings (status, scheduled_time)
+    WHERE status IN ('pending', 'confirmed');
+
+-- Подтверждённые поездки, по которым ещё не было напоминания
+CREATE INDEX IF NOT EXISTS bookings_reminder_idx
+    ON bookings (scheduled_time)
+    WHERE status = 'confirmed' AND reminder_sent_at IS NULL;
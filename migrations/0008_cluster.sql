@@ -0,0 +1,41 @@
+-- Несколько воркеров бота (cluster.py, ingress.py).
+-- ingress кладёт апдейты в incoming_updates, каждый воркер разбирает
+-- только свои партиции (telegram_id % число партиций), которые держит
+-- в аренде в worker_leases.
+
+CREATE TABLE IF NOT EXISTS incoming_updates (
+    id          BIGSERIAL PRIMARY KEY,
+    update_id   BIGINT NOT NULL UNIQUE,  -- повторная доставка от Telegram не дублируется
+    partition   INTEGER NOT NULL,
+    payload     JSONB NOT NULL,
+    received_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS incoming_updates_partition_idx ON incoming_updates (partition, id);
+
+CREATE TABLE IF NOT EXISTS worker_leases (
+    partition  INTEGER PRIMARY KEY,
+    worker_id  TEXT,
+    expires_at TIMESTAMPTZ NOT NULL DEFAULT '-infinity'
+);
+
+CREATE TABLE IF NOT EXISTS cluster_workers (
+    worker_id    TEXT PRIMARY KEY,
+    heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Смена роли или профиля сбрасывает кэш пользователя во всех воркерах
+CREATE OR REPLACE FUNCTION notify_user_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('booking_events', json_build_object(
+        'op', 'USER',
+        'telegram_id', NEW.telegram_id
+    )::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_notify ON users;
+CREATE TRIGGER users_notify
+    AFTER UPDATE OF role, full_name, phone ON users
+    FOR EACH ROW EXECUTE FUNCTION notify_user_change();
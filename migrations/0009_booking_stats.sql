@@ -0,0 +1,120 @@
+-- Агрегаты для /report (reports.py): счётчики по дню, часу, направлению и
+-- точке в Казани. Триггер поддерживает их инкрементально при каждой вставке
+-- и смене статуса брони, поэтому отчёт читает сотни строк, а не всю bookings.
+-- Строчный триггер bookings_stats заменён триггерами на оператор в 0014.
+
+-- Поздняя отмена (менее 12 часов до поездки) фиксируется в момент отмены
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS cancelled_late BOOLEAN NOT NULL DEFAULT false;
+
+CREATE TABLE IF NOT EXISTS booking_stats (
+    day            DATE     NOT NULL,
+    hour           SMALLINT NOT NULL,
+    from_city      TEXT     NOT NULL,
+    to_city        TEXT     NOT NULL,
+    point          TEXT     NOT NULL,  -- точка из каталога (казанская сторона поездки)
+    created        INTEGER  NOT NULL DEFAULT 0,
+    pending        INTEGER  NOT NULL DEFAULT 0,
+    confirmed      INTEGER  NOT NULL DEFAULT 0,
+    completed      INTEGER  NOT NULL DEFAULT 0,
+    cancelled      INTEGER  NOT NULL DEFAULT 0,
+    cancelled_late INTEGER  NOT NULL DEFAULT 0,
+    expired        INTEGER  NOT NULL DEFAULT 0,
+    revenue        BIGINT   NOT NULL DEFAULT 0,  -- price подтверждённых и завершённых
+    PRIMARY KEY (day, from_city, to_city, point, hour)
+);
+
+-- Вклад одной брони в агрегаты со знаком sign (+1 / -1)
+CREATE OR REPLACE FUNCTION booking_stats_apply(b bookings, sign INTEGER) RETURNS void AS $$
+DECLARE
+    moment TIMESTAMP := COALESCE(b.scheduled_time, b.created_at::timestamp);
+BEGIN
+    INSERT INTO booking_stats AS s (
+        day, hour, from_city, to_city, point,
+        created, pending, confirmed, completed, cancelled, cancelled_late, expired, revenue
+    ) VALUES (
+        moment::date,
+        extract(hour FROM moment)::smallint,
+        b.from_city,
+        b.to_city,
+        COALESCE(CASE WHEN b.from_city = 'Казань' THEN b.pickup_point ELSE b.destination_point END, ''),
+        sign,
+        sign * (b.status = 'pending')::int,
+        sign * (b.status = 'confirmed')::int,
+        sign * (b.status = 'completed')::int,
+        sign * (b.status = 'cancelled')::int,
+        sign * (b.status = 'cancelled' AND b.cancelled_late)::int,
+        sign * (b.status = 'expired')::int,
+        sign * CASE WHEN b.status IN ('confirmed', 'completed') THEN COALESCE(b.price, 0) ELSE 0 END
+    )
+    ON CONFLICT (day, from_city, to_city, point, hour) DO UPDATE SET
+        created        = s.created        + EXCLUDED.created,
+        pending        = s.pending        + EXCLUDED.pending,
+        confirmed      = s.confirmed      + EXCLUDED.confirmed,
+        completed      = s.completed      + EXCLUDED.completed,
+        cancelled      = s.cancelled      + EXCLUDED.cancelled,
+        cancelled_late = s.cancelled_late + EXCLUDED.cancelled_late,
+        expired        = s.expired        + EXCLUDED.expired,
+        revenue        = s.revenue        + EXCLUDED.revenue;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bookings_mark_late_cancel() RETURNS trigger AS $$
+BEGIN
+    -- scheduled_time хранится без зоны, поэтому сравниваем с localtimestamp.
+    -- 12 часов — копия booking_state.REFUND_WINDOW: меняя одно, меняйте и другое
+    -- (новой миграцией с CREATE OR REPLACE этой функции).
+    IF NEW.status = 'cancelled' AND OLD.status IS DISTINCT FROM 'cancelled' THEN
+        NEW.cancelled_late := NEW.scheduled_time IS NOT NULL
+            AND NEW.scheduled_time - localtimestamp < interval '12 hours';
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bookings_update_stats() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM booking_stats_apply(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM booking_stats_apply(NEW, 1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- Заполнение по текущим броням; блокировка — чтобы не потерять параллельные записи
+LOCK TABLE bookings IN SHARE ROW EXCLUSIVE MODE;
+
+TRUNCATE booking_stats;
+INSERT INTO booking_stats (
+    day, hour, from_city, to_city, point,
+    created, pending, confirmed, completed, cancelled, cancelled_late, expired, revenue
+)
+SELECT
+    COALESCE(scheduled_time, created_at::timestamp)::date,
+    extract(hour FROM COALESCE(scheduled_time, created_at::timestamp))::smallint,
+    from_city,
+    to_city,
+    COALESCE(CASE WHEN from_city = 'Казань' THEN pickup_point ELSE destination_point END, ''),
+    count(*),
+    count(*) FILTER (WHERE status = 'pending'),
+    count(*) FILTER (WHERE status = 'confirmed'),
+    count(*) FILTER (WHERE status = 'completed'),
+    count(*) FILTER (WHERE status = 'cancelled'),
+    count(*) FILTER (WHERE status = 'cancelled' AND cancelled_late),
+    count(*) FILTER (WHERE status = 'expired'),
+    COALESCE(sum(price) FILTER (WHERE status IN ('confirmed', 'completed')), 0)
+FROM bookings
+GROUP BY 1, 2, 3, 4, 5;
+
+DROP TRIGGER IF EXISTS bookings_late_cancel ON bookings;
+CREATE TRIGGER bookings_late_cancel
+    BEFORE UPDATE OF status ON bookings
+    FOR EACH ROW EXECUTE FUNCTION bookings_mark_late_cancel();
+
+DROP TRIGGER IF EXISTS bookings_stats ON bookings;
+CREATE TRIGGER bookings_stats
+    AFTER INSERT OR DELETE OR UPDATE OF status, scheduled_time, price, from_city, to_city, pickup_point, destination_point
+    ON bookings
+    FOR EACH ROW EXECUTE FUNCTION bookings_update_stats();
@@ -0,0 +1,6 @@
+-- Клиенты из импорта (поездки, записанные по телефону) могут не иметь Telegram.
+-- UNIQUE допускает несколько NULL, уведомления и напоминания таких клиентов пропускают.
+
+ALTER TABLE users ALTER COLUMN telegram_id DROP NOT NULL;
+
+CREATE INDEX IF NOT EXISTS users_phone_idx ON users (phone);
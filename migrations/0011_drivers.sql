@@ -0,0 +1,100 @@
+-- Водители (users.role = 'driver') и их слоты доступности по направлению.
+-- Подтверждённые брони назначаются на слот диспетчером (dispatch.py); места
+-- в слоте списываются при назначении и возвращаются триггером при отмене.
+
+CREATE TABLE IF NOT EXISTS driver_slots (
+    id         SERIAL PRIMARY KEY,
+    driver_id  INTEGER NOT NULL REFERENCES users (id),
+    from_city  TEXT NOT NULL,
+    to_city    TEXT NOT NULL,
+    starts_at  TIMESTAMP NOT NULL,
+    ends_at    TIMESTAMP NOT NULL,
+    seats      SMALLINT NOT NULL,
+    seats_left SMALLINT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    CHECK (starts_at < ends_at),
+    CHECK (seats_left BETWEEN 0 AND seats)
+);
+
+-- Загрузка открытых слотов при старте и «мои слоты» водителя
+CREATE INDEX IF NOT EXISTS driver_slots_ends_idx ON driver_slots (ends_at);
+CREATE INDEX IF NOT EXISTS driver_slots_driver_idx ON driver_slots (driver_id, starts_at);
+
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS slot_id INTEGER REFERENCES driver_slots (id) ON DELETE SET NULL;
+-- Сколько мест бронь заняла в слоте (вся машина — все места)
+ALTER TABLE bookings ADD COLUMN IF NOT EXISTS slot_seats SMALLINT;
+
+-- Подтверждённые, но ещё не назначенные — для периодического добора
+CREATE INDEX IF NOT EXISTS bookings_unassigned_idx
+    ON bookings (scheduled_time)
+    WHERE status = 'confirmed' AND slot_id IS NULL;
+
+-- Отмена назначенной брони возвращает места в слот
+CREATE OR REPLACE FUNCTION bookings_release_slot() RETURNS trigger AS $$
+BEGIN
+    UPDATE driver_slots SET seats_left = seats_left + OLD.slot_seats WHERE id = OLD.slot_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bookings_release_slot ON bookings;
+CREATE TRIGGER bookings_release_slot
+    AFTER UPDATE OF status ON bookings
+    FOR EACH ROW
+    WHEN (OLD.slot_id IS NOT NULL AND NEW.status = 'cancelled' AND OLD.status <> 'cancelled')
+    EXECUTE FUNCTION bookings_release_slot();
+
+-- Любое изменение слота доходит до индекса доступности во всех воркерах
+CREATE OR REPLACE FUNCTION notify_slot_change() RETURNS trigger AS $$
+DECLARE
+    slot driver_slots := COALESCE(NEW, OLD);
+BEGIN
+    PERFORM pg_notify('booking_events', json_build_object(
+        'op', 'SLOT',
+        'id', slot.id,
+        'deleted', TG_OP = 'DELETE',
+        'driver_id', slot.driver_id,
+        'from_city', slot.from_city,
+        'to_city', slot.to_city,
+        'starts_at', slot.starts_at,
+        'ends_at', slot.ends_at,
+        'seats', slot.seats,
+        'seats_left', slot.seats_left
+    )::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS driver_slots_notify ON driver_slots;
+CREATE TRIGGER driver_slots_notify
+    AFTER INSERT OR UPDATE OR DELETE ON driver_slots
+    FOR EACH ROW EXECUTE FUNCTION notify_slot_change();
+
+-- Направление и тип поездки в событии брони — диспетчеру не нужен лишний запрос
+-- (адреса из события убраны в 0013)
+CREATE OR REPLACE FUNCTION notify_booking_change() RETURNS trigger AS $$
+DECLARE
+    client_telegram_id BIGINT;
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.status IS NOT DISTINCT FROM OLD.status THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT telegram_id INTO client_telegram_id FROM users WHERE id = NEW.client_id;
+
+    PERFORM pg_notify('booking_events', json_build_object(
+        'op', TG_OP,
+        'id', NEW.id,
+        'status', NEW.status,
+        'actor', NEW.status_changed_by,
+        'telegram_id', client_telegram_id,
+        'scheduled_time', NEW.scheduled_time,
+        'from', NEW.pickup_point,
+        'to', NEW.destination_point,
+        'from_city', NEW.from_city,
+        'to_city', NEW.to_city,
+        'ride_type', NEW.ride_type
+    )::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,15 @@
+-- Вместимость по направлению и часу отправления (capacity.py): сколько мест
+-- в машинах, которые ходят в этот час. Нет строки — CAPACITY_SEATS из окружения.
+
+CREATE TABLE IF NOT EXISTS ride_capacity (
+    from_city TEXT     NOT NULL,
+    to_city   TEXT     NOT NULL,
+    hour      SMALLINT NOT NULL CHECK (hour BETWEEN 0 AND 23),
+    seats     INTEGER  NOT NULL CHECK (seats >= 0),
+    PRIMARY KEY (from_city, to_city, hour)
+);
+
+-- Занятые места в часе: проверка при создании брони и карта дня на шаге времени
+CREATE INDEX IF NOT EXISTS bookings_capacity_idx
+    ON bookings (from_city, to_city, scheduled_time)
+    WHERE status IN ('pending', 'confirmed');
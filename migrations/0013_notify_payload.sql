@@ -0,0 +1,30 @@
+-- Событие брони без свободного текста. pg_notify отказывает на payload от
+-- 8000 байт, и ошибка в триггере откатывала бы сам INSERT/UPDATE брони:
+-- адрес в ~4000 кириллических символов ронял бронирование. Адреса
+-- BookingNotifier дочитывает по id одним запросом на пачку событий.
+-- Заменяет версии функции из 0006 и 0011.
+
+CREATE OR REPLACE FUNCTION notify_booking_change() RETURNS trigger AS $$
+DECLARE
+    client_telegram_id BIGINT;
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.status IS NOT DISTINCT FROM OLD.status THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT telegram_id INTO client_telegram_id FROM users WHERE id = NEW.client_id;
+
+    PERFORM pg_notify('booking_events', json_build_object(
+        'op', TG_OP,
+        'id', NEW.id,
+        'status', NEW.status,
+        'actor', NEW.status_changed_by,
+        'telegram_id', client_telegram_id,
+        'scheduled_time', NEW.scheduled_time,
+        'from_city', NEW.from_city,
+        'to_city', NEW.to_city,
+        'ride_type', NEW.ride_type
+    )::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,97 @@
+-- Агрегаты booking_stats одним upsert на оператор вместо строчного триггера.
+-- Строчный триггер из 0009 брал блокировки строк booking_stats в порядке
+-- обновления броней, и два параллельных массовых UPDATE (set_status_many,
+-- set_status_for_date) могли захватить одни и те же ключи в разном порядке
+-- и упереться в deadlock. Теперь дельты оператора суммируются по ключу
+-- через transition tables и пишутся в порядке первичного ключа, а обнулившиеся
+-- (например UPDATE reminder_sent_at) не пишутся вовсе.
+-- Заменяет триггер bookings_stats из 0009.
+
+-- Вклад одной брони в агрегаты со знаком sign (+1 / -1) строкой booking_stats
+CREATE OR REPLACE FUNCTION booking_stats_row(b bookings, sign INTEGER) RETURNS booking_stats AS $$
+    SELECT
+        moment::date,
+        extract(hour FROM moment)::smallint,
+        b.from_city,
+        b.to_city,
+        COALESCE(CASE WHEN b.from_city = 'Казань' THEN b.pickup_point ELSE b.destination_point END, ''),
+        sign,
+        sign * (b.status = 'pending')::int,
+        sign * (b.status = 'confirmed')::int,
+        sign * (b.status = 'completed')::int,
+        sign * (b.status = 'cancelled')::int,
+        sign * (b.status = 'cancelled' AND b.cancelled_late)::int,
+        sign * (b.status = 'expired')::int,
+        (sign * CASE WHEN b.status IN ('confirmed', 'completed') THEN COALESCE(b.price, 0) ELSE 0 END)::bigint
+    FROM (SELECT COALESCE(b.scheduled_time, b.created_at::timestamp) AS moment) m
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Суммирует дельты по ключу и применяет их в порядке первичного ключа
+CREATE OR REPLACE FUNCTION booking_stats_merge(deltas booking_stats[]) RETURNS void AS $$
+    INSERT INTO booking_stats AS s (
+        day, hour, from_city, to_city, point,
+        created, pending, confirmed, completed, cancelled, cancelled_late, expired, revenue
+    )
+    SELECT day, hour, from_city, to_city, point,
+           sum(created), sum(pending), sum(confirmed), sum(completed), sum(cancelled),
+           sum(cancelled_late), sum(expired), sum(revenue)
+    FROM unnest(deltas)
+    GROUP BY day, from_city, to_city, point, hour
+    HAVING sum(abs(created)) + sum(abs(pending)) + sum(abs(confirmed)) + sum(abs(completed))
+         + sum(abs(cancelled)) + sum(abs(cancelled_late)) + sum(abs(expired)) + sum(abs(revenue)) > 0
+    ORDER BY day, from_city, to_city, point, hour
+    ON CONFLICT (day, from_city, to_city, point, hour) DO UPDATE SET
+        created        = s.created        + EXCLUDED.created,
+        pending        = s.pending        + EXCLUDED.pending,
+        confirmed      = s.confirmed      + EXCLUDED.confirmed,
+        completed      = s.completed      + EXCLUDED.completed,
+        cancelled      = s.cancelled      + EXCLUDED.cancelled,
+        cancelled_late = s.cancelled_late + EXCLUDED.cancelled_late,
+        expired        = s.expired        + EXCLUDED.expired,
+        revenue        = s.revenue        + EXCLUDED.revenue;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION bookings_update_stats_batch() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM booking_stats_merge(ARRAY(
+            SELECT booking_stats_row(n::bookings, 1) FROM new_rows n
+        ));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM booking_stats_merge(ARRAY(
+            SELECT booking_stats_row(o::bookings, -1) FROM old_rows o
+        ));
+    ELSE
+        PERFORM booking_stats_merge(ARRAY(
+            SELECT booking_stats_row(o::bookings, -1) FROM old_rows o
+            UNION ALL
+            SELECT booking_stats_row(n::bookings, 1) FROM new_rows n
+        ));
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bookings_stats ON bookings;
+DROP FUNCTION IF EXISTS bookings_update_stats();
+DROP FUNCTION IF EXISTS booking_stats_apply(bookings, INTEGER);
+
+DROP TRIGGER IF EXISTS bookings_stats_insert ON bookings;
+CREATE TRIGGER bookings_stats_insert
+    AFTER INSERT ON bookings
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bookings_update_stats_batch();
+
+-- Transition tables не совместимы со списком колонок (UPDATE OF ...):
+-- триггер срабатывает на любой UPDATE, нулевые дельты отсекает HAVING
+DROP TRIGGER IF EXISTS bookings_stats_update ON bookings;
+CREATE TRIGGER bookings_stats_update
+    AFTER UPDATE ON bookings
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bookings_update_stats_batch();
+
+DROP TRIGGER IF EXISTS bookings_stats_delete ON bookings;
+CREATE TRIGGER bookings_stats_delete
+    AFTER DELETE ON bookings
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bookings_update_stats_batch();
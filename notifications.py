@@ -0,0 +1,161 @@
+import json
+import asyncio
+import logging
+from datetime import datetime
+
+import psycopg
+from telegram.error import TelegramError
+
+from send_queue import PRIORITY_HIGH, PRIORITY_NORMAL
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "booking_events"
+
+CLIENT_STATUS_TEXT = {
+    "confirmed": "✅ Бронь #{id} подтверждена",
+    "cancelled": "🚫 Бронь #{id} отменена",
+    "completed": "🏁 Поездка #{id} завершена. Спасибо, что выбрали нас!",
+    "expired": "⌛ Бронь #{id} не успели подтвердить до поездки, она закрыта",
+}
+
+
+def _describe(event, points=None):
+    time_str = "время не указано"
+    if event.get("scheduled_time"):
+        time_str = datetime.fromisoformat(event["scheduled_time"]).strftime("%d.%m %H:%M")
+    if points:
+        return f"{points[0]} → {points[1]}, {time_str}"
+    if event.get("from_city"):
+        return f"{event['from_city']} → {event['to_city']}, {time_str}"
+    return time_str
+
+
+class BookingNotifier:
+    """Фоновая задача: слушает booking_events и рассылает уведомления.
+
+    События пишет триггер bookings_notify (миграция 0006) при создании
+    брони и смене статуса любым путём. За окно coalesce_seconds события
+    склеиваются: по каждой брони остаётся последнее, клиент получает
+    одно сообщение, админ-чат — одну сводку.
+
+    invalidate(telegram_id) вызывается сразу на каждое событие — так
+    кэш «Мои брони» сбрасывается при любой смене статуса, в том числе
+    из админки, фоновых задач и других процессов. События USER (смена
+    роли или профиля, миграция 0008) только сбрасывают кэш.
+
+    on_event(event) тоже получает каждое событие сразу — через него
+    диспетчер водителей (dispatch.py) видит подтверждения и события
+    SLOT (слоты водителей, миграция 0011), которые не уведомляют никого.
+
+    Адресов в событии нет (лимит размера NOTIFY, миграция 0013):
+    addresses(ids) дочитывает их одним запросом на склеенную пачку.
+
+    owns(chat_id) — в режиме нескольких воркеров уведомляет только
+    владелец партиции чата, чтобы сообщения не дублировались.
+    """
+
+    def __init__(self, bot, conninfo, admin_chat_id=None, coalesce_seconds=2.0, invalidate=None,
+                 on_event=None, addresses=None):
+        self.bot = bot
+        self.addresses = addresses
+        self.invalidate = invalidate
+        self.on_event = on_event
+        self.owns = lambda chat_id: True
+        self.conninfo = conninfo
+        self.admin_chat_id = admin_chat_id
+        self.coalesce_seconds = coalesce_seconds
+        self._pending = {}
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._flush_loop())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def add_event(self, event):
+        if self.invalidate and event.get("telegram_id"):
+            self.invalidate(event["telegram_id"])
+        if self.on_event:
+            self.on_event(event)
+        # Импорт истории (exports.py) — не новости ни для клиентов, ни для админов
+        if event["op"] in ("USER", "SLOT") or event.get("actor") == "import":
+            return
+        previous = self._pending.get(event["id"])
+        # Новая бронь, которую тут же подтвердили, — всё ещё новая для админа
+        if previous and previous["op"] == "INSERT":
+            event = {**event, "op": "INSERT"}
+        self._pending[event["id"]] = event
+
+    async def _listen(self):
+        delay = 1
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.conninfo, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    logger.info("Подписка на %s активна", CHANNEL)
+                    delay = 1
+                    async for notify in conn.notifies():
+                        self.add_event(json.loads(notify.payload))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("LISTEN %s оборвался, переподключение через %s c", CHANNEL, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.coalesce_seconds)
+            if self._pending:
+                events, self._pending = list(self._pending.values()), {}
+                try:
+                    await self.flush(events)
+                except Exception:
+                    logger.exception("Ошибка рассылки уведомлений")
+
+    async def _load_addresses(self, events):
+        if not self.addresses or not events:
+            return {}
+        try:
+            return await self.addresses([event["id"] for event in events])
+        except Exception:
+            # Без адресов уведомление всё равно уходит — с направлением и временем
+            logger.warning("Не удалось дочитать адреса броней", exc_info=True)
+            return {}
+
+    async def flush(self, events):
+        points = await self._load_addresses(events)
+        # Клиенту — о том, что сделал не он сам
+        per_client = {}
+        for event in events:
+            text = CLIENT_STATUS_TEXT.get(event["status"])
+            if text and event.get("actor") != "client" and event.get("telegram_id") and self.owns(event["telegram_id"]):
+                per_client.setdefault(event["telegram_id"], []).append(
+                    f"{text.format(id=event['id'])}\n{_describe(event, points.get(event['id']))}"
+                )
+        # Параллельно: темп всё равно задаёт очередь отправки
+        await asyncio.gather(*(
+            self._notify_client(telegram_id, "\n\n".join(lines)) for telegram_id, lines in per_client.items()
+        ))
+
+        if not self.admin_chat_id or not self.owns(int(self.admin_chat_id)):
+            return
+        created = [e for e in events if e["op"] == "INSERT"]
+        cancelled = [e for e in events if e["op"] == "UPDATE" and e["status"] == "cancelled" and e.get("actor") == "client"]
+        lines = [f"🆕 #{e['id']}: {_describe(e, points.get(e['id']))}" for e in created]
+        lines += [f"🚫 Клиент отменил #{e['id']}: {_describe(e, points.get(e['id']))}" for e in cancelled]
+        if lines:
+            await self.bot.send_message(self.admin_chat_id, "\n".join(lines), rate_limit_args=PRIORITY_NORMAL)
+
+    async def _notify_client(self, telegram_id, text):
+        try:
+            await self.bot.send_message(telegram_id, text, rate_limit_args=PRIORITY_HIGH)
+        except TelegramError:
+            # Например, клиент заблокировал бота — остальным всё равно отправляем
+            logger.warning("Не удалось уведомить %s", telegram_id, exc_info=True)
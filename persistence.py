@@ -0,0 +1,189 @@
+import json
+import datetime
+import logging
+
+from telegram.ext import BasePersistence, ConversationHandler, PersistenceInput
+
+from migrate import check_schema
+
+
+logger = logging.getLogger(__name__)
+
+
+# user_data бронирования хранит date, поэтому JSON с тегами для дат
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(f"Не сериализуется: {type(value).__name__}")
+
+
+def _decode(obj):
+    if "__datetime__" in obj:
+        return datetime.datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return datetime.date.fromisoformat(obj["__date__"])
+    return obj
+
+
+def dumps(data):
+    return json.dumps(data, default=_encode, ensure_ascii=False)
+
+
+def loads(text):
+    return json.loads(text, object_hook=_decode)
+
+
+class PostgresPersistence(BasePersistence):
+    """Состояние диалогов и user_data в Postgres.
+
+    Пишет только изменившиеся ключи (PTB вызывает update_* для тех,
+    кто менялся), так что запись обходится в один upsert на
+    пользователя. Диалоги бронирования сбрасываются сразу после
+    перехода (см. FlushingConversationHandler), остальное — раз в
+    update_interval секунд. Записи старше ttl не загружаются и
+    удаляются evict_stale().
+    """
+
+    def __init__(self, db, ttl=86400, update_interval=5):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.db = db
+        self.ttl = ttl
+        self._ready = False
+
+    async def _ensure_ready(self):
+        # PTB читает persistence раньше post_init, поэтому пул открываем здесь
+        if not self._ready:
+            await self.db.open()
+            await check_schema(self.db)
+            self._ready = True
+
+    async def get_user_data(self):
+        await self._ensure_ready()
+        rows = await self.db.fetchall(
+            "SELECT user_id, data::text FROM user_data WHERE updated_at > now() - make_interval(secs => %s)",
+            (self.ttl,)
+        )
+        return {user_id: loads(data) for user_id, data in rows}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        await self._ensure_ready()
+        rows = await self.db.fetchall(
+            "SELECT key, state FROM conversation_state "
+            "WHERE name = %s AND updated_at > now() - make_interval(secs => %s)",
+            (name, self.ttl)
+        )
+        return {tuple(json.loads(key)): state for key, state in rows}
+
+    async def get_partition_conversations(self, name, partitions, count):
+        """Диалоги пользователей из партиций (user_id — последний элемент ключа)."""
+        rows = await self.db.fetchall(
+            "SELECT key, state FROM conversation_state "
+            "WHERE name = %s AND updated_at > now() - make_interval(secs => %s) "
+            "AND mod((key::jsonb ->> -1)::bigint, %s) = ANY(%s)",
+            (name, self.ttl, count, list(partitions))
+        )
+        return {tuple(json.loads(key)): state for key, state in rows}
+
+    async def get_partition_user_data(self, partitions, count):
+        rows = await self.db.fetchall(
+            "SELECT user_id, data::text FROM user_data "
+            "WHERE updated_at > now() - make_interval(secs => %s) AND mod(user_id, %s) = ANY(%s)",
+            (self.ttl, count, list(partitions))
+        )
+        return {user_id: loads(data) for user_id, data in rows}
+
+    async def update_conversation(self, name, key, new_state):
+        key_text = json.dumps(list(key))
+        if new_state is None:
+            await self.db.execute(
+                "DELETE FROM conversation_state WHERE name = %s AND key = %s", (name, key_text)
+            )
+            return
+        await self.db.execute("""
+            INSERT INTO conversation_state (name, key, state, updated_at)
+            VALUES (%s, %s, %s, now())
+            ON CONFLICT (name, key) DO UPDATE SET state = EXCLUDED.state, updated_at = now()
+        """, (name, key_text, new_state))
+
+    async def update_user_data(self, user_id, data):
+        if not data:
+            await self.drop_user_data(user_id)
+            return
+        await self.db.execute("""
+            INSERT INTO user_data (user_id, data, updated_at)
+            VALUES (%s, %s::jsonb, now())
+            ON CONFLICT (user_id) DO UPDATE SET data = EXCLUDED.data, updated_at = now()
+        """, (user_id, dumps(data)))
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def drop_user_data(self, user_id):
+        await self.db.execute("DELETE FROM user_data WHERE user_id = %s", (user_id,))
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def evict_stale(self):
+        """Удаляет брошенные диалоги; возвращает user_id, чьи данные удалены."""
+        async with self.db.transaction() as tx:
+            await tx.execute(
+                "DELETE FROM conversation_state WHERE updated_at < now() - make_interval(secs => %s)",
+                (self.ttl,)
+            )
+            rows = await tx.fetchall(
+                "DELETE FROM user_data WHERE updated_at < now() - make_interval(secs => %s) RETURNING user_id",
+                (self.ttl,)
+            )
+        return [row[0] for row in rows]
+
+
+class FlushingConversationHandler(ConversationHandler):
+    """ConversationHandler, который сохраняет состояние на каждом переходе.
+
+    Штатно PTB пишет persistence раз в update_interval, и рестарт
+    теряет последние шаги диалога. Здесь после обработки апдейта
+    пользователь помечается к записи и вызывается update_persistence():
+    пишутся только его user_data и новое состояние диалога.
+    """
+
+    async def handle_update(self, update, application, check_result, context):
+        try:
+            return await super().handle_update(update, application, check_result, context)
+        finally:
+            if self.persistent and application.persistence:
+                if update.effective_user:
+                    application.mark_data_for_update_persistence(user_ids=update.effective_user.id)
+                await application.update_persistence()
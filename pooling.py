@@ -0,0 +1,79 @@
+import os
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+
+VEHICLE_SEATS = int(os.getenv("VEHICLE_SEATS", "4"))
+POOL_WINDOW = timedelta(minutes=int(os.getenv("POOL_WINDOW_MINUTES", "60")))
+
+
+@dataclass
+class Trip:
+    """Предлагаемая машина: одно направление, отправление в окне [start, start + window]."""
+    from_city: str
+    to_city: str
+    start: datetime
+    seats: int
+    bookings: list = field(default_factory=list)
+    taken: int = 0
+
+    @property
+    def free_seats(self):
+        return self.seats - self.taken
+
+
+class TripPlanner:
+    """Раскладывает брони «место в машине» по машинам.
+
+    Для каждого направления хранит поездки, отсортированные по времени
+    начала окна (интервальный индекс на bisect): новая бронь проверяет
+    только поездки, чьё окно может её накрыть, поэтому распределение
+    тысяч броней за день остаётся O(n log n).
+    """
+
+    def __init__(self, seats=VEHICLE_SEATS, window=POOL_WINDOW):
+        self.seats = seats
+        self.window = window
+        self._trips = {}
+        self._starts = {}
+
+    def assign(self, booking, need=1):
+        """need — сколько мест занимает бронь; «вся машина» (need = seats) едет отдельно."""
+        direction = (booking.from_city, booking.to_city)
+        trips = self._trips.setdefault(direction, [])
+        starts = self._starts.setdefault(direction, [])
+        moment = booking.scheduled_time
+
+        # Кандидаты — поездки с началом в [moment - window, moment], как в окне Trip
+        lo = bisect_left(starts, moment - self.window)
+        hi = bisect_right(starts, moment)
+        for trip in trips[lo:hi]:
+            if trip.free_seats >= need:
+                trip.bookings.append(booking)
+                trip.taken += need
+                return trip
+
+        trip = Trip(booking.from_city, booking.to_city, moment, max(self.seats, need), [booking], need)
+        trips.insert(hi, trip)
+        starts.insert(hi, moment)
+        return trip
+
+    def trips(self):
+        return sorted(
+            (trip for trips in self._trips.values() for trip in trips),
+            key=lambda trip: (trip.start, trip.from_city)
+        )
+
+
+def propose_trips(bookings, seats=VEHICLE_SEATS, window=POOL_WINDOW, seats_of=None):
+    """Группировка броней по машинам; брони обрабатываются по времени.
+
+    seats_of(booking) — сколько мест занимает бронь (по умолчанию одно),
+    например lambda b: repository.booking_seats(b.ride_type).
+    """
+    planner = TripPlanner(seats, window)
+    timed = [booking for booking in bookings if booking.scheduled_time is not None]
+    for booking in sorted(timed, key=lambda b: b.scheduled_time):
+        planner.assign(booking, seats_of(booking) if seats_of else 1)
+    return planner.trips()
@@ -0,0 +1,133 @@
+"""Отчёты для админов по агрегатам booking_stats (миграция 0009).
+
+Агрегаты обновляются триггером при каждой записи в bookings (одним
+upsert на оператор, миграция 0014), поэтому отчёт за день или неделю —
+это выборка нескольких сотен строк по первичному ключу (day, ...), без
+сканирования броней.
+"""
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from admin_role_handler import is_admin, parse_day
+from send_queue import PRIORITY_BULK
+
+
+REPORT_TOP_POINTS = 10
+
+
+@dataclass
+class Report:
+    since: date
+    until: date
+    created: int = 0
+    confirmed: int = 0
+    completed: int = 0
+    cancelled: int = 0
+    cancelled_late: int = 0
+    expired: int = 0
+    revenue: int = 0
+    # точка -> [брони, выручка]
+    points: dict = field(default_factory=dict)
+    # (откуда, куда) -> {час: брони}
+    hours: dict = field(default_factory=dict)
+
+
+async def load_report(db, since, until):
+    """Отчёт по дням поездок с since по until включительно."""
+    rows = await db.fetchall("""
+        SELECT from_city, to_city, point, hour,
+               sum(created), sum(confirmed), sum(completed), sum(cancelled),
+               sum(cancelled_late), sum(expired), sum(revenue)::bigint
+        FROM booking_stats
+        WHERE day BETWEEN %s AND %s
+        GROUP BY from_city, to_city, point, hour
+    """, (since, until))
+
+    report = Report(since, until)
+    for from_city, to_city, point, hour, created, confirmed, completed, cancelled, late, expired, revenue in rows:
+        report.created += created
+        report.confirmed += confirmed
+        report.completed += completed
+        report.cancelled += cancelled
+        report.cancelled_late += late
+        report.expired += expired
+        report.revenue += revenue
+        totals = report.points.setdefault(point or "—", [0, 0])
+        totals[0] += created
+        totals[1] += revenue
+        if created:
+            by_hour = report.hours.setdefault((from_city, to_city), {})
+            by_hour[hour] = by_hour.get(hour, 0) + created
+    return report
+
+
+def parse_period(args, today=None):
+    """/report — сегодня, /report неделя — 7 дней по сегодня, /report 24.05 — один день."""
+    today = today or date.today()
+    if not args:
+        return today, today
+    arg = args[0].lower()
+    if arg in ("неделя", "week"):
+        return today - timedelta(days=6), today
+    if arg in ("месяц", "month"):
+        return today - timedelta(days=29), today
+    day = parse_day(arg)
+    return day, day
+
+
+def _percent(part, total):
+    return f"{part / total:.0%}" if total else "—"
+
+
+def render_report(report):
+    period = report.since.strftime("%d.%m.%Y")
+    if report.until != report.since:
+        period = f"{period} – {report.until.strftime('%d.%m.%Y')}"
+
+    if not report.created:
+        return f"📊 Отчёт за {period}\n\n📭 Броней нет."
+
+    lines = [
+        f"📊 Отчёт за {period}",
+        "",
+        f"Броней: {report.created}",
+        f"✅ Подтверждено: {report.confirmed}, 🏁 завершено: {report.completed}",
+        f"💰 Выручка: {report.revenue} р",
+        f"🚫 Отменено: {report.cancelled} ({_percent(report.cancelled, report.created)}), "
+        f"из них поздно (<12 ч): {report.cancelled_late} ({_percent(report.cancelled_late, report.cancelled)})",
+        f"⌛ Истекло без подтверждения: {report.expired}",
+        "",
+        "📍 Точки в Казани:",
+    ]
+    points = sorted(report.points.items(), key=lambda item: (-item[1][0], item[0]))
+    for point, (count, revenue) in points[:REPORT_TOP_POINTS]:
+        lines.append(f"  {point}: {count} · {revenue} р")
+    if len(points) > REPORT_TOP_POINTS:
+        lines.append(f"  …и ещё {len(points) - REPORT_TOP_POINTS}")
+
+    for (from_city, to_city), by_hour in sorted(report.hours.items()):
+        lines.append("")
+        lines.append(f"🕒 {from_city} → {to_city}, брони по часам:")
+        peak = max(by_hour.values())
+        for hour in sorted(by_hour):
+            bar = "▇" * max(1, round(by_hour[hour] / peak * 10))
+            lines.append(f"  {hour:02d}:00 {bar} {by_hour[hour]}")
+    return "\n".join(lines)
+
+
+async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await is_admin(context, update.effective_user.id):
+        await update.message.reply_text("🚫 У вас нет прав администратора.")
+        return
+
+    try:
+        since, until = parse_period(context.args)
+    except ValueError:
+        await update.message.reply_text("❌ Формат: /report, /report неделя, /report месяц или /report 24.05")
+        return
+
+    report = await load_report(context.bot_data["db"], since, until)
+    await context.bot.send_message(update.effective_chat.id, render_report(report), rate_limit_args=PRIORITY_BULK)
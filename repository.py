@@ -0,0 +1,556 @@
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from cache import TTLCache
+from pooling import VEHICLE_SEATS
+
+
+@dataclass(frozen=True)
+class User:
+    id: int
+    telegram_id: int
+    full_name: str
+    phone: str
+    role: Optional[str]
+
+
+@dataclass(frozen=True)
+class Booking:
+    id: int
+    client_id: int
+    from_city: str
+    to_city: str
+    pickup_point: str
+    destination_point: str
+    scheduled_time: Optional[datetime]
+    price: int
+    ride_type: str
+    status: str
+
+
+@dataclass(frozen=True)
+class BookingWithClient:
+    """Строка админских списков: бронь вместе с данными клиента."""
+    id: int
+    full_name: str
+    phone: str
+    telegram_id: Optional[int]
+    scheduled_time: Optional[datetime]
+    status: str
+
+
+@dataclass(frozen=True)
+class StatusChange:
+    """Итог массовой смены статуса по одной брони."""
+    id: int
+    previous_status: Optional[str]  # None — брони с таким id нет
+    changed: bool
+
+
+@dataclass(frozen=True)
+class DriverSlot:
+    """Окно, в которое водитель готов ехать по направлению, и свободные места в нём."""
+    id: int
+    driver_id: int
+    from_city: str
+    to_city: str
+    starts_at: datetime
+    ends_at: datetime
+    seats: int
+    seats_left: int
+
+
+@dataclass(frozen=True)
+class Assignment:
+    """Итог назначения брони на слот: кому из водителя и клиента что сообщить."""
+    booking_id: int
+    slot_id: int
+    seats_left: int
+    driver_telegram_id: Optional[int]
+    driver_name: str
+    driver_phone: str
+    client_telegram_id: Optional[int]
+    client_name: str
+    client_phone: str
+    scheduled_time: Optional[datetime]
+    pickup_point: str
+    destination_point: str
+
+
+USER_COLUMNS = "id, telegram_id, full_name, phone, role"
+BOOKING_COLUMNS = (
+    "id, client_id, from_city, to_city, pickup_point, destination_point, "
+    "scheduled_time, price, ride_type, status"
+)
+
+SLOT_COLUMNS = "id, driver_id, from_city, to_city, starts_at, ends_at, seats, seats_left"
+
+# Значения ride_type, которые пишет booking.choose_type
+RIDE_SEAT = "🚗 Место в машине"
+RIDE_WHOLE_CAR = "🚘 Вся машина"
+
+# Первый ключ pg_advisory_xact_lock для часа направления (create_within_capacity)
+CAPACITY_LOCK_CLASS = 2501
+
+# Места, которые занимает бронь: «вся машина» — все места машины
+SEATS_SQL = "CASE WHEN ride_type = %s THEN %s ELSE 1 END"
+
+INSERT_BOOKING_SQL = """
+    INSERT INTO bookings (
+        client_id,
+        from_city,
+        to_city,
+        pickup_point,
+        destination_point,
+        scheduled_time,
+        price,
+        ride_type,
+        status,
+        status_changed_by
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'pending', 'client')
+    RETURNING id
+"""
+
+
+def booking_seats(ride_type: str) -> int:
+    return VEHICLE_SEATS if ride_type == RIDE_WHOLE_CAR else 1
+
+
+def hour_of(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+# Совпадает с выражением индексов из 0002_admin_keyset_indexes.sql
+ADMIN_SORT_KEY = "COALESCE(b.scheduled_time, '-infinity'::timestamp)"
+
+
+class UserRepository:
+    """Пользователи с кэшем telegram_id → User.
+
+    Кэш заполняется при регистрации и чтении и сбрасывается явно
+    при изменении роли или профиля.
+    """
+
+    def __init__(self, db, cache=None):
+        self.db = db
+        self.cache = cache if cache is not None else TTLCache(
+            maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("USER_CACHE_TTL", "300")),
+        )
+
+    async def get_by_telegram_id(self, telegram_id: int) -> Optional[User]:
+        user = self.cache.get(telegram_id)
+        if user is not None:
+            return user
+
+        row = await self.db.fetchone(
+            f"SELECT {USER_COLUMNS} FROM users WHERE telegram_id = %s", (telegram_id,)
+        )
+        if not row:
+            return None
+        user = User(*row)
+        self.cache.set(telegram_id, user)
+        return user
+
+    async def create(self, telegram_id: int, full_name: str, phone: str) -> Optional[User]:
+        row = await self.db.fetchone(
+            f"INSERT INTO users (telegram_id, full_name, phone) VALUES (%s, %s, %s) "
+            f"ON CONFLICT (telegram_id) DO NOTHING RETURNING {USER_COLUMNS}",
+            (telegram_id, full_name, phone)
+        )
+        if not row:
+            # Пользователь уже был — берём существующую запись
+            return await self.get_by_telegram_id(telegram_id)
+        user = User(*row)
+        self.cache.set(telegram_id, user)
+        return user
+
+    async def set_role(self, telegram_id: int, role: Optional[str]) -> None:
+        await self.db.execute("UPDATE users SET role = %s WHERE telegram_id = %s", (role, telegram_id))
+        self.invalidate(telegram_id)
+
+    async def update_profile(self, telegram_id: int, full_name: str, phone: str) -> None:
+        await self.db.execute(
+            "UPDATE users SET full_name = %s, phone = %s WHERE telegram_id = %s",
+            (full_name, phone, telegram_id)
+        )
+        self.invalidate(telegram_id)
+
+    def invalidate(self, telegram_id: int) -> None:
+        self.cache.invalidate(telegram_id)
+
+
+class BookingRepository:
+    """Брони. Список «Мои брони» кэшируется по telegram_id клиента.
+
+    Кэш сбрасывается явно при создании и отмене брони клиентом, а при
+    любых других сменах статуса — по событию booking_events (см. notifications.py).
+    """
+
+    def __init__(self, db, cache=None):
+        self.db = db
+        self.client_cache = cache if cache is not None else TTLCache(
+            maxsize=int(os.getenv("CLIENT_BOOKINGS_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("CLIENT_BOOKINGS_CACHE_TTL", "120")),
+        )
+
+    async def get(self, booking_id: int) -> Optional[Booking]:
+        row = await self.db.fetchone(
+            f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE id = %s", (booking_id,)
+        )
+        return Booking(*row) if row else None
+
+    async def list_for_client(self, telegram_id: int) -> list[Booking]:
+        bookings = self.client_cache.get(telegram_id)
+        if bookings is not None:
+            return bookings
+
+        columns = ", ".join(f"b.{column.strip()}" for column in BOOKING_COLUMNS.split(","))
+        rows = await self.db.fetchall(f"""
+            SELECT {columns}
+            FROM bookings b
+            JOIN users u ON u.id = b.client_id
+            WHERE u.telegram_id = %s AND b.status != 'cancelled'
+            ORDER BY b.scheduled_time NULLS LAST, b.id
+        """, (telegram_id,))
+        bookings = [Booking(*row) for row in rows]
+        self.client_cache.set(telegram_id, bookings)
+        return bookings
+
+    def invalidate_client(self, telegram_id: int) -> None:
+        self.client_cache.invalidate(telegram_id)
+
+    async def addresses(self, booking_ids: list[int]) -> dict[int, tuple[str, str]]:
+        """{id: (откуда, куда)} — адресов нет в событиях booking_events (миграция 0013)."""
+        rows = await self.db.fetchall(
+            "SELECT id, pickup_point, destination_point FROM bookings WHERE id = ANY(%s)", (list(booking_ids),)
+        )
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    async def create(self, client_id: int, from_city: str, to_city: str, pickup_point: str,
+                     destination_point: str, scheduled_time: datetime, price: int, ride_type: str) -> int:
+        row = await self.db.fetchone(
+            INSERT_BOOKING_SQL,
+            (client_id, from_city, to_city, pickup_point, destination_point, scheduled_time, price, ride_type)
+        )
+        return row[0]
+
+    async def create_within_capacity(self, client_id: int, from_city: str, to_city: str, pickup_point: str,
+                                     destination_point: str, scheduled_time: datetime, price: int,
+                                     ride_type: str, default_capacity: int) -> tuple[Optional[int], int]:
+        """Создаёт бронь, только если в её часе по направлению хватает мест.
+
+        Час направления сериализуется advisory-локом до конца транзакции,
+        поэтому две одновременные брони на последнее место не пройдут обе.
+        default_capacity — вместимость часа, для которого нет строки в
+        ride_capacity. Возвращает (id брони или None, сколько мест осталось).
+        """
+        hour = hour_of(scheduled_time)
+        seats = booking_seats(ride_type)
+        async with self.db.transaction() as tx:
+            await tx.fetchone(
+                "SELECT pg_advisory_xact_lock(%s, hashtext(%s))",
+                (CAPACITY_LOCK_CLASS, f"{from_city}>{to_city}>{hour:%Y-%m-%d %H}")
+            )
+            row = await tx.fetchone(f"""
+                SELECT COALESCE(
+                           (SELECT seats FROM ride_capacity WHERE from_city = %s AND to_city = %s AND hour = %s), %s
+                       ) - COALESCE(sum({SEATS_SQL}), 0)
+                FROM bookings
+                WHERE from_city = %s AND to_city = %s AND status IN ('pending', 'confirmed')
+                  AND scheduled_time >= %s AND scheduled_time < %s
+            """, (from_city, to_city, hour.hour, default_capacity, RIDE_WHOLE_CAR, VEHICLE_SEATS,
+                  from_city, to_city, hour, hour + timedelta(hours=1)))
+            left = row[0]
+            if left < seats:
+                return None, left
+            row = await tx.fetchone(
+                INSERT_BOOKING_SQL,
+                (client_id, from_city, to_city, pickup_point, destination_point, scheduled_time, price, ride_type)
+            )
+            return row[0], left - seats
+
+    async def seats_used_by_hour(self, from_city: str, to_city: str, day: date) -> dict[int, int]:
+        """Занятые места по часам дня: {час: мест} (pending и confirmed)."""
+        rows = await self.db.fetchall(f"""
+            SELECT extract(hour FROM scheduled_time)::int, sum({SEATS_SQL})::int
+            FROM bookings
+            WHERE from_city = %s AND to_city = %s AND status IN ('pending', 'confirmed')
+              AND scheduled_time >= %s AND scheduled_time < %s
+            GROUP BY 1
+        """, (RIDE_WHOLE_CAR, VEHICLE_SEATS, from_city, to_city, day, day + timedelta(days=1)))
+        return dict(rows)
+
+    async def transition(self, booking_id: int, status: str, allowed_from: tuple[str, ...], actor: str,
+                         owner_telegram_id: Optional[int] = None) -> Optional[tuple]:
+        """Условная смена статуса одной брони одним запросом (см. booking_state).
+
+        Возвращает (прежний статус, scheduled_time, изменилась ли) или None,
+        если брони нет (или она не принадлежит owner_telegram_id).
+        """
+        owner_condition = ""
+        params = [booking_id]
+        if owner_telegram_id is not None:
+            owner_condition = "AND client_id = (SELECT id FROM users WHERE telegram_id = %s)"
+            params.append(owner_telegram_id)
+        return await self.db.fetchone(f"""
+            WITH target AS (
+                SELECT id, status, scheduled_time FROM bookings
+                WHERE id = %s {owner_condition}
+                FOR UPDATE
+            ), updated AS (
+                UPDATE bookings b SET status = %s, status_changed_by = %s
+                FROM target t
+                WHERE b.id = t.id AND t.status = ANY(%s)
+                RETURNING b.id
+            )
+            SELECT t.status, t.scheduled_time, u.id IS NOT NULL
+            FROM target t LEFT JOIN updated u ON u.id = t.id
+        """, (*params, status, actor, list(allowed_from)))
+
+    async def set_status_many(self, booking_ids: list[int], status: str,
+                              allowed_from: tuple[str, ...], actor: str) -> list[StatusChange]:
+        """Меняет статус пачке броней одним запросом.
+
+        Меняются только брони в статусах allowed_from; по каждому id
+        возвращается прежний статус и то, изменился ли он. Строки
+        блокируются по возрастанию id, как в set_status_for_date, чтобы
+        параллельные массовые смены не ждали друг друга по кругу.
+        """
+        rows = await self.db.fetchall("""
+            WITH target AS (
+                SELECT id, status FROM bookings WHERE id = ANY(%s) ORDER BY id FOR UPDATE
+            ), updated AS (
+                UPDATE bookings b SET status = %s, status_changed_by = %s
+                FROM target t
+                WHERE b.id = t.id AND t.status = ANY(%s)
+                RETURNING b.id
+            )
+            SELECT t.id, t.status, u.id IS NOT NULL
+            FROM target t LEFT JOIN updated u ON u.id = t.id
+        """, (list(booking_ids), status, actor, list(allowed_from)))
+        found = {row[0]: StatusChange(*row) for row in rows}
+        return [found.get(booking_id, StatusChange(booking_id, None, False)) for booking_id in booking_ids]
+
+    async def set_status_for_date(self, day: date, status: str, allowed_from: tuple[str, ...],
+                                  actor: str) -> list[int]:
+        # Блокировки по возрастанию id — см. set_status_many
+        rows = await self.db.fetchall("""
+            WITH target AS (
+                SELECT id FROM bookings
+                WHERE status = ANY(%s) AND scheduled_time >= %s AND scheduled_time < %s
+                ORDER BY id
+                FOR UPDATE
+            )
+            UPDATE bookings b SET status = %s, status_changed_by = %s
+            FROM target t
+            WHERE b.id = t.id
+            RETURNING b.id
+        """, (list(allowed_from), day, day + timedelta(days=1), status, actor))
+        return sorted(row[0] for row in rows)
+
+    async def transition_due(self, status: str, allowed_from: tuple[str, ...], before: datetime,
+                             actor: str, limit: int) -> list[int]:
+        """Переводит до limit броней с scheduled_time < before; занятые строки пропускает."""
+        rows = await self.db.fetchall("""
+            UPDATE bookings SET status = %s, status_changed_by = %s
+            WHERE id IN (
+                SELECT id FROM bookings
+                WHERE status = ANY(%s) AND scheduled_time < %s
+                ORDER BY scheduled_time
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id
+        """, (status, actor, list(allowed_from), before, limit))
+        return [row[0] for row in rows]
+
+    async def claim_reminders(self, since: datetime, until: datetime, limit: int) -> list[tuple]:
+        """Отмечает напоминание отправленным и возвращает, кому его слать.
+
+        (id, telegram_id, scheduled_time, pickup_point, destination_point)
+        """
+        return await self.db.fetchall("""
+            UPDATE bookings b SET reminder_sent_at = now()
+            FROM users u
+            WHERE u.id = b.client_id AND b.id IN (
+                SELECT id FROM bookings
+                WHERE status = 'confirmed' AND reminder_sent_at IS NULL
+                  AND scheduled_time > %s AND scheduled_time <= %s
+                ORDER BY scheduled_time
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING b.id, u.telegram_id, b.scheduled_time, b.pickup_point, b.destination_point
+        """, (since, until, limit))
+
+    async def list_pending_upcoming(self, since: datetime, limit: int = 20) -> list[BookingWithClient]:
+        rows = await self.db.fetchall("""
+            SELECT b.id, u.full_name, u.phone, u.telegram_id, b.scheduled_time, b.status
+            FROM bookings b
+            JOIN users u ON b.client_id = u.id
+            WHERE b.status = 'pending' AND b.scheduled_time >= %s
+            ORDER BY b.scheduled_time, b.id
+            LIMIT %s
+        """, (since, limit))
+        return [BookingWithClient(*row) for row in rows]
+
+    async def list_seat_bookings(self, since: datetime, until: datetime) -> list[Booking]:
+        rows = await self.db.fetchall(f"""
+            SELECT {BOOKING_COLUMNS}
+            FROM bookings
+            WHERE ride_type = %s
+              AND status IN ('pending', 'confirmed')
+              AND scheduled_time >= %s AND scheduled_time < %s
+            ORDER BY scheduled_time
+        """, (RIDE_SEAT, since, until))
+        return [Booking(*row) for row in rows]
+
+    async def page_with_clients(self, active_only: bool, cursor: Optional[tuple] = None,
+                                backward: bool = False, limit: int = 10) -> tuple[list[BookingWithClient], bool]:
+        """Страница админского списка с keyset-пагинацией.
+
+        Порядок — по времени поездки от поздних к ранним, затем по id.
+        cursor — (scheduled_time, id) крайней строки текущей страницы;
+        backward=True листает назад. Возвращает строки в порядке показа
+        и признак того, что в направлении листания есть ещё строки.
+        """
+        conditions = []
+        params = []
+        if active_only:
+            conditions.append("b.status IN ('pending', 'confirmed')")
+        if cursor:
+            scheduled_time, booking_id = cursor
+            conditions.append(f"({ADMIN_SORT_KEY}, b.id) {'>' if backward else '<'} (%s::timestamp, %s)")
+            params += [scheduled_time if scheduled_time is not None else "-infinity", booking_id]
+        order = "ASC" if backward else "DESC"
+
+        rows = await self.db.fetchall(f"""
+            SELECT b.id, u.full_name, u.phone, u.telegram_id, b.scheduled_time, b.status
+            FROM bookings b
+            JOIN users u ON b.client_id = u.id
+            WHERE {" AND ".join(conditions) or "TRUE"}
+            ORDER BY {ADMIN_SORT_KEY} {order}, b.id {order}
+            LIMIT %s
+        """, (*params, limit + 1))
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+        return [BookingWithClient(*row) for row in rows], has_more
+
+
+class DriverRepository:
+    """Слоты водителей и назначение на них подтверждённых броней (см. dispatch.py)."""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def add_slot(self, driver_id: int, from_city: str, to_city: str, starts_at: datetime,
+                       ends_at: datetime, seats: int) -> DriverSlot:
+        row = await self.db.fetchone(f"""
+            INSERT INTO driver_slots (driver_id, from_city, to_city, starts_at, ends_at, seats, seats_left)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            RETURNING {SLOT_COLUMNS}
+        """, (driver_id, from_city, to_city, starts_at, ends_at, seats, seats))
+        return DriverSlot(*row)
+
+    async def delete_slot(self, slot_id: int, driver_id: int) -> bool:
+        """Удаляет слот водителя, если на него ещё никого не назначили."""
+        row = await self.db.fetchone("""
+            DELETE FROM driver_slots s
+            WHERE id = %s AND driver_id = %s
+              AND NOT EXISTS (
+                  SELECT 1 FROM bookings b WHERE b.slot_id = s.id AND b.status IN ('confirmed', 'completed')
+              )
+            RETURNING id
+        """, (slot_id, driver_id))
+        return row is not None
+
+    async def list_for_driver(self, driver_id: int, since: datetime) -> list[DriverSlot]:
+        rows = await self.db.fetchall(f"""
+            SELECT {SLOT_COLUMNS} FROM driver_slots
+            WHERE driver_id = %s AND ends_at >= %s
+            ORDER BY starts_at
+        """, (driver_id, since))
+        return [DriverSlot(*row) for row in rows]
+
+    async def list_open(self, since: datetime) -> list[DriverSlot]:
+        """Слоты, которые ещё не закончились и в которых есть места."""
+        rows = await self.db.fetchall(f"""
+            SELECT {SLOT_COLUMNS} FROM driver_slots
+            WHERE ends_at >= %s AND seats_left > 0
+        """, (since,))
+        return [DriverSlot(*row) for row in rows]
+
+    async def list_unassigned(self, since: datetime, limit: int) -> list[tuple]:
+        """Подтверждённые брони без водителя.
+
+        (id, from_city, to_city, scheduled_time, ride_type, telegram_id клиента)
+        """
+        return await self.db.fetchall("""
+            SELECT b.id, b.from_city, b.to_city, b.scheduled_time, b.ride_type, u.telegram_id
+            FROM bookings b
+            JOIN users u ON u.id = b.client_id
+            WHERE b.status = 'confirmed' AND b.slot_id IS NULL AND b.scheduled_time >= %s
+            ORDER BY b.scheduled_time
+            LIMIT %s
+        """, (since, limit))
+
+    async def assign(self, booking_id: int, slot_id: int, seats: int) -> Optional[Assignment]:
+        """Назначает бронь на слот одним запросом.
+
+        Бронь блокируется первой, поэтому параллельные диспетчеры (другие
+        воркеры, периодический добор) назначают её не больше одного раза;
+        места списываются, только если их хватает. None — бронь уже
+        назначена, не подтверждена или в слоте не осталось мест.
+        """
+        row = await self.db.fetchone("""
+            WITH target AS (
+                SELECT id FROM bookings
+                WHERE id = %s AND status = 'confirmed' AND slot_id IS NULL
+                FOR UPDATE
+            ), slot AS (
+                UPDATE driver_slots SET seats_left = seats_left - %s
+                WHERE id = %s AND seats_left >= %s AND EXISTS (SELECT 1 FROM target)
+                RETURNING id, driver_id, seats_left
+            ), assigned AS (
+                UPDATE bookings b SET slot_id = slot.id, slot_seats = %s
+                FROM slot
+                WHERE b.id = %s
+                RETURNING b.id, b.client_id, b.scheduled_time, b.pickup_point, b.destination_point
+            )
+            SELECT a.id, slot.id, slot.seats_left,
+                   d.telegram_id, d.full_name, d.phone,
+                   c.telegram_id, c.full_name, c.phone,
+                   a.scheduled_time, a.pickup_point, a.destination_point
+            FROM assigned a
+            CROSS JOIN slot
+            JOIN users d ON d.id = slot.driver_id
+            JOIN users c ON c.id = a.client_id
+        """, (booking_id, seats, slot_id, seats, seats, booking_id))
+        return Assignment(*row) if row else None
+
+
+class CapacityRepository:
+    """Вместимость по направлению и часу (ride_capacity, миграция 0012)."""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def get(self, from_city: str, to_city: str) -> dict[int, int]:
+        """{час: мест} для часов, где вместимость задана явно."""
+        rows = await self.db.fetchall(
+            "SELECT hour, seats FROM ride_capacity WHERE from_city = %s AND to_city = %s", (from_city, to_city)
+        )
+        return dict(rows)
+
+    async def set(self, from_city: str, to_city: str, hour: int, seats: int) -> None:
+        await self.db.execute("""
+            INSERT INTO ride_capacity (from_city, to_city, hour, seats) VALUES (%s, %s, %s, %s)
+            ON CONFLICT (from_city, to_city, hour) DO UPDATE SET seats = EXCLUDED.seats
+        """, (from_city, to_city, hour, seats))
@@ -0,0 +1,214 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import observe_telegram
+
+
+logger = logging.getLogger(__name__)
+
+# Приоритетные полосы: передаются в rate_limit_args при отправке методами бота,
+# например context.bot.send_message(chat_id, ..., rate_limit_args=PRIORITY_HIGH).
+# Ярлыки update.message.reply_text / query.edit_message_text этот аргумент не принимают.
+# Значения не нулевые: ExtBot отбрасывает «ложные» rate_limit_args, и 0 дошёл бы до очереди как None.
+PRIORITY_HIGH = 1    # подтверждения и ответы клиентам
+PRIORITY_NORMAL = 2  # обычные ответы меню
+PRIORITY_BULK = 3    # админские списки, рассылки
+PRIORITIES = (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_BULK)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Сколько секунд ждать до следующего токена (0 — можно сейчас)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class SendQueue(BaseRateLimiter):
+    """Центральная очередь исходящих запросов к Bot API.
+
+    Ограничивает глобальную скорость и скорость на чат (лимиты Telegram),
+    пропускает запросы по приоритетным полосам, а на RetryAfter ставит
+    всю отправку на паузу и повторяет запрос. Запросы без chat_id
+    (getMe, answerCallbackQuery, ...) не ограничиваются.
+    """
+
+    def __init__(self, global_rate=30.0, chat_rate=1.0, chat_burst=3, group_rate=20 / 60, max_retries=3,
+                 max_chat_buckets=10000, clock=time.monotonic, sleep=asyncio.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.max_chat_buckets = max_chat_buckets
+
+        self._global = TokenBucket(global_rate, global_rate, clock())
+        self._chats = {}
+        self._lanes = {priority: deque() for priority in PRIORITIES}
+        self._wakeup = asyncio.Event()
+        self._paused_until = 0.0
+        self._dispatcher = None
+
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+        self._sent_window = deque()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            # Лимит бота общий на все воркеры — делим его поровну
+            global_rate=float(os.getenv("SEND_GLOBAL_RATE", "30")) / int(os.getenv("CLUSTER_WORKERS", "1")),
+            chat_rate=float(os.getenv("SEND_CHAT_RATE", "1")),
+            chat_burst=int(os.getenv("SEND_CHAT_BURST", "3")),
+            max_retries=int(os.getenv("SEND_MAX_RETRIES", "3")),
+        )
+
+    async def initialize(self):
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self):
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+    def stats(self):
+        now = self.clock()
+        while self._sent_window and self._sent_window[0] < now - 60:
+            self._sent_window.popleft()
+        return {
+            "queued": {priority: len(lane) for priority, lane in self._lanes.items()},
+            "sent": self.sent,
+            "retries": self.retries,
+            "failed": self.failed,
+            "per_second": round(len(self._sent_window) / 60, 2),
+            "paused_for": max(0.0, round(self._paused_until - now, 1)),
+        }
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        priority = rate_limit_args if rate_limit_args in PRIORITIES else PRIORITY_NORMAL
+
+        for attempt in range(self.max_retries + 1):
+            if chat_id is not None:
+                await self._acquire(chat_id, priority)
+            started = time.perf_counter()
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    raise
+                delay = exc.retry_after
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                self.retries += 1
+                self._paused_until = max(self._paused_until, self.clock() + delay)
+                logger.warning("RetryAfter %s c на %s (чат %s), повтор %s", delay, endpoint, chat_id, attempt + 1)
+                await self.sleep(delay)
+                continue
+            finally:
+                # Только сам запрос к API, без ожидания в очереди
+                observe_telegram(endpoint, time.perf_counter() - started)
+
+            self.sent += 1
+            self._sent_window.append(self.clock())
+            return result
+
+    async def _acquire(self, chat_id, priority):
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[priority].append((chat_id, future))
+        self._wakeup.set()
+        await future
+
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chat_buckets:
+                # Полные корзины ничего не помнят — их можно выбросить
+                self._chats = {k: b for k, b in self._chats.items() if not b.is_full(now)}
+            is_group = isinstance(chat_id, int) and chat_id < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, self.chat_burst, now)
+        return bucket
+
+    def _pick(self, now):
+        """Первый запрос по приоритету, чей чат может отправлять сейчас.
+
+        Возвращает (lane, index) или время до ближайшей готовности.
+        """
+        soonest = None
+        for priority in PRIORITIES:
+            lane = self._lanes[priority]
+            blocked = set()
+            for index, (chat_id, future) in enumerate(lane):
+                if chat_id in blocked:
+                    continue
+                wait = self._chat_bucket(chat_id, now).wait_time(now)
+                if wait == 0:
+                    return (lane, index), None
+                blocked.add(chat_id)
+                soonest = wait if soonest is None else min(soonest, wait)
+        return None, soonest
+
+    async def _dispatch(self):
+        while True:
+            if not any(self._lanes.values()):
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = self.clock()
+            if self._paused_until > now:
+                await self.sleep(self._paused_until - now)
+                continue
+
+            wait = self._global.wait_time(now)
+            if wait:
+                await self.sleep(wait)
+                continue
+
+            picked, wait = self._pick(now)
+            if picked is None:
+                # Все ожидающие чаты исчерпали лимит — ждём токен или новый запрос
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            lane, index = picked
+            chat_id, future = lane[index]
+            del lane[index]
+            if future.cancelled():
+                continue
+            self._global.take(now)
+            self._chat_bucket(chat_id, now).take(now)
+            future.set_result(None)
@@ -0,0 +1,54 @@
+"""Общие фикстуры тестов.
+
+Тесты с фикстурой postgres ходят в настоящую базу из TEST_DATABASE_URL
+(например, postgresql://taxi@localhost/taxi_test). Перед первым таким
+тестом база мигрируется; без переменной они пропускаются. Каждый тест
+работает в транзакции, которая откатывается, — база остаётся чистой.
+"""
+import os
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+
+class _Rollback(Exception):
+    pass
+
+
+@pytest.fixture(scope="session")
+def postgres():
+    conninfo = os.getenv("TEST_DATABASE_URL")
+    if not conninfo:
+        pytest.skip("TEST_DATABASE_URL не задан")
+
+    from db import Database
+    from migrate import migrate
+
+    async def prepare():
+        db = Database(conninfo, max_size=2)
+        await db.open()
+        try:
+            await migrate(db)
+        finally:
+            await db.close()
+
+    asyncio.run(prepare())
+    return conninfo
+
+
+@asynccontextmanager
+async def rolled_back(conninfo):
+    """Транзакция в тестовой базе, которая всегда откатывается."""
+    from db import Database
+
+    db = Database(conninfo, max_size=1)
+    await db.open()
+    try:
+        async with db.transaction() as tx:
+            yield tx
+            raise _Rollback
+    except _Rollback:
+        pass
+    finally:
+        await db.close()
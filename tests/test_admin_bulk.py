@@ -0,0 +1,137 @@
+"""Массовые действия админа: разбор ID, сводка и «все ДД.ММ»."""
+import asyncio
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pytest
+
+import admin_role_handler
+from admin_role_handler import MAX_BULK_IDS, parse_booking_ids, parse_day, format_ids, render_bulk_summary
+from repository import StatusChange
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("155", [155]),
+    ("101, 103; 102", [101, 102, 103]),
+    ("101 102 103", [101, 102, 103]),
+    ("101-105", [101, 102, 103, 104, 105]),
+    ("101 - 103, 155", [101, 102, 103, 155]),
+    ("105-101", [101, 102, 103, 104, 105]),
+    ("7-7", [7]),
+    ("101-103, 102, 103-104, 101", [101, 102, 103, 104]),
+    (" , 5 ,, ", [5]),
+    (f"1-{MAX_BULK_IDS}", list(range(1, MAX_BULK_IDS + 1))),
+])
+def test_parse_booking_ids(text, expected):
+    assert parse_booking_ids(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "", ",", "abc", "101, abc", "101-", "-5", "+5", "1-2-3", "101–103", "#101", "1.5",
+])
+def test_parse_booking_ids_rejects_junk(text):
+    with pytest.raises(ValueError):
+        parse_booking_ids(text)
+
+
+@pytest.mark.parametrize("text", [
+    f"1-{MAX_BULK_IDS + 1}",
+    f"{MAX_BULK_IDS + 1}-1",
+    "1-999999999999",
+    f"1-{MAX_BULK_IDS}, {MAX_BULK_IDS + 1}",
+    " ".join(str(i) for i in range(MAX_BULK_IDS + 1)),
+])
+def test_parse_booking_ids_rejects_oversized(text):
+    with pytest.raises(ValueError, match=str(MAX_BULK_IDS)):
+        parse_booking_ids(text)
+
+
+def test_oversized_range_is_rejected_before_expanding(monkeypatch):
+    monkeypatch.setattr(admin_role_handler, "range", lambda *args: pytest.fail("range expanded"), raising=False)
+    with pytest.raises(ValueError):
+        parse_booking_ids("1-999999999999")
+
+
+@pytest.mark.parametrize("ids, expected", [
+    ([155], "#155"),
+    ([103, 101, 102, 155], "#101–#103, #155"),
+    ([1, 3, 5], "#1, #3, #5"),
+    ([], ""),
+])
+def test_format_ids(ids, expected):
+    assert format_ids(ids) == expected
+
+
+def test_render_bulk_summary():
+    changes = [
+        StatusChange(101, "pending", True), StatusChange(102, "pending", True),
+        StatusChange(103, "cancelled", False), StatusChange(104, None, False),
+    ]
+    assert render_bulk_summary("approve", changes) == (
+        "✅ Подтверждено: #101–#102\n"
+        "⏭ Пропущены (статус cancelled): #103\n"
+        "❓ Не найдены: #104"
+    )
+
+
+def test_parse_day():
+    assert parse_day("24.05.2025") == date(2025, 5, 24)
+    assert parse_day("24.05") == date(datetime.now().year, 5, 24)
+    with pytest.raises(ValueError):
+        parse_day("завтра")
+
+
+class FakeBookings:
+    def __init__(self):
+        self.calls = []
+
+    async def set_status_for_date(self, day, status, allowed_from, actor):
+        self.calls.append(("day", day, status, allowed_from))
+        return [101, 102, 103, 155]
+
+    async def set_status_many(self, booking_ids, status, allowed_from, actor):
+        self.calls.append(("many", booking_ids, status, allowed_from))
+        return [StatusChange(booking_id, "pending", True) for booking_id in booking_ids]
+
+
+class Message:
+    def __init__(self, text):
+        self.text = text
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def bulk_input(text, action="cancel"):
+    bookings = FakeBookings()
+    message = Message(text)
+    context = SimpleNamespace(application=SimpleNamespace(bot_data={"bookings": bookings}))
+    state = asyncio.run(admin_role_handler.handle_bulk_input(
+        SimpleNamespace(message=message), context, action, admin_role_handler.AWAIT_CANCEL_IDS
+    ))
+    return state, bookings.calls, message.replies
+
+
+def test_bulk_input_whole_day():
+    state, calls, replies = bulk_input("все 24.05.2025")
+
+    assert state == admin_role_handler.AWAIT_ADMIN_ACTION
+    assert calls == [("day", date(2025, 5, 24), "cancelled", ("pending", "confirmed"))]
+    assert replies == ["✅ Отменено за 24.05.2025: #101–#103, #155"]
+
+
+def test_bulk_input_ids():
+    state, calls, replies = bulk_input("103-101", action="approve")
+
+    assert calls == [("many", [101, 102, 103], "confirmed", ("pending",))]
+    assert replies == ["✅ Подтверждено: #101–#103"]
+
+
+@pytest.mark.parametrize("text, hint", [("все завтра", "Укажите дату"), ("1-100000", "Пример")])
+def test_bulk_input_retries_on_bad_input(text, hint):
+    state, calls, replies = bulk_input(text)
+
+    assert state == admin_role_handler.AWAIT_CANCEL_IDS
+    assert calls == []
+    assert hint in replies[0]
@@ -0,0 +1,179 @@
+"""Keyset-пагинация админских списков: курсор в callback_data и листание в обе стороны."""
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import admin_role_handler
+from admin_role_handler import encode_cursor, decode_cursor, render_bookings_page
+from conftest import rolled_back
+from repository import BookingRepository, BookingWithClient, INSERT_BOOKING_SQL, RIDE_SEAT
+
+
+BASE = datetime(2025, 5, 24, 7, 0)
+NEG_INF = datetime.min
+
+
+def row(booking_id, scheduled_time, status="pending"):
+    return BookingWithClient(booking_id, "Иван", "+79000000000", 555, scheduled_time, status)
+
+
+@pytest.mark.parametrize("scheduled_time", [
+    datetime(2025, 5, 24, 9, 30), datetime(2025, 12, 31, 23, 59, 59, 999999), datetime(2025, 1, 1), None,
+])
+def test_cursor_round_trip(scheduled_time):
+    booking = row(123456789, scheduled_time)
+    time_part, booking_id = encode_cursor(booking).split(":")
+
+    assert decode_cursor(time_part, booking_id) == (scheduled_time, 123456789)
+    # Лимит callback_data в Telegram — 64 байта
+    assert len(f"adm:h:p:{encode_cursor(booking)}".encode()) <= 64
+
+
+def test_page_buttons_carry_cursors_of_edge_rows():
+    rows = [row(5, BASE + timedelta(hours=2)), row(4, None)]
+    _, keyboard = render_bookings_page("a", rows, True, True)
+    prev_button, next_button = keyboard.inline_keyboard[0]
+
+    assert prev_button.callback_data == f"adm:a:p:{encode_cursor(rows[0])}"
+    assert next_button.callback_data == "adm:a:n:-:4"
+    assert render_bookings_page("a", rows, False, False)[1] is None
+
+
+class KeysetDB:
+    """Выполняет запрос page_with_clients над строками в памяти, с теми же правилами сортировки."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetchall(self, sql, params=()):
+        params = list(params)
+        limit = params.pop()
+        rows = self.rows
+        if "status IN" in sql:
+            rows = [r for r in rows if r.status in ("pending", "confirmed")]
+        key = lambda r: (r.scheduled_time or NEG_INF, r.id)
+        backward = "ASC" in sql
+        if params:
+            scheduled_time, booking_id = params
+            cursor = (NEG_INF if scheduled_time == "-infinity" else scheduled_time, booking_id)
+            rows = [r for r in rows if (key(r) > cursor if backward else key(r) < cursor)]
+        rows = sorted(rows, key=key, reverse=not backward)
+        return [tuple(vars(r).values()) for r in rows[:limit]]
+
+
+def sample_rows():
+    rows = [row(i, BASE + timedelta(hours=i // 2)) for i in range(1, 12)]
+    rows += [row(20, None), row(21, None), row(22, None, status="cancelled")]
+    return rows
+
+
+def walk(bookings, active_only, limit):
+    """Вперёд до конца, потом назад до начала — как нажатия ▶️ и ◀️."""
+    async def run():
+        pages = []
+        rows, has_next = await bookings.page_with_clients(active_only, limit=limit)
+        pages.append([r.id for r in rows])
+        while has_next:
+            rows, has_next = await bookings.page_with_clients(
+                active_only, cursor=decode_cursor(*encode_cursor(rows[-1]).split(":")), limit=limit
+            )
+            pages.append([r.id for r in rows])
+        back = [pages[-1]]
+        # У первой страницы кнопки ◀️ нет
+        has_prev = len(pages) > 1
+        while has_prev:
+            rows, has_prev = await bookings.page_with_clients(
+                active_only, cursor=decode_cursor(*encode_cursor(rows[0]).split(":")), backward=True, limit=limit
+            )
+            back.append([r.id for r in rows])
+        return pages, back[::-1]
+
+    return asyncio.run(run())
+
+
+def expected_order(rows, active_only):
+    rows = [r for r in rows if not active_only or r.status in ("pending", "confirmed")]
+    return [r.id for r in sorted(rows, key=lambda r: (r.scheduled_time or NEG_INF, r.id), reverse=True)]
+
+
+@pytest.mark.parametrize("active_only", [True, False])
+@pytest.mark.parametrize("limit", [1, 3, 4, 20])
+def test_paging_forward_and_back_covers_every_row_once(active_only, limit):
+    rows = sample_rows()
+    pages, back = walk(BookingRepository(KeysetDB(rows)), active_only, limit)
+
+    order = expected_order(rows, active_only)
+    assert [i for page in pages for i in page] == order
+    # Назад возвращаются ровно те же страницы
+    assert back == pages
+    # Брони без времени — в конце списка, по убыванию id
+    assert order[-2:] == [21, 20]
+
+
+def test_page_callback_edits_message_with_next_page():
+    rows = sample_rows()
+    edits = []
+
+    class Bot:
+        async def edit_message_text(self, text, **kwargs):
+            edits.append((text, kwargs))
+
+    async def answer(*args, **kwargs):
+        pass
+
+    users = SimpleNamespace(get_by_telegram_id=lambda telegram_id: asyncio.sleep(0, SimpleNamespace(role="admin")))
+    update = SimpleNamespace(
+        effective_user=SimpleNamespace(id=1),
+        callback_query=SimpleNamespace(
+            data=f"adm:a:n:{encode_cursor(row(9, BASE + timedelta(hours=4)))}", answer=answer,
+            message=SimpleNamespace(chat_id=1, message_id=77),
+        ),
+    )
+    context = SimpleNamespace(
+        bot=Bot(), application=SimpleNamespace(bot_data={"users": users, "bookings": BookingRepository(KeysetDB(rows))})
+    )
+    asyncio.run(admin_role_handler.bookings_page_callback(update, context))
+
+    text, kwargs = edits[0]
+    assert kwargs["message_id"] == 77
+    shown = [int(line.split("#")[1].split()[0]) for line in text.splitlines() if line.startswith("🆔")]
+    assert shown == expected_order(rows, True)[expected_order(rows, True).index(9) + 1:][:admin_role_handler.ADMIN_PAGE_SIZE]
+    buttons = kwargs["reply_markup"].inline_keyboard[0]
+    assert buttons[0].callback_data.startswith("adm:a:p:")
+
+
+def test_paging_against_postgres(postgres):
+    """Тот же обход на настоящем запросе: COALESCE(scheduled_time, '-infinity') и строковый курсор."""
+    async def run():
+        async with rolled_back(postgres) as tx:
+            client = await tx.fetchone(
+                "INSERT INTO users (telegram_id, full_name, phone) VALUES (-2, 'Тест', '+70000000000') RETURNING id"
+            )
+            await tx.execute("DELETE FROM bookings")
+            ids = []
+            for hours in (0, 0, 1, 2, None, None):
+                scheduled_time = BASE + timedelta(hours=hours) if hours is not None else None
+                created = await tx.fetchone(
+                    INSERT_BOOKING_SQL, (client[0], "Нижнекамск", "Казань", "a", "b", scheduled_time, 1000, RIDE_SEAT)
+                )
+                ids.append(created[0])
+
+            bookings = BookingRepository(SimpleNamespace(fetchall=tx.fetchall))
+            seen = []
+            rows, has_next = await bookings.page_with_clients(False, limit=2)
+            seen += [r.id for r in rows]
+            while has_next:
+                rows, has_next = await bookings.page_with_clients(
+                    False, cursor=decode_cursor(*encode_cursor(rows[-1]).split(":")), limit=2
+                )
+                seen += [r.id for r in rows]
+            back, _ = await bookings.page_with_clients(
+                False, cursor=decode_cursor(*encode_cursor(rows[0]).split(":")), backward=True, limit=2
+            )
+            return ids, seen, [r.id for r in back]
+
+    ids, seen, back = asyncio.run(run())
+    assert seen == [ids[3], ids[2], ids[1], ids[0], ids[5], ids[4]]
+    assert back == [ids[1], ids[0]]
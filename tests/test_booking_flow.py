@@ -0,0 +1,127 @@
+"""Бронирование целиком через настоящий ExtBot и фейковый HTTP-слой.
+
+Апдейт и все ответы проходят через сигнатуры PTB, поэтому неверные
+аргументы ярлыков (например rate_limit_args у reply_text) ловятся здесь.
+"""
+import json
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+from telegram import Update
+from telegram.ext import ConversationHandler, ExtBot
+from telegram.ext._baseratelimiter import BaseRateLimiter
+from telegram.request import BaseRequest
+
+import booking
+from repository import User, RIDE_SEAT
+from send_queue import PRIORITY_HIGH
+
+
+BOT_ID = 123456
+CLIENT_ID = 555
+
+
+class FakeRequest(BaseRequest):
+    def __init__(self):
+        self.calls = []
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls.append((endpoint, params))
+        if endpoint == "getMe":
+            result = {"id": BOT_ID, "is_bot": True, "first_name": "taxi", "username": "taxi_bot"}
+        else:
+            result = {
+                "message_id": len(self.calls), "date": 0, "text": params.get("text"),
+                "chat": {"id": params.get("chat_id"), "type": "private"},
+            }
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+class RecordingRateLimiter(BaseRateLimiter):
+    def __init__(self):
+        self.priorities = []
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        self.priorities.append((endpoint, rate_limit_args))
+        return await callback(*args, **kwargs)
+
+
+class FakeUsers:
+    async def get_by_telegram_id(self, telegram_id):
+        return User(1, telegram_id, "Иван", "+79000000000", None)
+
+
+class FakeBookings:
+    def __init__(self):
+        self.created = []
+        self.invalidated = []
+
+    async def create_within_capacity(self, *args):
+        self.created.append(args)
+        return 101, 3
+
+    def invalidate_client(self, telegram_id):
+        self.invalidated.append(telegram_id)
+
+
+class FakeAvailability:
+    def invalidate(self, from_city, to_city, day):
+        pass
+
+
+def message_update(bot, text):
+    return Update.de_json({
+        "update_id": 1,
+        "message": {
+            "message_id": 1, "date": 0, "text": text,
+            "chat": {"id": CLIENT_ID, "type": "private"},
+            "from": {"id": CLIENT_ID, "is_bot": False, "first_name": "Иван"},
+        },
+    }, bot)
+
+
+def test_confirm_booking_creates_once_and_replies_with_priority():
+    async def run():
+        request = FakeRequest()
+        limiter = RecordingRateLimiter()
+        bot = ExtBot("123456:test", request=request, get_updates_request=FakeRequest(), rate_limiter=limiter)
+        bookings = FakeBookings()
+        context = SimpleNamespace(
+            bot=bot,
+            user_data={
+                "ride_type": RIDE_SEAT, "from_city": "Нижнекамск", "to_city": "Казань",
+                "from_address": "ул. Менделеева 1", "to_address": "РКБ", "price": 1000,
+                "date": datetime.date.today() + datetime.timedelta(days=2), "time": "09:30",
+            },
+            bot_data={"users": FakeUsers(), "bookings": bookings, "availability": FakeAvailability()},
+        )
+        async with bot:
+            state = await booking.confirm_booking(message_update(bot, "Подтверждаю"), context)
+        return state, bookings, request, limiter
+
+    state, bookings, request, limiter = asyncio.run(run())
+
+    assert state == ConversationHandler.END
+    assert len(bookings.created) == 1
+    assert bookings.invalidated == [CLIENT_ID]
+    sent = [params for endpoint, params in request.calls if endpoint == "sendMessage"]
+    assert len(sent) == 1
+    assert sent[0]["chat_id"] == CLIENT_ID
+    assert "заявка принята" in sent[0]["text"]
+    assert ("sendMessage", PRIORITY_HIGH) in limiter.priorities
@@ -0,0 +1,126 @@
+"""Переходы статусов брони и ответы клиенту на отмену."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import booking_state
+from booking_state import TransitionResult
+from repository import StatusChange
+
+
+STATUSES = ("pending", "confirmed", "cancelled", "completed", "expired")
+ALLOWED = {
+    ("pending", "confirmed"), ("pending", "cancelled"), ("pending", "expired"),
+    ("confirmed", "cancelled"), ("confirmed", "completed"),
+}
+NOW = datetime(2025, 5, 24, 9, 0)
+
+
+class FakeBookings:
+    """Условный UPDATE из BookingRepository в памяти: статус меняется, только если он в allowed_from."""
+
+    def __init__(self, statuses, owners=None, scheduled_time=None):
+        self.statuses = dict(statuses)
+        self.owners = owners or {}
+        self.scheduled_time = scheduled_time
+        self.invalidated = []
+
+    async def transition(self, booking_id, status, allowed_from, actor, owner_telegram_id=None):
+        if booking_id not in self.statuses:
+            return None
+        if owner_telegram_id is not None and self.owners.get(booking_id) != owner_telegram_id:
+            return None
+        previous = self.statuses[booking_id]
+        changed = previous in allowed_from
+        if changed:
+            self.statuses[booking_id] = status
+        return previous, self.scheduled_time, changed
+
+    async def set_status_many(self, booking_ids, status, allowed_from, actor):
+        changes = []
+        for booking_id in booking_ids:
+            previous = self.statuses.get(booking_id)
+            changed = previous in allowed_from
+            if changed:
+                self.statuses[booking_id] = status
+            changes.append(StatusChange(booking_id, previous, changed))
+        return changes
+
+    def invalidate_client(self, telegram_id):
+        self.invalidated.append(telegram_id)
+
+
+@pytest.mark.parametrize("current", STATUSES)
+@pytest.mark.parametrize("target", sorted(booking_state.TRANSITIONS))
+def test_transition_table(current, target):
+    bookings = FakeBookings({1: current})
+    result = asyncio.run(booking_state.transition(bookings, 1, target))
+
+    allowed = (current, target) in ALLOWED
+    assert result == TransitionResult(1, True, allowed, current, None)
+    assert bookings.statuses[1] == (target if allowed else current)
+
+
+def test_terminal_statuses_have_no_way_out():
+    for status in ("cancelled", "completed", "expired"):
+        assert not any(status in sources for sources in booking_state.TRANSITIONS.values())
+
+
+def test_transition_many_reports_each_booking():
+    bookings = FakeBookings({1: "pending", 2: "confirmed", 3: "cancelled"})
+    changes = asyncio.run(booking_state.transition_many(bookings, [1, 2, 3, 4], "confirmed"))
+
+    assert changes == [
+        StatusChange(1, "pending", True),
+        StatusChange(2, "confirmed", False),
+        StatusChange(3, "cancelled", False),
+        StatusChange(4, None, False),
+    ]
+    assert bookings.statuses == {1: "confirmed", 2: "confirmed", 3: "cancelled"}
+
+
+@pytest.mark.parametrize("owner, status, changed, invalidated", [
+    (555, "pending", True, [555]),
+    (555, "confirmed", True, [555]),
+    (555, "completed", False, []),
+    (777, "pending", False, []),
+])
+def test_cancel_by_client(owner, status, changed, invalidated):
+    bookings = FakeBookings({1: status}, owners={1: owner})
+    result = asyncio.run(booking_state.cancel_by_client(bookings, 1, 555))
+
+    assert result.found == (owner == 555)
+    assert result.changed == changed
+    assert bookings.invalidated == invalidated
+
+
+@pytest.mark.parametrize("left, refundable", [
+    (timedelta(hours=12, minutes=1), True),
+    (timedelta(hours=12), True),
+    (timedelta(hours=11, minutes=59), False),
+    (timedelta(hours=-1), False),
+])
+def test_refund_window(left, refundable):
+    assert booking_state.is_refundable(NOW + left, NOW) is refundable
+    expected = "возвращена" if refundable else "менее 12 часов"
+    assert expected in booking_state.refund_message(NOW + left, NOW)
+
+
+def test_refund_unknown_time():
+    assert booking_state.is_refundable(None, NOW) is None
+    assert "не указано" in booking_state.refund_message(None, NOW)
+
+
+@pytest.mark.parametrize("result, expected", [
+    (TransitionResult(7, False, False), "❌ Бронь не найдена"),
+    (TransitionResult(7, True, False, "cancelled"), "ℹ️ Эта бронь уже отменена."),
+    (TransitionResult(7, True, False, "expired"), "ℹ️ Бронь в статусе «⌛ Истекло» отменить нельзя."),
+    (TransitionResult(7, True, False, "completed"), "ℹ️ Бронь в статусе «🏁 Завершено» отменить нельзя."),
+    (TransitionResult(7, True, True, "pending", datetime.now() + timedelta(days=2)),
+     "🚫 Бронь #7 успешно отменена.\n✅ Предоплата будет возвращена"),
+    (TransitionResult(7, True, True, "confirmed", datetime.now() + timedelta(hours=1)),
+     "🚫 Бронь #7 успешно отменена.\n⚠️ До поездки осталось менее 12 часов"),
+])
+def test_cancel_result_text(result, expected):
+    assert booking_state.cancel_result_text(result).startswith(expected)
@@ -0,0 +1,183 @@
+"""TTLCache и кэши поверх него: пользователи, «Мои брони», карта мест."""
+import asyncio
+from datetime import date, datetime
+
+from cache import TTLCache
+from capacity import Availability
+from repository import UserRepository, BookingRepository, User
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entry_lives_exactly_ttl():
+    clock = Clock()
+    cache = TTLCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+
+    clock.now = 5.0
+    assert cache.get("a") == 1
+    clock.now = 5.01
+    assert cache.get("a") is None
+    # Просроченная запись удаляется при чтении
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_set_refreshes_ttl():
+    clock = Clock()
+    cache = TTLCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+    clock.now = 4
+    cache.set("a", 2)
+    clock.now = 8
+    assert cache.get("a") == 2
+
+
+def test_maxsize_evicts_least_recently_used():
+    cache = TTLCache(maxsize=3, ttl=60, clock=Clock())
+    for key in "abc":
+        cache.set(key, key)
+    # Чтение «a» делает её свежей — вытесняется «b»
+    assert cache.get("a") == "a"
+    cache.set("d", "d")
+
+    assert len(cache) == 3
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["a", "c", "d"]
+
+
+def test_overwrite_does_not_grow_cache():
+    cache = TTLCache(maxsize=2, ttl=60, clock=Clock())
+    for value in range(10):
+        cache.set("a", value)
+    cache.set("b", "b")
+
+    assert len(cache) == 2
+    assert cache.get("a") == 9
+
+
+def test_falsy_values_are_cached():
+    cache = TTLCache(maxsize=10, ttl=60, clock=Clock())
+    cache.set("empty", [])
+    cache.set("zero", 0)
+
+    assert cache.get("empty") == [] and cache.get("zero") == 0
+    assert cache.get("missing", "default") == "default"
+
+
+def test_invalidate_and_clear():
+    cache = TTLCache(maxsize=10, ttl=60, clock=Clock())
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.invalidate("a")
+    cache.invalidate("never-set")
+
+    assert cache.get("a") is None and cache.get("b") == 2
+    cache.clear()
+    assert len(cache) == 0
+
+
+class CountingDB:
+    def __init__(self, row=None, rows=()):
+        self.row = row
+        self.rows = list(rows)
+        self.queries = []
+
+    async def fetchone(self, sql, params=()):
+        self.queries.append(" ".join(sql.split()[:2]))
+        return self.row
+
+    async def fetchall(self, sql, params=()):
+        self.queries.append(" ".join(sql.split()[:2]))
+        return self.rows
+
+    async def execute(self, sql, params=()):
+        self.queries.append(" ".join(sql.split()[:2]))
+
+
+def test_user_repository_caches_until_invalidated():
+    db = CountingDB(row=(1, 555, "Иван", "+79000000000", None))
+    clock = Clock()
+    users = UserRepository(db, cache=TTLCache(maxsize=10, ttl=300, clock=clock))
+
+    async def run():
+        first = await users.get_by_telegram_id(555)
+        second = await users.get_by_telegram_id(555)
+        reads = len(db.queries)
+        await users.set_role(555, "admin")
+        db.row = (1, 555, "Иван", "+79000000000", "admin")
+        after_role = await users.get_by_telegram_id(555)
+        clock.now = 301
+        await users.get_by_telegram_id(555)
+        return first, second, reads, after_role
+
+    first, second, reads, after_role = asyncio.run(run())
+    assert first is second and reads == 1
+    assert after_role.role == "admin"
+    assert db.queries == ["SELECT id,", "UPDATE users", "SELECT id,", "SELECT id,"]
+
+
+def test_user_repository_does_not_cache_missing_user():
+    db = CountingDB(row=None)
+    users = UserRepository(db, cache=TTLCache(maxsize=10, ttl=300, clock=Clock()))
+
+    async def run():
+        assert await users.get_by_telegram_id(1) is None
+        db.row = (1, 1, "Новый", "+7", None)
+        return await users.get_by_telegram_id(1)
+
+    assert asyncio.run(run()) == User(1, 1, "Новый", "+7", None)
+
+
+def test_client_bookings_cache_and_invalidate():
+    db = CountingDB(rows=[])
+    bookings = BookingRepository(db, cache=TTLCache(maxsize=10, ttl=120, clock=Clock()))
+
+    async def run():
+        await bookings.list_for_client(555)
+        await bookings.list_for_client(555)
+        bookings.invalidate_client(555)
+        await bookings.list_for_client(555)
+
+    asyncio.run(run())
+    # Пустой список тоже кэшируется
+    assert len(db.queries) == 2
+
+
+class SeatsRepository:
+    def __init__(self):
+        self.calls = 0
+
+    async def seats_used_by_hour(self, from_city, to_city, day):
+        self.calls += 1
+        return {9: 3}
+
+    async def get(self, from_city, to_city):
+        return {9: 10}
+
+
+def test_availability_day_map_cached_per_direction_and_day():
+    seats = SeatsRepository()
+    availability = Availability(seats, seats, default_seats=16, cache=TTLCache(maxsize=10, ttl=60, clock=Clock()))
+    day = date(2025, 5, 24)
+
+    async def run():
+        free = await availability.free_seats("Нижнекамск", "Казань", datetime(2025, 5, 24, 9, 30))
+        await availability.day_map("Нижнекамск", "Казань", day)
+        await availability.day_map("Казань", "Нижнекамск", day)
+        calls = seats.calls
+        availability.on_event({"from_city": "Нижнекамск", "to_city": "Казань", "scheduled_time": "2025-05-24T09:30:00"})
+        free_map = await availability.day_map("Нижнекамск", "Казань", day)
+        return free, calls, free_map
+
+    free, calls, free_map = asyncio.run(run())
+    assert free == 7
+    assert calls == 2
+    assert seats.calls == 3
+    assert free_map[10] == 16
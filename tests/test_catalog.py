@@ -0,0 +1,157 @@
+"""Каталог точек: нормализация, поиск с опечатками и горячая перезагрузка."""
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+import catalog
+from catalog import DestinationCatalog, normalize, load_catalog, refresh_catalog
+
+
+PRICES = {
+    "РКБ": 1000,
+    "ДРКБ": 1100,
+    "Аэропорт Казани": 1400,
+    "Бутлерова 14 и 41": 1400,
+    "Аквапарк Ривьера": 1500,
+    "Аквапарк Брионикс": 1500,
+    "ЖД вокзал 1": 1400,
+    "ЖД вокзал 2": 1500,
+    "ул. Чистопольская": 1400,
+    "Казан Молл": 1400,
+}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("  Ул.  Чистопольская!! ", "ул чистопольская"),
+    ("ЁЛКИ-палки", "елки палки"),
+    ("ЖД   вокзал\t1", "жд вокзал 1"),
+    ("...", ""),
+])
+def test_normalize(text, expected):
+    assert normalize(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Точное и без учёта регистра/пунктуации
+    ("РКБ", "РКБ"),
+    ("ркб", "РКБ"),
+    ("ДРКБ.", "ДРКБ"),
+    ("ул Чистопольская", "ул. Чистопольская"),
+    ("жд вокзал-1", "ЖД вокзал 1"),
+    # Однозначное начало названия
+    ("бутлерова", "Бутлерова 14 и 41"),
+    ("аэроп", "Аэропорт Казани"),
+    ("аквапарк бри", "Аквапарк Брионикс"),
+    # Опечатки
+    ("аэропорт казан", "Аэропорт Казани"),
+    ("аквапрак ривьера", "Аквапарк Ривьера"),
+    ("казан мол", "Казан Молл"),
+    ("бутлерво 14 и 41", "Бутлерова 14 и 41"),
+])
+def test_lookup(text, expected):
+    assert DestinationCatalog(PRICES).lookup(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    # Неоднозначное начало и слишком непохожее — не угадываем
+    "аквапарк",
+    "жд вокзал",
+    "ка",
+    "",
+    "!!!",
+    "Москва, Красная площадь",
+])
+def test_lookup_no_match(text):
+    assert DestinationCatalog(PRICES).lookup(text) is None
+
+
+def test_equally_close_typo_is_not_guessed():
+    # «жд вокзал 3» одинаково похож на «ЖД вокзал 1» и «ЖД вокзал 2»
+    assert DestinationCatalog(PRICES).lookup("жд вокзал 3") is None
+
+
+def test_short_prefix_is_not_expanded():
+    # «др» — начало только «ДРКБ», но короче 3 символов не угадываем по началу
+    assert DestinationCatalog(PRICES).lookup("др") is None
+
+
+def test_lookup_cache_is_bounded(monkeypatch):
+    destinations = DestinationCatalog(PRICES)
+    for i in range(5000):
+        destinations.lookup(f"нет такой точки {i}")
+
+    assert len(destinations._lookups) == 4096
+    assert destinations.lookup("нет такой точки 4999") is None
+    assert destinations.lookup("бутлерова") == "Бутлерова 14 и 41"
+
+
+def test_keyboard_two_per_row_in_catalog_order():
+    rows = DestinationCatalog(PRICES).keyboard.keyboard
+
+    assert [[button.text for button in row] for row in rows][:2] == [["РКБ", "ДРКБ"], ["Аэропорт Казани", "Бутлерова 14 и 41"]]
+    assert sum(len(row) for row in rows) == len(PRICES)
+
+
+class FakeDB:
+    """destinations в памяти: версия — (число строк, max(updated_at))."""
+
+    def __init__(self, rows=(), updated_at=1):
+        self.rows = [list(row) for row in rows]
+        self.updated_at = updated_at
+        self.loads = 0
+
+    async def fetchone(self, sql, params=()):
+        return (len(self.rows), self.updated_at if self.rows else None)
+
+    async def fetchall(self, sql, params=()):
+        self.loads += 1
+        return [(name, price) for name, price in self.rows]
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield self
+
+    async def execute(self, sql, params=()):
+        name, price, order = params
+        self.rows.append([name, price])
+        self.updated_at += 1
+
+
+def test_load_catalog_seeds_empty_table():
+    db = FakeDB()
+    loaded = asyncio.run(load_catalog(db, {"РКБ": 1000, "ДРКБ": 1100}))
+
+    assert loaded.prices == {"РКБ": 1000, "ДРКБ": 1100}
+    assert loaded.version == (2, 3)
+
+
+def test_refresh_keeps_snapshot_while_version_is_unchanged():
+    db = FakeDB([("РКБ", 1000)])
+
+    async def run():
+        first = await load_catalog(db, {})
+        same = await refresh_catalog(db, first, {})
+        db.rows[0][1] = 1200
+        db.updated_at += 1
+        changed = await refresh_catalog(db, same, {})
+        return first, same, changed
+
+    first, same, changed = asyncio.run(run())
+    assert same is first
+    assert db.loads == 2
+    assert changed is not first
+    assert changed.price("РКБ") == 1200
+    assert first.price("РКБ") == 1000
+
+
+def test_refresh_sees_removed_point():
+    db = FakeDB([("РКБ", 1000), ("ДРКБ", 1100)])
+
+    async def run():
+        first = await load_catalog(db, {})
+        del db.rows[1]
+        return first, await refresh_catalog(db, first, {})
+
+    first, refreshed = asyncio.run(run())
+    assert "ДРКБ" in first and "ДРКБ" not in refreshed
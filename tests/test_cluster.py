@@ -0,0 +1,97 @@
+"""Ведущий воркер кластера и задачи, которые запускает только он."""
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+import dispatch
+import jobs
+from cluster import ClusterWorker, partition_of, update_owner_id
+
+
+def make_worker(owned, lease_left=10.0):
+    async def run():
+        app = SimpleNamespace(bot_data={"db": None})
+        worker = ClusterWorker(app, "", worker_id="w", partitions=4)
+        worker.owned = set(owned)
+        worker._lease_valid_until = asyncio.get_running_loop().time() + lease_left
+        return worker.leads()
+    return asyncio.run(run())
+
+
+def test_leader_is_owner_of_partition_zero():
+    assert make_worker({0, 1}) is True
+    assert make_worker({1, 2, 3}) is False
+
+
+def test_expired_lease_is_not_leadership():
+    assert make_worker({0}, lease_left=-1.0) is False
+
+
+def test_partition_and_owner_of_update():
+    assert partition_of(-7, 4) == 3
+    assert update_owner_id({"update_id": 1, "message": {"from": {"id": 42}}}) == 42
+    assert update_owner_id({"update_id": 1}) == 0
+
+
+class FakeBookings:
+    def __init__(self):
+        self.calls = 0
+
+    async def claim_reminders(self, start, end, limit):
+        self.calls += 1
+        return []
+
+
+def test_booking_jobs_run_only_on_leader(monkeypatch):
+    bookings = FakeBookings()
+
+    async def transition_due(bookings, status, before, limit):
+        bookings.calls += 1
+        return []
+
+    monkeypatch.setattr(jobs.booking_state, "transition_due", transition_due)
+
+    def run(leads):
+        context = SimpleNamespace(bot_data={"bookings": bookings, "cluster": SimpleNamespace(leads=lambda: leads)})
+        asyncio.run(jobs.run_booking_jobs(context))
+
+    run(False)
+    assert bookings.calls == 0
+    run(True)
+    assert bookings.calls == 3
+
+
+class FakeDrivers:
+    def __init__(self, rows):
+        self.rows = rows
+        self.listed = 0
+
+    async def list_unassigned(self, now, limit):
+        self.listed += 1
+        return self.rows
+
+
+def test_dispatch_pending_takes_every_partition_on_leader():
+    when = datetime.datetime(2025, 5, 17, 9, 30)
+    rows = [(1, "Нижнекамск", "Казань", when, "seat", 10), (2, "Нижнекамск", "Казань", when, "seat", 11)]
+    drivers = FakeDrivers(rows)
+    dispatcher = dispatch.Dispatcher(drivers, bot=None)
+    dispatcher.owns = lambda chat_id: chat_id == 10
+    tried = []
+
+    async def fake_dispatch(booking_id, *args):
+        tried.append(booking_id)
+        return True
+
+    dispatcher.dispatch = fake_dispatch
+
+    def run(leads):
+        context = SimpleNamespace(bot_data={
+            "dispatcher": dispatcher, "cluster": SimpleNamespace(leads=lambda: leads),
+        })
+        asyncio.run(dispatch.run_dispatch(context))
+
+    run(False)
+    assert drivers.listed == 0
+    run(True)
+    assert tried == [1, 2]
@@ -0,0 +1,139 @@
+"""Разбор даты и времени поездки (dateparse.py) и окна водителя (/slot)."""
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import booking
+from dateparse import parse_when, parse_time, DateParseError
+from driver_role_handler import parse_slot
+from repository import RIDE_SEAT
+
+
+# Суббота
+TODAY = datetime.date(2025, 5, 17)
+D = datetime.date
+T = datetime.time
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("24.05.2025", (D(2025, 5, 24), None)),
+    ("24.05.25", (D(2025, 5, 24), None)),
+    ("24.05", (D(2025, 5, 24), None)),
+    ("24/05", (D(2025, 5, 24), None)),
+    ("24 мая", (D(2025, 5, 24), None)),
+    ("05.01", (D(2026, 1, 5), None)),
+    ("сегодня", (TODAY, None)),
+    ("завтра", (D(2025, 5, 18), None)),
+    ("послезавтра", (D(2025, 5, 19), None)),
+    ("через 3 дня", (D(2025, 5, 20), None)),
+    ("пт", (D(2025, 5, 23), None)),
+    ("в пятницу", (D(2025, 5, 23), None)),
+    ("сб", (TODAY, None)),
+    ("завтра в 7", (D(2025, 5, 18), T(7, 0))),
+    ("пт 18:30", (D(2025, 5, 23), T(18, 30))),
+    ("24.05 в 9 вечера", (D(2025, 5, 24), T(21, 0))),
+    ("завтра 9.30", (D(2025, 5, 18), T(9, 30))),
+    ("9.30 завтра", (D(2025, 5, 18), T(9, 30))),
+    ("24.05 9.30", (D(2025, 5, 24), T(9, 30))),
+    ("через 3 дня в 7:30 утра", (D(2025, 5, 20), T(7, 30))),
+    ("Завтра, в 12 ночи", (D(2025, 5, 18), T(0, 0))),
+])
+def test_parse_when(text, expected):
+    assert parse_when(text, TODAY) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "31.02", "31.02.2025", "00.05", "24.13.2025", "завтра 25:00", "завтра в 24", "завтра 9.61",
+    "9.30", "", "какой-то текст", "завтра к маме",
+])
+def test_parse_when_rejects(text):
+    with pytest.raises(DateParseError):
+        parse_when(text, TODAY)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("09:30", T(9, 30)), ("9", T(9, 0)), ("9 30", T(9, 30)), ("9.30", T(9, 30)), ("0930", T(9, 30)),
+    ("в 7 вечера", T(19, 0)), ("к 8 утра", T(8, 0)), ("7 часов", T(7, 0)),
+])
+def test_parse_time(text, expected):
+    assert parse_time(text) == expected
+
+
+@pytest.mark.parametrize("text", ["25:00", "9:61", "утром", "завтра"])
+def test_parse_time_rejects(text):
+    with pytest.raises(DateParseError):
+        parse_time(text)
+
+
+@pytest.mark.parametrize("args, expected", [
+    ("Нижнекамск завтра 07:00-11:00", ("Нижнекамск", "Казань", "2025-05-18 07:00", "2025-05-18 11:00", 4)),
+    ("Казань 24.05 17-21 3", ("Казань", "Нижнекамск", "2025-05-24 17:00", "2025-05-24 21:00", 3)),
+    ("кзн пт 6:30-8", ("Казань", "Нижнекамск", "2025-05-23 06:30", "2025-05-23 08:00", 4)),
+])
+def test_parse_slot(args, expected):
+    from_city, to_city, starts_at, ends_at, seats = expected
+    assert parse_slot(args.split(), TODAY) == (
+        from_city, to_city, datetime.datetime.fromisoformat(starts_at), datetime.datetime.fromisoformat(ends_at), seats
+    )
+
+
+@pytest.mark.parametrize("args, error", [
+    ("Нижнекамск 07:00-11:00", "Формат"),
+    ("Москва завтра 07:00-11:00", "Город отправления"),
+    ("Казань завтра утром", "диапазоном"),
+    ("Казань завтра 11-7", "позже начала"),
+    ("Казань завтра 7-25", "Некорректное время"),
+    ("Казань 31.02 7-11", "Не понял дату"),
+    ("Казань завтра в 9 7-11", "диапазоном в конце"),
+    ("Казань завтра 7-11 9", "Мест"),
+])
+def test_parse_slot_rejects(args, error):
+    with pytest.raises(ValueError, match=error):
+        parse_slot(args.split(), TODAY)
+
+
+class Message:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+class Availability:
+    async def day_map(self, from_city, to_city, day):
+        return {hour: 10 for hour in range(24)}
+
+    async def free_seats(self, from_city, to_city, moment):
+        return 10
+
+
+def accept(day, ride_time):
+    message = Message()
+    context = SimpleNamespace(
+        user_data={
+            "ride_type": RIDE_SEAT, "from_city": "Нижнекамск", "to_city": "Казань", "from_address": "ул. Менделеева 1",
+            "to_address": "РКБ", "price": 1000, "date": day,
+        },
+        bot_data={"availability": Availability()},
+    )
+    state = asyncio.run(booking.accept_time(SimpleNamespace(message=message), context, ride_time))
+    return state, message.replies, context.user_data
+
+
+def test_accept_time_rejects_past_time_today():
+    # «сегодня в 0:00» всегда уже прошло
+    state, replies, user_data = accept(datetime.date.today(), T(0, 0))
+
+    assert state == booking.ENTER_TIME
+    assert replies[0].startswith("❌ 00:00 уже прошло")
+    assert "time" not in user_data
+
+
+def test_accept_time_accepts_future_time():
+    state, replies, user_data = accept(datetime.date.today() + datetime.timedelta(days=1), T(0, 0))
+
+    assert state == booking.CONFIRM_BOOKING
+    assert user_data["time"] == "00:00"
@@ -0,0 +1,182 @@
+"""Антифлуд входящих апдейтов (flood_guard.py) на управляемых часах."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram.ext import ApplicationHandlerStop
+
+from flood_guard import FloodGuard
+
+
+MENU = "📅 Мои брони"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def guard(clock, **kwargs):
+    kwargs = {"rate": 1.0, "burst": 3, "coalesce_window": 2.0, "coalesce_texts": [MENU], **kwargs}
+    return FloodGuard(clock=clock, **kwargs)
+
+
+def test_burst_then_warn_once_then_limited():
+    clock = Clock()
+    flood = guard(clock)
+
+    verdicts = [flood.verdict(1, None) for _ in range(6)]
+
+    assert verdicts == [None, None, None, "warn", "limited", "limited"]
+    assert flood.stats() == {"users": 1, "allowed": 3, "limited": 3, "coalesced": 0}
+
+
+def test_tokens_refill_with_time():
+    clock = Clock()
+    flood = guard(clock)
+    for _ in range(3):
+        flood.verdict(1, None)
+    assert flood.verdict(1, None) == "warn"
+
+    clock.now = 0.5
+    assert flood.verdict(1, None) == "limited"
+    clock.now = 1.0
+    assert flood.verdict(1, None) is None
+    assert flood.verdict(1, None) == "limited"
+
+
+def test_warning_repeats_after_burst_over_rate():
+    clock = Clock()
+    flood = guard(clock, rate=1.0, burst=1)
+    assert flood.verdict(1, None) is None
+    assert flood.verdict(1, None) == "warn"
+
+    # Предупреждение «глушится» на burst / rate секунд
+    clock.now = 0.9
+    assert flood.verdict(1, None) == "limited"
+    clock.now = 1.0
+    flood.verdict(1, None)
+    assert flood.verdict(1, None) == "warn"
+
+
+def test_users_have_separate_buckets():
+    clock = Clock()
+    flood = guard(clock, burst=1)
+
+    assert [flood.verdict(1, None), flood.verdict(2, None), flood.verdict(1, None)] == [None, None, "warn"]
+
+
+@pytest.mark.parametrize("tap", [MENU, "cb:cancel:101"])
+def test_repeated_tap_is_coalesced_within_window(tap):
+    clock = Clock()
+    flood = guard(clock)
+
+    assert flood.verdict(1, tap) is None
+    clock.now = 1.9
+    assert flood.verdict(1, tap) == "coalesced"
+    # Склейка не тратит токены и не продлевает окно
+    clock.now = 2.0
+    assert flood.verdict(1, tap) is None
+    assert flood.stats()["coalesced"] == 1
+    assert flood.stats()["allowed"] == 2
+
+
+def test_different_taps_are_not_coalesced():
+    clock = Clock()
+    flood = guard(clock)
+
+    assert [flood.verdict(1, "cb:cancel:101"), flood.verdict(1, "cb:cancel:102"), flood.verdict(1, MENU)] == [
+        None, None, None,
+    ]
+
+
+def test_idle_users_are_forgotten():
+    clock = Clock()
+    flood = guard(clock, burst=1)
+    flood.verdict(1, None)
+
+    # После max(burst / rate, coalesce_window) простоя корзина снова полная
+    clock.now = 2.5
+    assert flood.verdict(1, None) is None
+    assert flood.verdict(1, None) == "warn"
+
+
+def test_state_is_bounded_by_maxsize():
+    clock = Clock()
+    flood = guard(clock, maxsize=100)
+    for user_id in range(1000):
+        flood.verdict(user_id, None)
+
+    assert flood.stats()["users"] == 100
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    async def answer(self, text=None, **kwargs):
+        self.calls.append(("answer", text))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls.append(("send_message", chat_id, text))
+
+
+def message(user_id, text):
+    return SimpleNamespace(
+        effective_user=SimpleNamespace(id=user_id), effective_chat=SimpleNamespace(id=user_id),
+        callback_query=None, message=SimpleNamespace(text=text),
+    )
+
+
+def callback(user_id, data, recorder):
+    query = SimpleNamespace(data=data, answer=recorder.answer)
+    return SimpleNamespace(
+        effective_user=SimpleNamespace(id=user_id), effective_chat=SimpleNamespace(id=user_id),
+        callback_query=query, message=None,
+    )
+
+
+def check(flood, update, recorder):
+    try:
+        asyncio.run(flood.check(update, SimpleNamespace(bot=recorder)))
+    except ApplicationHandlerStop:
+        return "stopped"
+    return "passed"
+
+
+def test_check_coalesces_menu_buttons_but_not_free_text():
+    clock = Clock()
+    flood = guard(clock, burst=10)
+    recorder = Recorder()
+
+    assert check(flood, message(1, MENU), recorder) == "passed"
+    assert check(flood, message(1, MENU), recorder) == "stopped"
+    # Адрес, набранный дважды, — не повторное нажатие
+    assert check(flood, message(1, "ул. Менделеева 1"), recorder) == "passed"
+    assert check(flood, message(1, "ул. Менделеева 1"), recorder) == "passed"
+    assert recorder.calls == []
+
+
+def test_check_answers_callbacks_and_warns_once_in_chat():
+    clock = Clock()
+    flood = guard(clock, burst=1)
+    recorder = Recorder()
+
+    assert check(flood, callback(1, "cancel:101", recorder), recorder) == "passed"
+    assert check(flood, callback(1, "cancel:101", recorder), recorder) == "stopped"
+    assert recorder.calls == [("answer", "⏳ Слишком часто, подождите немного")]
+
+    recorder.calls.clear()
+    assert check(flood, message(2, "a"), recorder) == "passed"
+    assert check(flood, message(2, "b"), recorder) == "stopped"
+    assert check(flood, message(2, "c"), recorder) == "stopped"
+    assert recorder.calls == [("send_message", 2, "⏳ Слишком много запросов, подождите несколько секунд.")]
+
+
+def test_updates_without_user_pass():
+    flood = guard(Clock())
+    update = SimpleNamespace(effective_user=None)
+    assert check(flood, update, Recorder()) == "passed"
@@ -0,0 +1,40 @@
+import os
+import sys
+import socket
+import subprocess
+
+import metrics
+
+
+def test_metrics_server_on_busy_port_logs_and_continues(monkeypatch, caplog):
+    with socket.socket() as busy:
+        busy.bind(("127.0.0.1", 0))
+        busy.listen()
+        monkeypatch.setenv("METRICS_PORT", str(busy.getsockname()[1]))
+        monkeypatch.setenv("METRICS_LISTEN", "127.0.0.1")
+
+        assert metrics.start_metrics_server() is False
+    assert "Метрики не запущены" in caplog.text
+
+
+def test_metrics_server_disabled_with_zero_port(monkeypatch):
+    monkeypatch.setenv("METRICS_PORT", "0")
+    assert metrics.start_metrics_server() is False
+
+
+def test_main_import_skips_optional_subsystems():
+    # Отдельный процесс: в этом prometheus_client мог уже загрузить другой тест
+    code = "import sys, main; print(sorted(m for m in ('prometheus_client', 'exports', 'cluster') if m in sys.modules))"
+    env = dict(os.environ, METRICS_PORT="0")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_hooks_are_noops_until_enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "DB_QUERY_LATENCY", None)
+    monkeypatch.setattr(metrics, "TELEGRAM_LATENCY", None)
+    monkeypatch.setattr(metrics, "FLOOD_DROPPED", None)
+    metrics.observe_query("SELECT 1 FROM bookings", 0.001)
+    metrics.observe_telegram("sendMessage", 0.01)
+    metrics.observe_flood_dropped("limited")
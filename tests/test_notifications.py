@@ -0,0 +1,70 @@
+"""События booking_events и рассылка по ним."""
+import asyncio
+
+from conftest import rolled_back
+from notifications import BookingNotifier
+from repository import INSERT_BOOKING_SQL, RIDE_SEAT
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+def event(booking_id, status, op="UPDATE", actor="admin", telegram_id=555):
+    return {
+        "op": op, "id": booking_id, "status": status, "actor": actor, "telegram_id": telegram_id,
+        "scheduled_time": "2025-05-24T09:30:00", "from_city": "Нижнекамск", "to_city": "Казань",
+        "ride_type": RIDE_SEAT,
+    }
+
+
+def test_flush_reads_addresses_by_id_once_per_batch():
+    requested = []
+
+    async def addresses(ids):
+        requested.append(sorted(ids))
+        return {1: ("ул. Менделеева 1", "РКБ"), 2: ("пр. Мира 5", "Аэропорт")}
+
+    bot = RecordingBot()
+    notifier = BookingNotifier(bot, None, admin_chat_id="-100", addresses=addresses)
+    asyncio.run(notifier.flush([event(1, "confirmed"), event(2, "pending", op="INSERT", actor="client")]))
+
+    assert requested == [[1, 2]]
+    client_text = dict(bot.sent)[555]
+    assert "Бронь #1 подтверждена" in client_text
+    assert "ул. Менделеева 1 → РКБ, 24.05 09:30" in client_text
+    assert "🆕 #2: пр. Мира 5 → Аэропорт" in dict(bot.sent)["-100"]
+
+
+def test_flush_falls_back_to_direction_when_addresses_fail():
+    async def addresses(ids):
+        raise ConnectionError("db down")
+
+    bot = RecordingBot()
+    asyncio.run(BookingNotifier(bot, None, addresses=addresses).flush([event(1, "cancelled")]))
+
+    assert bot.sent == [(555, "🚫 Бронь #1 отменена\nНижнекамск → Казань, 24.05 09:30")]
+
+
+def test_long_address_does_not_fail_booking_insert(postgres):
+    # 4000 кириллических символов — 8000 байт, больше лимита payload у NOTIFY
+    address = "ж" * 4000
+
+    async def run():
+        async with rolled_back(postgres) as tx:
+            user = await tx.fetchone(
+                "INSERT INTO users (telegram_id, full_name, phone) VALUES (%s, %s, %s) RETURNING id",
+                (-1, "Тест", "+70000000000"),
+            )
+            booking = await tx.fetchone(
+                INSERT_BOOKING_SQL,
+                (user[0], "Нижнекамск", "Казань", address, address, "2030-05-24 09:30", 1000, RIDE_SEAT),
+            )
+            await tx.execute("UPDATE bookings SET status = 'confirmed' WHERE id = %s", (booking[0],))
+            return await tx.fetchone("SELECT length(pickup_point) FROM bookings WHERE id = %s", (booking[0],))
+
+    assert asyncio.run(run()) == (4000,)
@@ -0,0 +1,139 @@
+"""Хранилище диалогов: JSON с датами, запись на переходе, вычистка по TTL."""
+import json
+import asyncio
+import datetime
+from contextlib import asynccontextmanager
+
+import pytest
+from telegram import Update
+from telegram.ext import ApplicationBuilder, ExtBot, MessageHandler, filters
+
+from conftest import rolled_back
+from persistence import FlushingConversationHandler, PostgresPersistence, dumps, loads
+from test_booking_flow import CLIENT_ID, FakeRequest
+
+
+def test_round_trip_keeps_dates_and_datetimes():
+    data = {
+        "ride_type": "seat",
+        "from_city": "Нижнекамск",
+        "price": 1000,
+        "date": datetime.date(2025, 5, 17),
+        "created": datetime.datetime(2025, 5, 17, 9, 30, 15),
+        "history": [datetime.date(2025, 5, 18), {"at": datetime.datetime(2025, 5, 18, 7, 0)}],
+    }
+
+    text = dumps(data)
+
+    assert "Нижнекамск" in text  # ensure_ascii=False: кириллица не раздувается
+    restored = loads(text)
+    assert restored == data
+    assert type(restored["date"]) is datetime.date
+    assert type(restored["created"]) is datetime.datetime
+
+
+def test_plain_dicts_are_not_mistaken_for_tags():
+    assert loads(dumps({"date": "17.05", "nested": {"a": 1}})) == {"date": "17.05", "nested": {"a": 1}}
+
+
+def test_unsupported_value_is_rejected():
+    with pytest.raises(TypeError):
+        dumps({"when": datetime.time(9, 30)})
+
+
+class RecordingDB:
+    def __init__(self):
+        self.executed = []
+
+    async def execute(self, sql, params=()):
+        self.executed.append((" ".join(sql.split()), params))
+
+    async def fetchall(self, sql, params=()):
+        return []
+
+
+def message_update(bot, text, update_id):
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": text,
+            "chat": {"id": CLIENT_ID, "type": "private"},
+            "from": {"id": CLIENT_ID, "is_bot": False, "first_name": "Иван"},
+        },
+    }, bot)
+
+
+def test_conversation_is_flushed_on_every_transition():
+    db = RecordingDB()
+    persistence = PostgresPersistence(db, update_interval=3600)
+    persistence._ready = True
+
+    async def start(update, context):
+        context.user_data["date"] = datetime.date(2025, 5, 17)
+        return 1
+
+    async def step(update, context):
+        context.user_data["time"] = "09:30"
+        return 2
+
+    async def run():
+        bot = ExtBot("123456:test", request=FakeRequest(), get_updates_request=FakeRequest())
+        app = ApplicationBuilder().bot(bot).persistence(persistence).job_queue(None).build()
+        app.add_handler(FlushingConversationHandler(
+            entry_points=[MessageHandler(filters.Regex("^старт$"), start)],
+            states={1: [MessageHandler(filters.TEXT, step)], 2: []},
+            fallbacks=[],
+            name="booking",
+            persistent=True,
+        ))
+        async with app:
+            await app.process_update(message_update(bot, "старт", 1))
+            after_start = list(db.executed)
+            await app.process_update(message_update(bot, "дальше", 2))
+            return after_start, db.executed[len(after_start):]
+
+    after_start, after_step = asyncio.run(run())
+
+    # Без ожидания update_interval: каждый шаг сразу пишет состояние и user_data
+    key = json.dumps([CLIENT_ID, CLIENT_ID])
+    assert [params for sql, params in after_start if "conversation_state" in sql] == [("booking", key, 1)]
+    states = [params for sql, params in after_start + after_step if "conversation_state" in sql]
+    assert states == [("booking", key, 1), ("booking", key, 2)]
+    user_data = [loads(params[1]) for sql, params in after_step if "INTO user_data" in sql]
+    assert user_data == [{"date": datetime.date(2025, 5, 17), "time": "09:30"}]
+
+
+class OneTransaction:
+    """Database поверх одной транзакции теста, чтобы откат убрал всё."""
+
+    def __init__(self, tx):
+        self.tx = tx
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield self.tx
+
+
+def test_evict_stale_removes_only_expired_rows(postgres):
+    async def run():
+        async with rolled_back(postgres) as tx:
+            await tx.execute("""
+                INSERT INTO conversation_state (name, key, state, updated_at) VALUES
+                    ('booking', '[1, 1]', 3, now() - interval '2 days'),
+                    ('booking', '[2, 2]', 4, now())
+            """)
+            await tx.execute("""
+                INSERT INTO user_data (user_id, data, updated_at) VALUES
+                    (1, '{}', now() - interval '2 days'),
+                    (2, '{}', now())
+            """)
+            evicted = await PostgresPersistence(OneTransaction(tx), ttl=86400).evict_stale()
+            keys = await tx.fetchall("SELECT key FROM conversation_state WHERE key IN ('[1, 1]', '[2, 2]')")
+            users = await tx.fetchall("SELECT user_id FROM user_data WHERE user_id IN (1, 2)")
+        return evicted, keys, users
+
+    evicted, keys, users = asyncio.run(run())
+
+    assert evicted == [1]
+    assert [row[0] for row in keys] == ["[2, 2]"]
+    assert [row[0] for row in users] == [2]
@@ -0,0 +1,93 @@
+"""Раскладка броней «место в машине» по машинам (pooling.py)."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from pooling import TripPlanner, propose_trips
+from repository import Booking, RIDE_SEAT, RIDE_WHOLE_CAR, booking_seats
+
+
+BASE = datetime(2025, 5, 24, 7, 0)
+WINDOW = timedelta(minutes=60)
+
+
+def booking(booking_id, minutes, ride_type=RIDE_SEAT, from_city="Нижнекамск", to_city="Казань"):
+    scheduled_time = BASE + timedelta(minutes=minutes) if minutes is not None else None
+    return Booking(booking_id, 1, from_city, to_city, "a", "b", scheduled_time, 1000, ride_type, "pending")
+
+
+def seats_of(b):
+    return booking_seats(b.ride_type)
+
+
+def layout(trips):
+    return [[b.id for b in trip.bookings] for trip in trips]
+
+
+def test_packs_seats_up_to_vehicle_capacity():
+    trips = propose_trips([booking(i, i) for i in range(1, 7)], seats=4, window=WINDOW)
+
+    assert layout(trips) == [[1, 2, 3, 4], [5, 6]]
+    assert [(trip.taken, trip.free_seats) for trip in trips] == [(4, 0), (2, 2)]
+    assert trips[1].start == BASE + timedelta(minutes=5)
+
+
+def test_window_lower_bound_is_inclusive():
+    # Ровно start + window — ещё в окне первой машины, минутой позже — уже нет
+    trips = propose_trips([booking(1, 0), booking(2, 60), booking(3, 61)], seats=4, window=WINDOW)
+
+    assert layout(trips) == [[1, 2], [3]]
+
+
+def test_directions_are_pooled_separately():
+    trips = propose_trips(
+        [booking(1, 0), booking(2, 5, from_city="Казань", to_city="Нижнекамск"), booking(3, 10)],
+        seats=4, window=WINDOW,
+    )
+
+    assert sorted(layout(trips)) == [[1, 3], [2]]
+
+
+def test_input_order_does_not_matter_and_untimed_are_skipped():
+    bookings = [booking(3, 30), booking(4, None), booking(1, 0), booking(2, 90)]
+    trips = propose_trips(bookings, seats=4, window=WINDOW)
+
+    assert layout(trips) == [[1, 3], [2]]
+
+
+def test_whole_car_takes_a_vehicle_of_its_own():
+    bookings = [
+        booking(1, 0), booking(2, 5, RIDE_WHOLE_CAR), booking(3, 10), booking(4, 15, RIDE_WHOLE_CAR), booking(5, 20),
+    ]
+    trips = propose_trips(bookings, seats=4, window=WINDOW, seats_of=seats_of)
+
+    assert layout(trips) == [[1, 3, 5], [2], [4]]
+    assert [trip.free_seats for trip in trips] == [1, 0, 0]
+
+
+def test_seat_does_not_join_a_whole_car():
+    trips = propose_trips(
+        [booking(1, 0, RIDE_WHOLE_CAR), booking(2, 5)], seats=4, window=WINDOW, seats_of=seats_of
+    )
+
+    assert layout(trips) == [[1], [2]]
+
+
+@pytest.mark.parametrize("need, expected", [(1, [[1, 2], [3]]), (2, [[1], [2], [3]])])
+def test_planner_fills_only_trips_with_enough_free_seats(need, expected):
+    planner = TripPlanner(seats=3, window=WINDOW)
+    planner.assign(booking(1, 0), 2)
+    planner.assign(booking(2, 1), need)
+    planner.assign(booking(3, 2), need)
+
+    assert layout(planner.trips()) == expected
+
+
+def test_many_bookings_stay_within_capacity():
+    bookings = [booking(i, i % 600) for i in range(5000)]
+    trips = propose_trips(bookings, seats=4, window=WINDOW)
+
+    assert sum(len(trip.bookings) for trip in trips) == 5000
+    assert all(trip.taken <= trip.seats for trip in trips)
+    for trip in trips:
+        assert all(trip.start <= b.scheduled_time <= trip.start + WINDOW for b in trip.bookings)
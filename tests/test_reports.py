@@ -0,0 +1,117 @@
+"""/report: отчёт по агрегатам booking_stats на известных строках."""
+import asyncio
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import reports
+from conftest import rolled_back
+from reports import load_report, parse_period, render_report
+from repository import BookingRepository, INSERT_BOOKING_SQL, RIDE_SEAT
+
+
+DAY = date(2025, 5, 17)
+
+
+class FakeDB:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetchall(self, sql, params=()):
+        return self.rows
+
+
+def report_of(rows, since=DAY, until=DAY):
+    return asyncio.run(load_report(FakeDB(rows), since, until))
+
+
+# from_city, to_city, point, hour, created, confirmed, completed, cancelled, late, expired, revenue
+ROWS = [
+    ("Нижнекамск", "Казань", "РКБ", 7, 4, 2, 1, 1, 1, 0, 3000),
+    ("Нижнекамск", "Казань", "РКБ", 9, 2, 1, 0, 0, 0, 1, 1000),
+    ("Нижнекамск", "Казань", "Вокзал", 7, 2, 0, 0, 1, 0, 0, 0),
+    ("Казань", "Нижнекамск", "Аэропорт", 18, 2, 2, 0, 0, 0, 0, 2400),
+]
+
+
+def test_render_report_over_known_rows():
+    text = render_report(report_of(ROWS))
+
+    assert text == "\n".join([
+        "📊 Отчёт за 17.05.2025",
+        "",
+        "Броней: 10",
+        "✅ Подтверждено: 5, 🏁 завершено: 1",
+        "💰 Выручка: 6400 р",
+        "🚫 Отменено: 2 (20%), из них поздно (<12 ч): 1 (50%)",
+        "⌛ Истекло без подтверждения: 1",
+        "",
+        "📍 Точки в Казани:",
+        "  РКБ: 6 · 4000 р",
+        "  Аэропорт: 2 · 2400 р",
+        "  Вокзал: 2 · 0 р",
+        "",
+        "🕒 Казань → Нижнекамск, брони по часам:",
+        "  18:00 ▇▇▇▇▇▇▇▇▇▇ 2",
+        "",
+        "🕒 Нижнекамск → Казань, брони по часам:",
+        "  07:00 ▇▇▇▇▇▇▇▇▇▇ 6",
+        "  09:00 ▇▇▇ 2",
+    ])
+
+
+def test_render_empty_period():
+    text = render_report(report_of([], since=DAY - timedelta(days=6)))
+    assert text == "📊 Отчёт за 11.05.2025 – 17.05.2025\n\n📭 Броней нет."
+
+
+def test_render_limits_points(monkeypatch):
+    monkeypatch.setattr(reports, "REPORT_TOP_POINTS", 2)
+    text = render_report(report_of(ROWS))
+    assert "  Вокзал" not in text
+    assert "  …и ещё 1" in text
+
+
+def test_parse_period():
+    assert parse_period([], today=DAY) == (DAY, DAY)
+    assert parse_period(["неделя"], today=DAY) == (DAY - timedelta(days=6), DAY)
+    assert parse_period(["month"], today=DAY) == (DAY - timedelta(days=29), DAY)
+    assert parse_period(["24.05.2025"], today=DAY) == (date(2025, 5, 24), date(2025, 5, 24))
+    with pytest.raises(ValueError):
+        parse_period(["завтра"], today=DAY)
+
+
+def test_report_after_bulk_status_changes(postgres):
+    """Агрегаты триггера после массовых смен статуса совпадают с бронями дня."""
+    day = date(2031, 3, 3)
+
+    async def run():
+        async with rolled_back(postgres) as tx:
+            client = await tx.fetchone(
+                "INSERT INTO users (telegram_id, full_name, phone) VALUES (-3, 'Тест', '+70000000000') RETURNING id"
+            )
+            ids = []
+            for hours, point in ((7, "РКБ"), (7, "РКБ"), (7, "Вокзал"), (9, "РКБ"), (9, "РКБ")):
+                created = await tx.fetchone(INSERT_BOOKING_SQL, (
+                    client[0], "Нижнекамск", "Казань", "ул. Менделеева 1", point,
+                    datetime.combine(day, datetime.min.time()) + timedelta(hours=hours), 1000, RIDE_SEAT,
+                ))
+                ids.append(created[0])
+
+            bookings = BookingRepository(SimpleNamespace(fetchall=tx.fetchall))
+            # Вперемешку, как из ввода админа: блокировки всё равно идут по id
+            await bookings.set_status_many([ids[3], ids[0], ids[1]], "confirmed", ("pending",), "admin")
+            await bookings.set_status_many([ids[1]], "cancelled", ("pending", "confirmed"), "admin")
+            expired = await bookings.set_status_for_date(day, "expired", ("pending",), "admin")
+            report = await load_report(tx, day, day)
+            return ids, expired, report
+
+    ids, expired, report = asyncio.run(run())
+
+    assert expired == [ids[2], ids[4]]
+    assert (report.created, report.confirmed, report.cancelled, report.expired) == (5, 2, 1, 2)
+    assert report.revenue == 2000
+    assert report.points == {"РКБ": [4, 2000], "Вокзал": [1, 0]}
+    assert report.hours == {("Нижнекамск", "Казань"): {7: 3, 9: 2}}
+    assert "Броней: 5" in render_report(report)
@@ -0,0 +1,206 @@
+"""Очередь отправки: корзины токенов, приоритеты и пауза на RetryAfter — на фейковых часах."""
+import asyncio
+
+import pytest
+from telegram.error import RetryAfter
+
+from send_queue import SendQueue, TokenBucket, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_BULK
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+        await asyncio.sleep(0)
+
+
+def make_queue(clock, **kwargs):
+    return SendQueue(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_token_bucket_refill():
+    bucket = TokenBucket(rate=2.0, capacity=3, now=0.0)
+    for _ in range(3):
+        assert bucket.wait_time(0.0) == 0
+        bucket.take(0.0)
+
+    assert bucket.wait_time(0.0) == pytest.approx(0.5)
+    assert bucket.wait_time(0.25) == pytest.approx(0.25)
+    assert bucket.wait_time(0.5) == 0
+    assert not bucket.is_full(0.5)
+    # Не копит больше capacity, сколько бы ни простояла
+    assert bucket.is_full(100.0)
+    assert bucket.tokens == 3
+
+
+@pytest.mark.parametrize("chat_id, rate", [(555, 1.0), ("@channel", 1.0), (-100123, 20 / 60)])
+def test_group_chats_refill_slower(chat_id, rate):
+    clock = FakeClock()
+    queue = make_queue(clock, chat_rate=1.0, chat_burst=3, group_rate=20 / 60)
+    bucket = queue._chat_bucket(chat_id, clock.now)
+    for _ in range(3):
+        bucket.take(clock.now)
+
+    assert bucket.rate == rate
+    assert bucket.wait_time(clock.now) == pytest.approx(1 / rate)
+
+
+def enqueue(queue, priority, chat_id):
+    future = asyncio.get_event_loop().create_future()
+    queue._lanes[priority].append((chat_id, future))
+    return future
+
+
+def test_pick_prefers_higher_lane_and_skips_blocked_chats():
+    async def run():
+        clock = FakeClock()
+        queue = make_queue(clock, chat_burst=1)
+        enqueue(queue, PRIORITY_BULK, 1)
+        enqueue(queue, PRIORITY_NORMAL, 2)
+        enqueue(queue, PRIORITY_HIGH, 3)
+        enqueue(queue, PRIORITY_HIGH, 4)
+        picks = []
+
+        # Чат 3 исчерпал лимит: его запрос ждёт, остальные идут по приоритету
+        queue._chat_bucket(3, clock.now).take(clock.now)
+        for _ in range(3):
+            (lane, index), _ = queue._pick(clock.now)
+            chat_id, _ = lane[index]
+            del lane[index]
+            queue._chat_bucket(chat_id, clock.now).take(clock.now)
+            picks.append(chat_id)
+
+        picked, wait = queue._pick(clock.now)
+        return picks, picked, wait
+
+    picks, picked, wait = asyncio.run(run())
+    assert picks == [4, 2, 1]
+    assert picked is None and wait == pytest.approx(1.0)
+
+
+def test_same_chat_keeps_fifo_within_lane():
+    async def run():
+        clock = FakeClock()
+        queue = make_queue(clock, chat_burst=1)
+        first = enqueue(queue, PRIORITY_NORMAL, 7)
+        enqueue(queue, PRIORITY_NORMAL, 7)
+        (lane, index), _ = queue._pick(clock.now)
+        return lane[index][1] is first
+
+    assert asyncio.run(run())
+
+
+def test_dispatch_serves_lanes_by_priority():
+    async def run():
+        clock = FakeClock()
+        queue = make_queue(clock)
+        order = []
+
+        def send(name):
+            async def callback():
+                order.append(name)
+            return callback
+
+        # Запросы встают в очередь раньше, чем диспетчер их разбирает
+        tasks = [
+            asyncio.create_task(queue.process_request(send(name), (), {}, "sendMessage", {"chat_id": chat_id}, priority))
+            for name, chat_id, priority in (
+                ("bulk", 1, PRIORITY_BULK), ("normal", 2, PRIORITY_NORMAL), ("high", 3, PRIORITY_HIGH),
+                ("default", 4, None),
+            )
+        ]
+        await asyncio.sleep(0)
+        await queue.initialize()
+        await asyncio.gather(*tasks)
+        await queue.shutdown()
+        return order, queue.sent
+
+    order, sent = asyncio.run(run())
+    assert order == ["high", "normal", "default", "bulk"]
+    assert sent == 4
+
+
+def test_global_rate_spaces_requests():
+    async def run():
+        clock = FakeClock()
+        queue = make_queue(clock, global_rate=2.0)
+
+        async def callback():
+            pass
+
+        await queue.initialize()
+        await asyncio.gather(*(
+            queue.process_request(callback, (), {}, "sendMessage", {"chat_id": chat_id}, PRIORITY_NORMAL)
+            for chat_id in range(4)
+        ))
+        await queue.shutdown()
+        return clock.sleeps, queue.sent
+
+    sleeps, sent = asyncio.run(run())
+    # Корзина на 2 запроса сразу, дальше по одному каждые 0.5 с
+    assert sleeps == [pytest.approx(0.5), pytest.approx(0.5)]
+    assert sent == 4
+
+
+def test_retry_after_pauses_and_retries():
+    async def run():
+        clock = FakeClock()
+        queue = make_queue(clock)
+        attempts = []
+
+        async def callback():
+            attempts.append(clock.now)
+            if len(attempts) == 1:
+                raise RetryAfter(5)
+            return "ok"
+
+        await queue.initialize()
+        result = await queue.process_request(callback, (), {}, "sendMessage", {"chat_id": 555}, PRIORITY_HIGH)
+        await queue.shutdown()
+        return result, attempts, queue
+
+    result, attempts, queue = asyncio.run(run())
+    assert result == "ok"
+    assert attempts[1] - attempts[0] == pytest.approx(5)
+    assert queue.retries == 1 and queue.sent == 1 and queue.failed == 0
+    assert queue._paused_until == pytest.approx(attempts[0] + 5)
+
+
+def test_retry_after_gives_up_after_max_retries():
+    async def run():
+        clock = FakeClock()
+        queue = make_queue(clock, max_retries=2)
+
+        async def callback():
+            raise RetryAfter(1)
+
+        await queue.initialize()
+        try:
+            with pytest.raises(RetryAfter):
+                await queue.process_request(callback, (), {}, "sendMessage", {"chat_id": 555}, PRIORITY_HIGH)
+        finally:
+            await queue.shutdown()
+        return queue
+
+    queue = asyncio.run(run())
+    assert queue.retries == 2 and queue.failed == 1 and queue.sent == 0
+
+
+def test_requests_without_chat_id_bypass_the_queue():
+    async def run():
+        queue = make_queue(FakeClock())
+
+        async def callback():
+            return "me"
+
+        # Диспетчер не запущен: запрос без chat_id не должен его ждать
+        return await queue.process_request(callback, (), {}, "getMe", {}, None)
+
+    assert asyncio.run(run()) == "me"
@@ -0,0 +1,88 @@
+"""ChatOrderedUpdateProcessor: порядок внутри чата, параллельность между чатами."""
+import asyncio
+
+from telegram import Update
+
+from update_processor import ChatOrderedUpdateProcessor
+
+
+def message_update(update_id, chat_id):
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": str(update_id),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Иван"},
+        },
+    }, None)
+
+
+class Recorder:
+    """Хендлер-заглушка: пишет начало и конец обработки, между ними уступает циклу."""
+
+    def __init__(self):
+        self.events = []
+        self.active = set()
+        self.max_active = 0
+        self.overlapped = False
+
+    async def handle(self, update, steps=3):
+        chat_id = update.effective_chat.id if update.effective_chat else None
+        assert chat_id is None or all(chat != chat_id for chat, _ in self.active), "чат обрабатывается дважды"
+        self.active.add((chat_id, update.update_id))
+        self.max_active = max(self.max_active, len(self.active))
+        if len({chat for chat, _ in self.active}) > 1:
+            self.overlapped = True
+        self.events.append(("start", chat_id, update.update_id))
+        for _ in range(steps):
+            await asyncio.sleep(0)
+        self.active.discard((chat_id, update.update_id))
+        self.events.append(("end", chat_id, update.update_id))
+
+
+def run_updates(processor, recorder, updates):
+    async def run():
+        await asyncio.gather(*(
+            processor.process_update(update, recorder.handle(update)) for update in updates
+        ))
+    asyncio.run(run())
+
+
+def test_interleaved_chats_keep_their_order_and_run_in_parallel():
+    processor = ChatOrderedUpdateProcessor(max_concurrent_updates=8)
+    recorder = Recorder()
+    # Апдейты двух чатов вперемешку, как из getUpdates
+    updates = [message_update(i, 100 if i % 2 else 200) for i in range(1, 11)]
+
+    run_updates(processor, recorder, updates)
+
+    for chat_id in (100, 200):
+        sent = [u.update_id for u in updates if u.effective_chat.id == chat_id]
+        started = [uid for kind, chat, uid in recorder.events if kind == "start" and chat == chat_id]
+        finished = [uid for kind, chat, uid in recorder.events if kind == "end" and chat == chat_id]
+        assert started == sent
+        assert finished == sent
+    assert recorder.overlapped
+    assert processor._chats == {}
+
+
+def test_concurrency_is_bounded_across_chats():
+    processor = ChatOrderedUpdateProcessor(max_concurrent_updates=2)
+    recorder = Recorder()
+    updates = [message_update(i, 100 + i % 4) for i in range(1, 13)]
+
+    run_updates(processor, recorder, updates)
+
+    assert recorder.max_active == 2
+    assert len([e for e in recorder.events if e[0] == "end"]) == 12
+
+
+def test_update_without_chat_is_processed():
+    processor = ChatOrderedUpdateProcessor(max_concurrent_updates=2)
+    recorder = Recorder()
+    update = Update.de_json({"update_id": 1}, None)
+
+    run_updates(processor, recorder, [update, message_update(2, 100)])
+
+    assert ("end", None, 1) in recorder.events
+    assert ("end", 100, 2) in recorder.events
@@ -0,0 +1,55 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка апдейтов с сохранением порядка внутри чата.
+
+    Апдейты разных чатов обрабатываются одновременно (не более
+    max_concurrent_updates), апдейты одного чата — строго по очереди,
+    поэтому ConversationHandler видит шаги диалога в правильном порядке.
+    Ожидающие своей очереди апдейты не занимают рабочих слотов.
+    """
+
+    def __init__(self, max_concurrent_updates=64, max_pending_updates=None):
+        super().__init__(max_pending_updates or max_concurrent_updates * 16)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        # chat_id -> [lock, сколько апдейтов чата сейчас в работе или в очереди]
+        self._chats = {}
+
+    @staticmethod
+    def chat_key(update):
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        key = self.chat_key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._chats.get(key)
+        if entry is None:
+            entry = self._chats[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._slots:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chats[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass